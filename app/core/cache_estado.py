@@ -0,0 +1,96 @@
+# en app/core/cache_estado.py
+"""
+Lecturas y actualizaciones del documento de estado de gestor_estado.
+
+- obtener_async(): el estado siempre se lee de BD (otro proceso pudo cambiarlo);
+  las lecturas simultáneas de la misma evaluación comparten una sola consulta.
+- obtener_idioma_async(): el idioma es lo único que se responde de memoria, durante
+  ESTADO_IDIOMA_TTL_SEG. Las secciones, el índice y los catálogos de una misma
+  carga del formulario lo piden en ráfaga; un cambio de idioma hecho en otro
+  proceso se ve, como mucho, ese tiempo después.
+- actualizar_async(): asigna campos del estado y no escribe si ya tenían esos
+  valores. gestor_estado solo escribe el estado completo, así que es una
+  lectura seguida de una escritura: un cambio que otro proceso haga entre
+  ambas en otro campo puede perderse (igual que antes de este módulo).
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from app.core import gestor_estado
+from app.core.carga_async import CargasEnCurso
+from app.core.metricas import medir_db, metricas
+
+# Tiempo durante el cual el idioma leído de una evaluación se responde desde memoria
+ESTADO_IDIOMA_TTL_SEG = float(os.getenv("ESTADO_IDIOMA_TTL_SEG", "2"))
+MAX_IDIOMAS_CACHE = int(os.getenv("ESTADO_IDIOMA_CACHE_MAX", "5000"))
+
+
+class CacheEstado:
+    """Estado de las evaluaciones leído de BD, con el idioma en memoria por poco tiempo."""
+
+    def __init__(self):
+        # evaluacion_uuid -> (idioma, momento de la lectura)
+        self._idiomas: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._cargas = CargasEnCurso()
+
+    def _anotar_idioma(self, evaluacion_uuid: str, estado: Dict[str, Any], leido: float):
+        self._idiomas[evaluacion_uuid] = ((estado.get("idioma") or "ESP").upper(), leido)
+        self._idiomas.move_to_end(evaluacion_uuid)
+        while len(self._idiomas) > MAX_IDIOMAS_CACHE:
+            self._idiomas.popitem(last=False)
+
+    async def _leer_async(self, evaluacion_uuid: str) -> Dict[str, Any]:
+        leido = time.monotonic()
+        estado = await medir_db("obtener_estado", gestor_estado.obtener_estado_async(evaluacion_uuid)) or {}
+        self._anotar_idioma(evaluacion_uuid, estado, leido)
+        return estado
+
+    async def obtener_async(self, evaluacion_uuid: str) -> Dict[str, Any]:
+        """
+        Copia del estado de la evaluación. Es una copia superficial: no se deben
+        modificar sus valores anidados.
+        """
+        estado = await self._cargas.ejecutar_corrutina(evaluacion_uuid, self._leer_async, evaluacion_uuid)
+        return dict(estado)
+
+    async def obtener_idioma_async(self, evaluacion_uuid: str) -> str:
+        """Idioma de la evaluación en mayúsculas ("ESP" si no tiene)."""
+        anotado = self._idiomas.get(evaluacion_uuid)
+        if anotado is not None and time.monotonic() - anotado[1] < ESTADO_IDIOMA_TTL_SEG:
+            metricas.incrementar("estado.idioma_aciertos")
+            return anotado[0]
+        metricas.incrementar("estado.idioma_fallos")
+        estado = await self.obtener_async(evaluacion_uuid)
+        return (estado.get("idioma") or "ESP").upper()
+
+    async def actualizar_async(self, evaluacion_uuid: str, campos: Dict[str, Any]) -> bool:
+        """
+        Asigna los campos en el estado de la evaluación. Devuelve si hubo que
+        escribir (False si ya tenían esos valores). Los errores de BD se propagan.
+        """
+        # Lectura propia, no compartida: una en curso pudo empezar antes de la última escritura
+        leido = time.monotonic()
+        estado = await medir_db("obtener_estado", gestor_estado.obtener_estado_async(evaluacion_uuid)) or {}
+        if all(clave in estado and estado[clave] == valor for clave, valor in campos.items()):
+            metricas.incrementar("estado.actualizaciones_sin_cambios")
+            self._anotar_idioma(evaluacion_uuid, estado, leido)
+            return False
+        estado = {**estado, **campos}
+        await medir_db("guardar_estado", gestor_estado.guardar_estado_async(evaluacion_uuid, estado))
+        metricas.incrementar("estado.actualizaciones")
+        self._anotar_idioma(evaluacion_uuid, estado, time.monotonic())
+        return True
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "idiomas": len(self._idiomas),
+            "lecturas_en_curso": len(self._cargas),
+            "ttl_idioma_seg": ESTADO_IDIOMA_TTL_SEG,
+        }
+
+
+# Instancia única usada por las rutas del formulario y de reportes
+cache_estado = CacheEstado()
@@ -0,0 +1,483 @@
+# en app/core/cache_formulario.py
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.maestro_preguntas import maestro_preguntas
+from app.core.catalogos import almacen_catalogos, UMBRAL_CATALOGO_INLINE
+from app.core.carga_async import CargasEnCurso, ejecutor_carga
+from app.core.metricas import metricas
+from app.core.definicion_compacta import descongelar
+from app.core.cargador_recursos import cargar_seccion_entrevista
+
+# Número máximo de payloads renderizados (empresa, guion, idioma) que se conservan
+MAX_PAYLOADS = int(os.getenv("FORM_CACHE_MAX_PAYLOADS", "256"))
+# Secciones cuyas definiciones y catálogos se cargan a la vez al renderizar un payload
+MAX_SECCIONES_CONCURRENTES = int(os.getenv("FORM_SECCIONES_CONCURRENTES", "8"))
+# Nivel de gzip de la parte estática de /form/data (se comprime una vez por payload)
+NIVEL_GZIP = int(os.getenv("FORM_NIVEL_GZIP", "6"))
+# Por debajo de este tamaño no vale la pena comprimir la respuesta
+MIN_BYTES_GZIP = 1024
+
+
+def extraer_nombre_por_idioma(nombre_obj, idioma: str = "ESP") -> str:
+    """
+    Extrae el nombre en el idioma especificado desde un objeto multiidioma.
+    Si el nombre es un string, lo devuelve tal cual.
+    """
+    if isinstance(nombre_obj, str):
+        return nombre_obj
+    if isinstance(nombre_obj, Mapping):
+        # Intentar obtener el idioma solicitado, con fallback a ESP
+        texto = nombre_obj.get(idioma.upper())
+        if not texto:
+            texto = nombre_obj.get("ESP")
+        if not texto:
+            # Si no hay ESP, tomar el primer valor disponible
+            texto = next(iter(nombre_obj.values()), None) if nombre_obj else None
+        return texto if texto else ""
+    return ""
+
+
+def huella_guion(guion_secciones: List[Dict[str, Any]]) -> str:
+    """
+    Huella de las secciones de tipo 'entrevista' de un guion: dos guiones con las
+    mismas secciones (archivo y naturaleza, en el mismo orden) comparten payload.
+    """
+    relevantes = [(s.get("archivo"), s.get("naturaleza", "dato_plano")) for s in secciones_entrevista(guion_secciones)]
+    return hashlib.sha1(json.dumps(relevantes).encode("utf-8")).hexdigest()
+
+
+def secciones_entrevista(guion_secciones: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Secciones del guion que forman parte del formulario (tipo 'entrevista' con archivo), en orden."""
+    return [s for s in guion_secciones if s.get("tipo") == "entrevista" and s.get("archivo")]
+
+
+def calcular_etag(etag_estatico: str, datos_guardados: Dict[str, Any]) -> str:
+    """ETag fuerte de la respuesta completa: payload estático + datos guardados del candidato."""
+    h = hashlib.sha256(etag_estatico.encode("ascii"))
+    h.update(json.dumps(datos_guardados, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+    return f'"{h.hexdigest()[:32]}"'
+
+
+def etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    """Compara la cabecera If-None-Match (puede traer varios valores) con el ETag actual."""
+    if not if_none_match:
+        return False
+    candidatos = [v.strip() for v in if_none_match.split(",")]
+    return "*" in candidatos or etag in candidatos
+
+
+def acepta_gzip(accept_encoding: Optional[str]) -> bool:
+    """True si la cabecera Accept-Encoding admite gzip (y no con q=0)."""
+    for valor in (accept_encoding or "").split(","):
+        nombre, _, parametros = valor.strip().partition(";")
+        if nombre.strip().lower() not in ("gzip", "*"):
+            continue
+        calidad = parametros.strip().lower()
+        if not calidad.startswith("q="):
+            return True
+        try:
+            return float(calidad[2:]) > 0
+        except ValueError:
+            return False
+    return False
+
+
+def _json_compacto(valor: Any) -> bytes:
+    # Mismo formato que JSONResponse
+    return json.dumps(valor, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class _CuerpoPreserializado:
+    """
+    Respuesta de /form/data sin los datos guardados, ya serializada y comprimida:
+        prefijo = {"success":true,"idioma":...,"secciones":[...],"datos_guardados":
+    La respuesta de cada candidato es prefijo + datos + campos propios (ej: revision) + "}".
+
+    El gzip del prefijo termina con un Z_FULL_FLUSH (bloque no final, alineado a
+    byte y sin referencias hacia atrás), así que el resto se comprime aparte como
+    deflate crudo y se concatena; solo falta el trailer (CRC32 y largo totales).
+    """
+    __slots__ = ("prefijo", "_gzip", "_crc", "_lock")
+
+    def __init__(self, prefijo: bytes):
+        self.prefijo = prefijo
+        self._gzip: Optional[bytes] = None
+        self._crc = zlib.crc32(prefijo)
+        self._lock = threading.Lock()
+
+    def _prefijo_gzip(self) -> bytes:
+        if self._gzip is None:
+            with self._lock:
+                if self._gzip is None:
+                    with metricas.cronometro("payload.comprimir"):
+                        compresor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 31)
+                        self._gzip = compresor.compress(self.prefijo) + compresor.flush(zlib.Z_FULL_FLUSH)
+        return self._gzip
+
+    @staticmethod
+    def _resto(datos_guardados: Dict[str, Any], extras: Dict[str, Any]) -> bytes:
+        partes = [_json_compacto(datos_guardados)]
+        for clave, valor in extras.items():
+            partes.append(b"," + _json_compacto(clave) + b":" + _json_compacto(valor))
+        partes.append(b"}")
+        return b"".join(partes)
+
+    def cuerpo(self, datos_guardados: Dict[str, Any], **extras) -> bytes:
+        return self.prefijo + self._resto(datos_guardados, extras)
+
+    def cuerpo_gzip(self, datos_guardados: Dict[str, Any], **extras) -> bytes:
+        resto = self._resto(datos_guardados, extras)
+        compresor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, -15)
+        crc = zlib.crc32(resto, self._crc)
+        largo = (len(self.prefijo) + len(resto)) & 0xFFFFFFFF
+        return b"".join((
+            self._prefijo_gzip(), compresor.compress(resto), compresor.flush(), struct.pack("<II", crc, largo),
+        ))
+
+
+class _PayloadRenderizado:
+    """Secciones ya renderizadas para un (empresa, guion, idioma) y lo necesario para revalidarlas."""
+    __slots__ = ("secciones", "etag", "empresa", "definiciones", "catalogos", "idioma", "_cuerpo")
+
+    def __init__(self, secciones: tuple, etag: str, empresa: Optional[str], definiciones: tuple, catalogos: tuple,
+                 idioma: str = "ESP"):
+        self.secciones = secciones
+        self.empresa = empresa
+        self.etag = etag
+        # Objetos de definición (de maestro_preguntas) con los que se renderizó cada sección
+        self.definiciones = definiciones
+        # (clave, versión) de los catálogos usados
+        self.catalogos = catalogos
+        self.idioma = idioma
+        self._cuerpo: Optional[_CuerpoPreserializado] = None
+
+    def cuerpo_form_data(self) -> _CuerpoPreserializado:
+        """
+        Parte estática de la respuesta de /form/data; se serializa la primera vez
+        que se pide (los payloads de una sola sección nunca la necesitan).
+        """
+        if self._cuerpo is None:
+            with metricas.cronometro("payload.serializar"):
+                self._cuerpo = _CuerpoPreserializado(b"".join((
+                    b'{"success":true,"idioma":', _json_compacto(self.idioma),
+                    b',"secciones":', _json_compacto(self.secciones), b',"datos_guardados":',
+                )))
+        return self._cuerpo
+
+    def secciones_archivo(self) -> List[Tuple[str, str]]:
+        """(empresa, archivo) de cada sección, con las claves que usa maestro_preguntas."""
+        return [
+            (self.empresa or "", archivo if archivo.endswith(".json") else f"{archivo}.json")
+            for archivo, _definicion in self.definiciones
+        ]
+
+    def guion(self) -> List[Dict[str, Any]]:
+        """Secciones del guion con las que se renderizó (lo que entra en huella_guion)."""
+        return [{"tipo": "entrevista", "archivo": s["key"], "naturaleza": s["naturaleza"]} for s in self.secciones]
+
+
+class CacheFormulario:
+    """
+    Caché de payloads de formulario completamente renderizados, por
+    (empresa, huella del guion, idioma). Las secciones guardadas son copias
+    propias, nunca los dicts compartidos de maestro_preguntas, y no se
+    modifican después de construirse: se sirven tal cual.
+    """
+
+    def __init__(self, max_payloads: int = MAX_PAYLOADS):
+        self._max_payloads = max_payloads
+        self._payloads: "OrderedDict[Tuple[str, str, str], _PayloadRenderizado]" = OrderedDict()
+        self._renders_en_curso = CargasEnCurso()
+        # Grafo inverso: sección (empresa, archivo) o catálogo -> claves de los payloads que los incluyen
+        self._por_seccion: Dict[Tuple[str, str], Set[Tuple[str, str, str]]] = {}
+        self._por_catalogo: Dict[str, Set[Tuple[str, str, str]]] = {}
+        self._lock_dependencias = threading.Lock()
+
+    @staticmethod
+    def _nombre_seccion(nombre_archivo: str, definiciones: Optional[Dict[str, Any]],
+                        empresa: Optional[str], idioma: str) -> str:
+        # Nombre de la sección desde nombre_corto, según el idioma
+        nombre_seccion = nombre_archivo.replace('.json', '').replace('_', ' ').capitalize()  # Fallback
+        nombre_corto_obj = definiciones.get("nombre_corto") if definiciones else None
+        if nombre_corto_obj is None:
+            seccion_json = cargar_seccion_entrevista(nombre_archivo, empresa)
+            if isinstance(seccion_json, dict):
+                for value in seccion_json.values():
+                    if isinstance(value, dict) and "nombre_corto" in value:
+                        nombre_corto_obj = value["nombre_corto"]
+                        break
+        if nombre_corto_obj:
+            nombre_seccion = extraer_nombre_por_idioma(nombre_corto_obj, idioma)
+        else:
+            logging.warning(f"[FORM] No se encontró nombre_corto para {nombre_archivo}")
+        return nombre_seccion
+
+    def _renderizar_seccion(self, seccion_info: Dict[str, Any], empresa: Optional[str], idioma: str,
+                            catalogos: Dict[str, Optional[str]]) -> Tuple[Dict[str, Any], Any]:
+        nombre_archivo = seccion_info["archivo"]
+        definiciones = maestro_preguntas.obtener_definiciones(nombre_archivo, empresa)
+        preguntas_base = definiciones.get("datos", []) if definiciones else []
+        nombre_seccion = self._nombre_seccion(nombre_archivo, definiciones, empresa, idioma)
+
+        preguntas = []
+        for pregunta_base in preguntas_base:
+            # Copia propia y modificable: la definición en caché del maestro es inmutable
+            pregunta = descongelar(pregunta_base)
+            # Convertir el nombre multiidioma a string según el idioma del usuario
+            if "nombre" in pregunta:
+                pregunta["nombre"] = extraer_nombre_por_idioma(pregunta["nombre"], idioma)
+            # Pre-procesar catálogo si existe: los pequeños van en el payload,
+            # los grandes solo como referencia y el navegador los pide a /form/catalogo/{clave}
+            if pregunta.get("tipo") == "CATÁLOGO":
+                catalogo_ref = pregunta.get("catalogo")
+                if catalogo_ref:
+                    opciones = almacen_catalogos.obtener_opciones(catalogo_ref, idioma)
+                    catalogos[catalogo_ref] = almacen_catalogos.version(catalogo_ref)
+                    pregunta["catalogo_ref"] = catalogo_ref
+                    if len(opciones) > UMBRAL_CATALOGO_INLINE:
+                        del pregunta["catalogo"]
+                        pregunta["catalogo_remoto"] = True
+                        pregunta["catalogo_total"] = len(opciones)
+                    else:
+                        pregunta["catalogo"] = list(opciones)
+            preguntas.append(pregunta)
+
+        seccion = {
+            "key": nombre_archivo,
+            "nombre": nombre_seccion,
+            "naturaleza": seccion_info.get("naturaleza", "dato_plano"),
+            "preguntas": tuple(preguntas),
+        }
+        return seccion, definiciones
+
+    def _renderizar(self, empresa: Optional[str], guion_secciones: List[Dict[str, Any]], idioma: str) -> _PayloadRenderizado:
+        secciones = []
+        definiciones = []
+        catalogos: Dict[str, Optional[str]] = {}
+        # Solo procesamos las secciones que son de tipo 'entrevista'
+        for seccion_info in secciones_entrevista(guion_secciones):
+            with metricas.cronometro("render.seccion"):
+                seccion, definicion = self._renderizar_seccion(seccion_info, empresa, idioma, catalogos)
+            secciones.append(seccion)
+            definiciones.append((seccion_info["archivo"], definicion))
+
+        secciones = tuple(secciones)
+        serializado = json.dumps(secciones, sort_keys=True, ensure_ascii=False)
+        etag = hashlib.sha256(f"{idioma}:{serializado}".encode("utf-8")).hexdigest()
+        return _PayloadRenderizado(secciones, etag, empresa, tuple(definiciones), tuple(catalogos.items()), idioma)
+
+    def _vigente(self, payload: _PayloadRenderizado) -> bool:
+        # Solo consulta cachés (sin leer archivos): el maestro devuelve el mismo
+        # objeto de definiciones mientras sigue vigente
+        for nombre_archivo, definicion in payload.definiciones:
+            if definicion is not None and maestro_preguntas.consultar_cache(nombre_archivo, payload.empresa) is not definicion:
+                return False
+        for catalogo_ref, version in payload.catalogos:
+            if version is not None and almacen_catalogos.version_en_cache(catalogo_ref) != version:
+                return False
+        return True
+
+    def obtener_payload(self, empresa: Optional[str], guion_secciones: List[Dict[str, Any]], idioma: str) -> _PayloadRenderizado:
+        """
+        Devuelve las secciones renderizadas para el guion e idioma indicados,
+        renderizándolas solo si no están en caché o sus fuentes cambiaron.
+        """
+        idioma = (idioma or "ESP").upper()
+        clave = (empresa or "", huella_guion(guion_secciones), idioma)
+        payload = self._consultar(clave)
+        if payload is not None:
+            return payload
+        return self._renderizar_y_guardar(clave, empresa, guion_secciones, idioma)
+
+    async def obtener_payload_async(self, empresa: Optional[str], guion_secciones: List[Dict[str, Any]], idioma: str) -> _PayloadRenderizado:
+        """
+        Versión para handlers async: un acierto se resuelve en el event loop; en un
+        fallo las secciones se cargan concurrentemente y se renderizan en el pool de
+        hilos. Las peticiones concurrentes del mismo payload comparten un solo render.
+        """
+        idioma = (idioma or "ESP").upper()
+        clave = (empresa or "", huella_guion(guion_secciones), idioma)
+        payload = self._consultar(clave)
+        if payload is not None:
+            return payload
+        return await self._renders_en_curso.ejecutar_corrutina(
+            clave, self._precargar_y_renderizar, clave, empresa, guion_secciones, idioma
+        )
+
+    async def _precargar_y_renderizar(self, clave: Tuple[str, str, str], empresa: Optional[str],
+                                      guion_secciones: List[Dict[str, Any]], idioma: str) -> _PayloadRenderizado:
+        """
+        Carga en paralelo (como máximo MAX_SECCIONES_CONCURRENTES secciones a la vez)
+        las definiciones y catálogos de todas las secciones, y después renderiza en
+        el pool de hilos con todo ya en caché, respetando el orden del guion.
+        """
+        limite = asyncio.Semaphore(MAX_SECCIONES_CONCURRENTES)
+
+        async def precargar(nombre_archivo: str):
+            async with limite:
+                definiciones = await maestro_preguntas.obtener_definiciones_async(nombre_archivo, empresa)
+                catalogos = {
+                    p.get("catalogo") for p in (definiciones or {}).get("datos", [])
+                    if p.get("tipo") == "CATÁLOGO" and isinstance(p.get("catalogo"), str)
+                }
+                await asyncio.gather(*(almacen_catalogos.version_async(c) for c in catalogos))
+
+        with metricas.cronometro("render.precarga"):
+            await asyncio.gather(*(precargar(s["archivo"]) for s in secciones_entrevista(guion_secciones)))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            ejecutor_carga, self._renderizar_y_guardar, clave, empresa, guion_secciones, idioma
+        )
+
+    async def obtener_indice_async(self, empresa: Optional[str], guion_secciones: List[Dict[str, Any]],
+                                   idioma: str) -> List[Dict[str, Any]]:
+        """
+        Índice ligero del formulario: key, nombre y naturaleza de cada sección, sin
+        preguntas ni catálogos. Solo necesita las definiciones (no renderiza nada).
+        """
+        idioma = (idioma or "ESP").upper()
+        payload = self._payloads.get((empresa or "", huella_guion(guion_secciones), idioma))
+        if payload is not None and self._vigente(payload):
+            return [{"key": s["key"], "nombre": s["nombre"], "naturaleza": s["naturaleza"]} for s in payload.secciones]
+
+        limite = asyncio.Semaphore(MAX_SECCIONES_CONCURRENTES)
+
+        async def entrada(seccion_info: Dict[str, Any]) -> Dict[str, Any]:
+            nombre_archivo = seccion_info["archivo"]
+            async with limite:
+                definiciones = await maestro_preguntas.obtener_definiciones_async(nombre_archivo, empresa)
+            return {
+                "key": nombre_archivo,
+                "nombre": self._nombre_seccion(nombre_archivo, definiciones, empresa, idioma),
+                "naturaleza": seccion_info.get("naturaleza", "dato_plano"),
+            }
+
+        return list(await asyncio.gather(*(entrada(s) for s in secciones_entrevista(guion_secciones))))
+
+    async def obtener_seccion_async(self, empresa: Optional[str], seccion_info: Dict[str, Any], idioma: str) -> _PayloadRenderizado:
+        """Payload de una sola sección del guion (se cachea igual que un guion de una sección)."""
+        return await self.obtener_payload_async(empresa, [seccion_info], idioma)
+
+    async def secciones_conforme_listas(self, empresa: Optional[str], guion_secciones: List[Dict[str, Any]],
+                                        idioma: str) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Entrega (posición, sección renderizada) a medida que cada sección queda lista,
+        no en el orden del guion. Si el payload completo ya está en caché se entrega
+        en orden. Si el consumidor deja de iterar, se cancelan los renders pendientes.
+        """
+        idioma = (idioma or "ESP").upper()
+        payload = self._payloads.get((empresa or "", huella_guion(guion_secciones), idioma))
+        if payload is not None and self._vigente(payload):
+            for posicion, seccion in enumerate(payload.secciones):
+                yield posicion, seccion
+            return
+
+        limite = asyncio.Semaphore(MAX_SECCIONES_CONCURRENTES)
+
+        async def renderizar(posicion: int, seccion_info: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+            async with limite:
+                payload_seccion = await self.obtener_seccion_async(empresa, seccion_info, idioma)
+            return posicion, payload_seccion.secciones[0]
+
+        tareas = [asyncio.ensure_future(renderizar(i, s)) for i, s in enumerate(secciones_entrevista(guion_secciones))]
+        try:
+            for siguiente in asyncio.as_completed(tareas):
+                yield await siguiente
+        finally:
+            for tarea in tareas:
+                if not tarea.done():
+                    tarea.cancel()
+
+    def _consultar(self, clave: Tuple[str, str, str]) -> Optional[_PayloadRenderizado]:
+        payload = self._payloads.get(clave)
+        if payload is not None and self._vigente(payload):
+            with self._lock_dependencias:
+                # Los hilos de render desalojan de este mismo dict
+                if self._payloads.get(clave) is payload:
+                    self._payloads.move_to_end(clave)
+            metricas.incrementar("payload.aciertos")
+            return payload
+        metricas.incrementar("payload.fallos")
+        return None
+
+    def _renderizar_y_guardar(self, clave: Tuple[str, str, str], empresa: Optional[str],
+                              guion_secciones: List[Dict[str, Any]], idioma: str) -> _PayloadRenderizado:
+        with metricas.cronometro("render.payload"):
+            payload = self._renderizar(empresa, guion_secciones, idioma)
+        with self._lock_dependencias:
+            anterior = self._payloads.pop(clave, None)
+            if anterior is not None:
+                self._desenlazar(clave, anterior)
+            self._payloads[clave] = payload
+            self._enlazar(clave, payload)
+            while len(self._payloads) > self._max_payloads:
+                self._desenlazar(*self._payloads.popitem(last=False))
+        return payload
+
+    # Estos dos se llaman con _lock_dependencias tomado
+    def _enlazar(self, clave: Tuple[str, str, str], payload: _PayloadRenderizado):
+        for seccion in payload.secciones_archivo():
+            self._por_seccion.setdefault(seccion, set()).add(clave)
+        for catalogo_ref, _version in payload.catalogos:
+            self._por_catalogo.setdefault(catalogo_ref, set()).add(clave)
+
+    def _desenlazar(self, clave: Tuple[str, str, str], payload: _PayloadRenderizado):
+        nodos = [(self._por_seccion, s) for s in payload.secciones_archivo()]
+        nodos += [(self._por_catalogo, c) for c, _version in payload.catalogos]
+        for indice, nodo in nodos:
+            claves = indice.get(nodo)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del indice[nodo]
+
+    def invalidar_dependientes(self, secciones: Iterable[Tuple[str, str]] = (),
+                               catalogos: Iterable[str] = ()) -> List[_PayloadRenderizado]:
+        """
+        Descarta solo los payloads que incluyen alguna de las secciones (empresa, archivo)
+        o alguno de los catálogos indicados. Devuelve los payloads descartados, para
+        volver a renderizarlos con rerenderizar_async.
+        """
+        with self._lock_dependencias:
+            claves = set()
+            for seccion in secciones:
+                claves.update(self._por_seccion.get(seccion, ()))
+            for catalogo_ref in catalogos:
+                claves.update(self._por_catalogo.get(catalogo_ref, ()))
+            descartados = []
+            for clave in claves:
+                payload = self._payloads.pop(clave, None)
+                if payload is not None:
+                    self._desenlazar(clave, payload)
+                    descartados.append(payload)
+        metricas.incrementar("payload.invalidados_por_dependencia", len(descartados))
+        return descartados
+
+    async def rerenderizar_async(self, payloads: Iterable[_PayloadRenderizado]) -> int:
+        """Vuelve a renderizar payloads descartados (mismo empresa, guion e idioma)."""
+        renderizados = await asyncio.gather(*(
+            self.obtener_payload_async(p.empresa, p.guion(), p.idioma) for p in payloads
+        ))
+        return len(renderizados)
+
+    def invalidar(self):
+        """Descarta todos los payloads renderizados."""
+        with self._lock_dependencias:
+            self._payloads.clear()
+            self._por_seccion.clear()
+            self._por_catalogo.clear()
+
+
+# Instancia única usada por las rutas del formulario
+cache_formulario = CacheFormulario()
@@ -0,0 +1,45 @@
+# en app/core/carga_async.py
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+# Hilos dedicados a leer y parsear archivos de inv_datos fuera del event loop
+MAX_HILOS_CARGA = int(os.getenv("INV_DATOS_HILOS_CARGA", "4"))
+
+ejecutor_carga = ThreadPoolExecutor(max_workers=MAX_HILOS_CARGA, thread_name_prefix="inv-datos-carga")
+
+
+class CargasEnCurso:
+    """
+    Coalescencia de cargas ("single-flight"): si varias corrutinas piden la misma
+    clave mientras su carga está en curso, todas esperan el mismo resultado y la
+    función se ejecuta una sola vez en el pool de hilos.
+    """
+
+    def __init__(self):
+        self._en_curso: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._en_curso)
+
+    def _registrar(self, clave: Hashable, futuro: asyncio.Future) -> asyncio.Future:
+        self._en_curso[clave] = futuro
+        futuro.add_done_callback(lambda _f: self._en_curso.pop(clave, None))
+        return futuro
+
+    async def ejecutar(self, clave: Hashable, funcion: Callable[..., Any], *args) -> Any:
+        futuro = self._en_curso.get(clave)
+        if futuro is None:
+            loop = asyncio.get_running_loop()
+            futuro = self._registrar(clave, loop.run_in_executor(ejecutor_carga, funcion, *args))
+        # shield: si un solicitante se cancela, la carga sigue para los demás
+        return await asyncio.shield(futuro)
+
+    async def ejecutar_corrutina(self, clave: Hashable, funcion: Callable[..., Awaitable[Any]], *args) -> Any:
+        """Igual que ejecutar(), para cargas que son corrutinas (se ejecutan como tarea en el event loop)."""
+        futuro = self._en_curso.get(clave)
+        if futuro is None:
+            futuro = self._registrar(clave, asyncio.ensure_future(funcion(*args)))
+        return await asyncio.shield(futuro)
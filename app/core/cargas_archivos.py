@@ -0,0 +1,312 @@
+# en app/core/cargas_archivos.py
+"""
+Cargas reanudables de archivos (documentos y fotos de la sección de archivos).
+
+- El navegador declara el archivo (nombre, tamaño y sha256) y lo envía en
+  fragmentos con su desplazamiento. Cada fragmento se escribe en disco a medida
+  que llega (nunca se junta el archivo en memoria) en CARGAS_ARCHIVOS_DIR.
+- El id de la carga sale de (evaluación, clave, tamaño, sha256, nombre): volver a
+  declarar el mismo archivo tras un corte devuelve la misma carga y cuántos
+  bytes ya se recibieron, y el envío sigue desde ahí.
+- Con el último fragmento se verifica el sha256 leyendo el archivo por bloques.
+  El sha256 declarado es opcional porque el navegador no siempre puede
+  calcularlo (crypto.subtle solo existe en https y necesita el archivo entero en
+  memoria, así que no se calcula para los archivos grandes). Sin él se calcula
+  igual al terminar, para los metadatos y para no guardar dos veces el mismo
+  contenido, pero un fragmento dañado en el camino no se detecta.
+- Las miniaturas de las imágenes se generan en un pool de hilos propio, si
+  Pillow está instalado; sin él los archivos se guardan igual, sin miniatura.
+
+Un flock sobre '<carga>.lock' impide que dos peticiones (de este u otro worker)
+escriban la misma carga a la vez. Las cargas que no se terminan se borran
+después de EXPIRACION_CARGAS_SEG.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.core.metricas import metricas
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow es opcional: sin él no se generan miniaturas
+    Image = None
+
+try:
+    import fcntl
+except ImportError:  # fuera de POSIX no hay flock: la exclusión es solo dentro del proceso
+    fcntl = None
+
+CARGAS_ARCHIVOS_DIR = Path(os.getenv("CARGAS_ARCHIVOS_DIR", "cargas_archivos"))
+MINIATURAS_DIR = Path(os.getenv("ARCHIVOS_MINIATURAS_DIR", "miniaturas_archivos"))
+# Tamaño máximo de un archivo y de un fragmento, y tamaño de fragmento sugerido al navegador
+MAX_BYTES_ARCHIVO = int(os.getenv("ARCHIVOS_MAX_BYTES", str(100 * 1024 * 1024)))
+MAX_BYTES_FRAGMENTO = int(os.getenv("ARCHIVOS_MAX_FRAGMENTO", str(8 * 1024 * 1024)))
+TAMANO_FRAGMENTO = int(os.getenv("ARCHIVOS_TAMANO_FRAGMENTO", str(1024 * 1024)))
+# Cargas sin terminar que se conservan en disco para reanudarse
+EXPIRACION_CARGAS_SEG = float(os.getenv("ARCHIVOS_EXPIRACION_HORAS", "24")) * 3600
+MAX_HILOS_MINIATURAS = int(os.getenv("ARCHIVOS_MINIATURAS_HILOS", "2"))
+LADO_MINIATURA = int(os.getenv("ARCHIVOS_MINIATURA_LADO", "320"))
+# Bytes que se acumulan antes de escribir en disco (fuera del event loop)
+_BUFFER_ESCRITURA = 1024 * 1024
+_BLOQUE_LECTURA = 1024 * 1024
+
+ejecutor_miniaturas = ThreadPoolExecutor(max_workers=MAX_HILOS_MINIATURAS, thread_name_prefix="miniaturas")
+
+_ID_VALIDO = re.compile(r"^[0-9a-f]{40}$")
+_NOMBRE_VALIDO = re.compile(r"^[A-Za-z0-9_-]+$")
+_SHA256_VALIDO = re.compile(r"^[0-9a-f]{64}$")
+
+
+class CargaInvalida(Exception):
+    """Declaración o fragmento que no se puede aceptar (400)."""
+
+
+class DesfaseCarga(Exception):
+    """El fragmento no empieza donde termina lo recibido (409); el cliente debe seguir desde 'recibido'."""
+
+    def __init__(self, recibido: int):
+        super().__init__(f"Se esperaba el desplazamiento {recibido}.")
+        self.recibido = recibido
+
+
+class CargaOcupada(Exception):
+    """Otra petición está escribiendo la misma carga (409)."""
+
+
+def ruta_miniatura(archivo_id: str) -> Optional[Path]:
+    """Miniatura en disco de un archivo guardado; None si el id no es válido."""
+    if not _NOMBRE_VALIDO.match(archivo_id or ""):
+        return None
+    return MINIATURAS_DIR / f"{archivo_id}.jpg"
+
+
+class Carga:
+    __slots__ = ("id", "evaluacion_uuid", "seccion", "clave", "nombre", "tamano", "sha256", "tipo", "creada")
+
+    def __init__(self, evaluacion_uuid: str, seccion: str, clave: str, nombre: str, tamano: int,
+                 sha256: Optional[str], tipo: str, creada: Optional[float] = None):
+        self.id = hashlib.sha1(f"{evaluacion_uuid}|{clave}|{tamano}|{sha256}|{nombre}".encode("utf-8")).hexdigest()
+        self.evaluacion_uuid = evaluacion_uuid
+        self.seccion = seccion
+        self.clave = clave
+        self.nombre = nombre
+        self.tamano = tamano
+        self.sha256 = sha256
+        self.tipo = tipo
+        self.creada = creada if creada is not None else time.time()
+
+    @property
+    def ruta(self) -> Path:
+        return CARGAS_ARCHIVOS_DIR / f"{self.id}.parte"
+
+    @property
+    def ruta_meta(self) -> Path:
+        return CARGAS_ARCHIVOS_DIR / f"{self.id}.json"
+
+    @property
+    def recibido(self) -> int:
+        try:
+            return self.ruta.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def a_dict(self) -> Dict[str, Any]:
+        return {campo: getattr(self, campo) for campo in self.__slots__ if campo != "id"}
+
+
+class GestorCargas:
+    """Cargas en curso, persistidas en disco para poder reanudarse desde cualquier worker."""
+
+    def __init__(self):
+        self._miniaturas_pendientes = 0
+        # Cargas tomadas en este proceso (solo se usa donde no hay flock)
+        self._tomadas = set()
+
+    def declarar(self, evaluacion_uuid: str, seccion: str, clave: str, nombre: str, tamano: Any,
+                 sha256: Optional[str], tipo: Optional[str] = None) -> Carga:
+        """Carga nueva, o la que ya existe para el mismo archivo (para reanudarla)."""
+        if not _NOMBRE_VALIDO.match(clave or ""):
+            raise CargaInvalida("Clave de campo inválida.")
+        if not isinstance(tamano, int) or isinstance(tamano, bool) or not 0 < tamano <= MAX_BYTES_ARCHIVO:
+            raise CargaInvalida(f"El archivo debe pesar entre 1 byte y {MAX_BYTES_ARCHIVO // (1024 * 1024)} MB.")
+        sha256 = sha256.lower() if isinstance(sha256, str) else None
+        if sha256 is not None and not _SHA256_VALIDO.match(sha256):
+            raise CargaInvalida("Hash sha256 inválido.")
+        nombre = os.path.basename(str(nombre or "archivo")).strip()[:200] or "archivo"
+
+        carga = Carga(evaluacion_uuid, seccion, clave, nombre, tamano, sha256,
+                      str(tipo or "application/octet-stream")[:100])
+        if carga.ruta_meta.is_file():
+            metricas.incrementar("cargas.reanudadas")
+            return carga
+        CARGAS_ARCHIVOS_DIR.mkdir(parents=True, exist_ok=True)
+        temporal = carga.ruta_meta.with_name(f"{carga.ruta_meta.name}.{os.getpid()}.tmp")
+        temporal.write_text(json.dumps(carga.a_dict()), encoding="utf-8")
+        os.replace(temporal, carga.ruta_meta)
+        metricas.incrementar("cargas.declaradas")
+        self._podar()
+        return carga
+
+    def obtener(self, evaluacion_uuid: str, carga_id: str) -> Optional[Carga]:
+        """Carga de esta evaluación; None si no existe (o ya expiró o terminó)."""
+        if not _ID_VALIDO.match(carga_id or ""):
+            return None
+        try:
+            datos = json.loads((CARGAS_ARCHIVOS_DIR / f"{carga_id}.json").read_text(encoding="utf-8"))
+            carga = Carga(**datos)
+        except (OSError, ValueError, TypeError):
+            return None
+        if carga.id != carga_id or carga.evaluacion_uuid != evaluacion_uuid:
+            return None
+        return carga
+
+    @asynccontextmanager
+    async def bloqueo(self, carga: Carga):
+        """Acceso exclusivo a la carga mientras se escribe y se termina; si está tomada, CargaOcupada."""
+        if fcntl is None:
+            if carga.id in self._tomadas:
+                raise CargaOcupada()
+            self._tomadas.add(carga.id)
+            try:
+                yield
+            finally:
+                self._tomadas.discard(carga.id)
+            return
+        CARGAS_ARCHIVOS_DIR.mkdir(parents=True, exist_ok=True)
+        with open(CARGAS_ARCHIVOS_DIR / f"{carga.id}.lock", "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise CargaOcupada()
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    async def recibir(self, carga: Carga, desplazamiento: int, flujo: AsyncIterator[bytes]) -> int:
+        """
+        Escribe un fragmento que empieza en 'desplazamiento' (llamar dentro de
+        bloqueo()). Lo que llegue antes de un corte queda escrito y cuenta como
+        recibido. Devuelve el total recibido.
+        """
+        recibido = carga.recibido
+        if desplazamiento != recibido:
+            raise DesfaseCarga(recibido)
+        en_fragmento = 0
+        pendiente = bytearray()
+        with open(carga.ruta, "ab") as destino:
+            try:
+                async for trozo in flujo:
+                    en_fragmento += len(trozo)
+                    if en_fragmento > MAX_BYTES_FRAGMENTO or recibido + en_fragmento > carga.tamano:
+                        raise CargaInvalida("El fragmento excede el tamaño declarado.")
+                    pendiente += trozo
+                    if len(pendiente) >= _BUFFER_ESCRITURA:
+                        await asyncio.to_thread(destino.write, bytes(pendiente))
+                        pendiente.clear()
+            finally:
+                if pendiente:
+                    await asyncio.to_thread(destino.write, bytes(pendiente))
+        metricas.incrementar("cargas.bytes_recibidos", en_fragmento)
+        return carga.recibido
+
+    def _sha256(self, ruta: Path) -> str:
+        h = hashlib.sha256()
+        with open(ruta, "rb") as archivo:
+            for bloque in iter(lambda: archivo.read(_BLOQUE_LECTURA), b""):
+                h.update(bloque)
+        return h.hexdigest()
+
+    async def verificar(self, carga: Carga) -> str:
+        """
+        sha256 del archivo completo (leído por bloques fuera del event loop). Si no
+        coincide con el declarado, descarta lo recibido para que se envíe de nuevo
+        y lanza CargaInvalida.
+        """
+        with metricas.cronometro("cargas.verificar"):
+            sha256 = await asyncio.to_thread(self._sha256, carga.ruta)
+        if carga.sha256 is not None and sha256 != carga.sha256:
+            metricas.incrementar("cargas.hash_invalido")
+            carga.ruta.unlink(missing_ok=True)
+            raise CargaInvalida("El archivo llegó dañado; vuelve a enviarlo.")
+        return sha256
+
+    def terminar(self, carga: Carga, archivo_id: str) -> bool:
+        """
+        Cierra una carga ya guardada: encola su miniatura (si es una imagen y hay
+        Pillow) y borra los archivos temporales. Devuelve si habrá miniatura.
+        """
+        metricas.incrementar("cargas.terminadas")
+        destino = ruta_miniatura(archivo_id)
+        if Image is None or destino is None or not carga.tipo.startswith("image/"):
+            self.descartar(carga)
+            return False
+        # El archivo temporal se borra cuando termina la miniatura, que lo lee
+        carga.ruta_meta.unlink(missing_ok=True)
+        self._miniaturas_pendientes += 1
+        futuro = ejecutor_miniaturas.submit(self._miniatura, carga, destino)
+        futuro.add_done_callback(lambda f: self._miniatura_terminada(carga, f))
+        return True
+
+    def _miniatura(self, carga: Carga, destino: Path):
+        with metricas.cronometro("cargas.miniatura"):
+            with Image.open(carga.ruta) as imagen:
+                # Para JPEG, decodifica directamente a una escala reducida
+                imagen.draft("RGB", (LADO_MINIATURA, LADO_MINIATURA))
+                imagen.thumbnail((LADO_MINIATURA, LADO_MINIATURA))
+                destino.parent.mkdir(parents=True, exist_ok=True)
+                temporal = destino.with_name(f"{destino.name}.{os.getpid()}.tmp")
+                imagen.convert("RGB").save(temporal, "JPEG", quality=80)
+                os.replace(temporal, destino)
+
+    def _miniatura_terminada(self, carga: Carga, futuro):
+        self._miniaturas_pendientes -= 1
+        error = futuro.exception()
+        if error is not None:
+            logging.warning(f"[ARCHIVOS] No se pudo generar la miniatura de {carga.nombre}: {error}")
+            metricas.incrementar("cargas.miniaturas_error")
+        self.descartar(carga)
+
+    def descartar(self, carga: Carga):
+        """Borra los archivos temporales de la carga."""
+        for ruta in (carga.ruta, carga.ruta_meta, CARGAS_ARCHIVOS_DIR / f"{carga.id}.lock"):
+            ruta.unlink(missing_ok=True)
+
+    def _podar(self):
+        """Borra las cargas sin terminar más antiguas que EXPIRACION_CARGAS_SEG."""
+        limite = time.time() - EXPIRACION_CARGAS_SEG
+        for ruta in CARGAS_ARCHIVOS_DIR.glob("*.json"):
+            try:
+                if ruta.stat().st_mtime >= limite:
+                    continue
+                # La última escritura de la parte cuenta como actividad
+                parte = ruta.with_suffix(".parte")
+                if parte.exists() and parte.stat().st_mtime >= limite:
+                    continue
+            except FileNotFoundError:
+                continue
+            metricas.incrementar("cargas.expiradas")
+            for sufijo in (".json", ".parte", ".lock"):
+                ruta.with_suffix(sufijo).unlink(missing_ok=True)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        en_disco = sum(1 for _ in CARGAS_ARCHIVOS_DIR.glob("*.json")) if CARGAS_ARCHIVOS_DIR.is_dir() else 0
+        return {
+            "cargas_en_disco": en_disco,
+            "miniaturas_pendientes": self._miniaturas_pendientes,
+            "miniaturas_disponibles": Image is not None,
+        }
+
+
+# Instancia única usada por las rutas de archivos
+gestor_cargas = GestorCargas()
@@ -0,0 +1,235 @@
+# en app/core/catalogos.py
+
+import bisect
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.config import INV_DATOS_CATALOGOS_DIR
+from app.core.snapshot_inv_datos import al_cambiar_generacion, leer_json
+from app.core.carga_async import CargasEnCurso
+from app.core.firma_archivo import firma_archivo
+from app.core.metricas import metricas
+
+# Número máximo de catálogos que se conservan en memoria
+MAX_CATALOGOS = int(os.getenv("CATALOGOS_MAX_EN_MEMORIA", "128"))
+# Cada cuántos segundos, como máximo, se revisa si el archivo del catálogo cambió
+INTERVALO_REVALIDACION_SEG = float(os.getenv("CATALOGOS_REVALIDACION_SEG", "1.0"))
+# Catálogos con más opciones que este umbral no se incluyen en el payload del formulario,
+# el navegador los pide bajo demanda a /form/catalogo/{clave}
+UMBRAL_CATALOGO_INLINE = int(os.getenv("CATALOGOS_UMBRAL_INLINE", "100"))
+
+_CLAVE_VALIDA = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas y sin acentos, para búsquedas por prefijo."""
+    descompuesto = unicodedata.normalize("NFKD", texto.casefold())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+class _OpcionesIdioma:
+    """Opciones de un catálogo en un idioma, con un índice ordenado para búsqueda por prefijo."""
+    __slots__ = ("opciones", "claves_orden", "indices_orden")
+
+    def __init__(self, opciones: Tuple[str, ...]):
+        self.opciones = opciones
+        normalizadas = [normalizar_texto(opcion) for opcion in opciones]
+        orden = sorted(range(len(opciones)), key=normalizadas.__getitem__)
+        self.claves_orden = [normalizadas[i] for i in orden]
+        self.indices_orden = orden
+
+
+class _EntradaCatalogo:
+    __slots__ = ("firma", "version", "por_idioma", "idioma_base", "revisado_en", "_valores")
+
+    def __init__(self, firma: tuple, por_idioma: Dict[str, _OpcionesIdioma], idioma_base: str):
+        self.firma = firma
+        self.version = hashlib.sha1(repr(firma).encode("ascii")).hexdigest()[:16]
+        self.por_idioma = por_idioma
+        self.idioma_base = idioma_base
+        self.revisado_en = time.monotonic()
+        self._valores: Optional[frozenset] = None
+
+    @property
+    def valores(self) -> frozenset:
+        """Opciones normalizadas de todos los idiomas (se arma la primera vez que se valida contra el catálogo)."""
+        if self._valores is None:
+            self._valores = frozenset(c for opciones in self.por_idioma.values() for c in opciones.claves_orden)
+        return self._valores
+
+
+class AlmacenCatalogos:
+    """
+    Carga cada catálogo de INV_DATOS_CATALOGOS_DIR una sola vez y lo guarda ya
+    resuelto en un arreglo de opciones por idioma. Es un LRU acotado y cada
+    entrada se invalida cuando cambia el mtime/tamaño de su archivo.
+    """
+
+    def __init__(self, max_catalogos: int = MAX_CATALOGOS):
+        self._max_catalogos = max_catalogos
+        self._catalogos: "OrderedDict[str, _EntradaCatalogo]" = OrderedDict()
+        # Se usa desde el event loop y desde los hilos de carga y de render
+        self._lock = threading.Lock()
+        self._cargas_en_curso = CargasEnCurso()
+
+    @staticmethod
+    def clave_valida(clave_catalogo: str) -> bool:
+        return bool(clave_catalogo) and bool(_CLAVE_VALIDA.match(clave_catalogo))
+
+    def _cargar(self, clave_catalogo: str) -> Optional[_EntradaCatalogo]:
+        catalogo_path = INV_DATOS_CATALOGOS_DIR / f"{clave_catalogo}.json"
+        firma = firma_archivo(catalogo_path)
+        if firma[0] is None:
+            logging.warning(f"[CATALOGO] No se encontró el archivo de catálogo: {catalogo_path}")
+            return None
+        try:
+            catalogo_data = leer_json(catalogo_path)
+        except Exception as e:
+            logging.error(f"[CATALOGO] No se pudo cargar el catálogo '{clave_catalogo}': {e}")
+            return None
+
+        items = catalogo_data.get("items", []) if isinstance(catalogo_data, dict) else []
+        idiomas = set()
+        for item in items:
+            valor_obj = item.get("valor") if isinstance(item, dict) else None
+            if isinstance(valor_obj, dict):
+                idiomas.update(k.upper() for k in valor_obj)
+        idioma_base = "ESP" if "ESP" in idiomas or not idiomas else sorted(idiomas)[0]
+
+        por_idioma = {}
+        for idioma in idiomas or {idioma_base}:
+            opciones = []
+            for item in items:
+                valor_obj = item.get("valor", {}) if isinstance(item, dict) else item
+                if isinstance(valor_obj, dict):
+                    # Obtener el valor en el idioma, con fallback a ESP
+                    valor_texto = valor_obj.get(idioma) or valor_obj.get("ESP") or str(valor_obj)
+                else:
+                    valor_texto = str(valor_obj)
+                opciones.append(valor_texto)
+            por_idioma[idioma] = _OpcionesIdioma(tuple(opciones))
+
+        logging.info(f"[CATALOGO] '{clave_catalogo}' cargado: {len(items)} opciones, idiomas={sorted(por_idioma)}")
+        return _EntradaCatalogo(firma, por_idioma, idioma_base)
+
+    def _usar(self, clave_catalogo: str, entrada: _EntradaCatalogo):
+        with self._lock:
+            # Otro hilo pudo descartarla o reemplazarla entretanto
+            if self._catalogos.get(clave_catalogo) is entrada:
+                self._catalogos.move_to_end(clave_catalogo)
+
+    def _entrada(self, clave_catalogo: str) -> Optional[_EntradaCatalogo]:
+        with self._lock:
+            entrada = self._catalogos.get(clave_catalogo)
+        if entrada is not None:
+            ahora = time.monotonic()
+            if ahora - entrada.revisado_en < INTERVALO_REVALIDACION_SEG:
+                self._usar(clave_catalogo, entrada)
+                return entrada
+            if firma_archivo(INV_DATOS_CATALOGOS_DIR / f"{clave_catalogo}.json") == entrada.firma:
+                entrada.revisado_en = ahora
+                self._usar(clave_catalogo, entrada)
+                return entrada
+            with self._lock:
+                if self._catalogos.get(clave_catalogo) is entrada:
+                    del self._catalogos[clave_catalogo]
+
+        if not self.clave_valida(clave_catalogo):
+            return None
+        metricas.incrementar("catalogos.cargas")
+        with metricas.cronometro("catalogos.cargar"):
+            entrada = self._cargar(clave_catalogo)
+        if entrada is None:
+            return None
+        with self._lock:
+            self._catalogos[clave_catalogo] = entrada
+            while len(self._catalogos) > self._max_catalogos:
+                self._catalogos.popitem(last=False)
+        return entrada
+
+    def _opciones_idioma(self, entrada: _EntradaCatalogo, idioma: str) -> _OpcionesIdioma:
+        return entrada.por_idioma.get((idioma or "ESP").upper()) or entrada.por_idioma[entrada.idioma_base]
+
+    def obtener_opciones(self, clave_catalogo: str, idioma: str = "ESP") -> Tuple[str, ...]:
+        """Devuelve las opciones del catálogo en el idioma indicado (tupla vacía si no existe)."""
+        entrada = self._entrada(clave_catalogo)
+        if entrada is None:
+            return ()
+        return self._opciones_idioma(entrada, idioma).opciones
+
+    def version(self, clave_catalogo: str) -> Optional[str]:
+        """Versión del catálogo (cambia cuando cambia su archivo); None si no existe."""
+        entrada = self._entrada(clave_catalogo)
+        return entrada.version if entrada is not None else None
+
+    def buscar(self, clave_catalogo: str, idioma: str, prefijo: str, limite: int = 50) -> List[str]:
+        """
+        Opciones cuyo texto empieza con el prefijo (sin distinguir mayúsculas ni acentos),
+        en orden alfabético. Usa búsqueda binaria sobre el índice ordenado.
+        """
+        entrada = self._entrada(clave_catalogo)
+        if entrada is None:
+            return []
+        opciones_idioma = self._opciones_idioma(entrada, idioma)
+        prefijo_norm = normalizar_texto(prefijo)
+        inicio = bisect.bisect_left(opciones_idioma.claves_orden, prefijo_norm)
+        resultado = []
+        for pos in range(inicio, min(inicio + limite, len(opciones_idioma.claves_orden))):
+            if not opciones_idioma.claves_orden[pos].startswith(prefijo_norm):
+                break
+            resultado.append(opciones_idioma.opciones[opciones_idioma.indices_orden[pos]])
+        return resultado
+
+    def contiene(self, clave_catalogo: str, valor: str) -> Optional[bool]:
+        """
+        Si 'valor' es una de las opciones del catálogo en cualquier idioma (sin distinguir
+        mayúsculas ni acentos). None si el catálogo no existe.
+        """
+        entrada = self._entrada(clave_catalogo)
+        if entrada is None:
+            return None
+        return normalizar_texto(valor) in entrada.valores
+
+    def version_en_cache(self, clave_catalogo: str) -> Optional[str]:
+        """Versión del catálogo solo si ya está cargado y vigente (no lee el archivo)."""
+        with self._lock:
+            entrada = self._catalogos.get(clave_catalogo)
+        if entrada is None:
+            return None
+        ahora = time.monotonic()
+        if ahora - entrada.revisado_en >= INTERVALO_REVALIDACION_SEG:
+            if firma_archivo(INV_DATOS_CATALOGOS_DIR / f"{clave_catalogo}.json") != entrada.firma:
+                return None
+            entrada.revisado_en = ahora
+        return entrada.version
+
+    async def version_async(self, clave_catalogo: str) -> Optional[str]:
+        """
+        Como version(), pero si el catálogo no está en memoria lo carga en el pool
+        de hilos, compartiendo la carga entre peticiones concurrentes.
+        Después de esto, obtener_opciones/buscar son aciertos en memoria.
+        """
+        version = self.version_en_cache(clave_catalogo)
+        if version is not None:
+            return version
+        return await self._cargas_en_curso.ejecutar(clave_catalogo, self.version, clave_catalogo)
+
+    def invalidar(self, clave_catalogo: str = None):
+        """Descarta un catálogo concreto o todos."""
+        with self._lock:
+            if clave_catalogo is None:
+                self._catalogos.clear()
+            else:
+                self._catalogos.pop(clave_catalogo, None)
+
+
+# Instancia única usada por toda la aplicación
+almacen_catalogos = AlmacenCatalogos()
+al_cambiar_generacion(almacen_catalogos.invalidar)
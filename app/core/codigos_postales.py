@@ -0,0 +1,313 @@
+# en app/core/codigos_postales.py
+"""
+Índice en memoria de códigos postales (catálogo de SEPOMEX) para autocompletar
+el domicilio del candidato.
+
+Se construye a partir de la base SQLite que genera la importación de
+inv_datos/cp_oficiales/CPdescarga.txt (o, si aún no existe, del propio TXT):
+    - CP -> estado, municipio, ciudad y colonias (cadenas internadas)
+    - lista ordenada de CPs para búsqueda por prefijo
+    - lista ordenada de nombres de colonia normalizados (nombre completo y a
+      partir de cada palabra) para búsqueda por prefijo con bisect
+
+La reconstrucción se hace en el pool de hilos leyendo por lotes; mientras tanto
+se sigue respondiendo con el índice anterior, que se reemplaza de una vez al terminar.
+"""
+
+import asyncio
+import bisect
+import logging
+import os
+import sqlite3
+import sys
+import time
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.config import INV_DATOS_DATOS_DIR
+from app.core.carga_async import CargasEnCurso
+from app.core.firma_archivo import firma_archivo
+from app.core.catalogos import normalizar_texto
+from app.core.metricas import metricas
+
+CP_OFICIALES_DIR = Path(os.getenv("CP_OFICIALES_DIR", str(INV_DATOS_DATOS_DIR.parent / "cp_oficiales")))
+CP_TXT_PATH = CP_OFICIALES_DIR / "CPdescarga.txt"
+CP_DB_PATH = Path(os.getenv("CP_DB_PATH", str(CP_OFICIALES_DIR / "codigos_postales.db")))
+# Cada cuántos segundos, como máximo, se revisa si la base (o el TXT) cambió
+INTERVALO_REVALIDACION_SEG = float(os.getenv("CP_REVALIDACION_SEG", "5.0"))
+# Filas que se leen por lote al reconstruir el índice
+FILAS_POR_LOTE = int(os.getenv("CP_FILAS_POR_LOTE", "5000"))
+# Las palabras más cortas no generan su propia entrada en el índice de colonias ("de", "la"...)
+MIN_LARGO_PALABRA = 3
+# Cada referencia del índice de colonias es un entero: (posición del CP << BITS_COLONIA) | posición de la colonia
+BITS_COLONIA = 12
+
+# Nombres de columna aceptados en la base SQLite: los del TXT de SEPOMEX o sus equivalentes en español
+_COLUMNAS = {
+    "cp": ("d_codigo", "codigo_postal", "cp"),
+    "colonia": ("d_asenta", "asentamiento", "colonia"),
+    "tipo": ("d_tipo_asenta", "tipo_asentamiento", "tipo_asenta"),
+    "municipio": ("d_mnpio", "municipio"),
+    "estado": ("d_estado", "estado"),
+    "ciudad": ("d_ciudad", "ciudad"),
+}
+_OBLIGATORIAS = ("cp", "colonia", "municipio", "estado")
+
+Fila = Tuple[str, str, str, str, str, str]  # cp, colonia, tipo, municipio, estado, ciudad
+
+
+def _fuente() -> Optional[Tuple[str, Path]]:
+    """Origen de los datos: la base SQLite si existe, si no el TXT oficial."""
+    if CP_DB_PATH.is_file():
+        return ("sqlite", CP_DB_PATH)
+    if CP_TXT_PATH.is_file():
+        return ("txt", CP_TXT_PATH)
+    return None
+
+
+def _filas_sqlite(ruta: Path) -> Iterator[Fila]:
+    """Lee las filas de la primera tabla que tenga las columnas de códigos postales."""
+    conexion = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True)
+    try:
+        tablas = [fila[0] for fila in conexion.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        for tabla in tablas:
+            columnas = {fila[1].lower(): fila[1] for fila in conexion.execute(f'PRAGMA table_info("{tabla}")')}
+            elegidas = {}
+            for campo, alternativas in _COLUMNAS.items():
+                elegidas[campo] = next((columnas[a] for a in alternativas if a in columnas), None)
+            if any(elegidas[campo] is None for campo in _OBLIGATORIAS):
+                continue
+            seleccion = ", ".join(f'"{elegidas[c]}"' if elegidas[c] else "''" for c in _COLUMNAS)
+            cursor = conexion.execute(f'SELECT {seleccion} FROM "{tabla}"')
+            while True:
+                lote = cursor.fetchmany(FILAS_POR_LOTE)
+                if not lote:
+                    return
+                for fila in lote:
+                    yield tuple("" if v is None else str(v) for v in fila)
+                # Cede el GIL entre lotes para no frenar al event loop
+                time.sleep(0)
+        raise ValueError(f"{ruta} no tiene una tabla con columnas de códigos postales")
+    finally:
+        conexion.close()
+
+
+def _filas_txt(ruta: Path) -> Iterator[Fila]:
+    """Lee CPdescarga.txt (separado por '|', en latin-1, con una línea de aviso antes del encabezado)."""
+    with open(ruta, encoding="latin-1", newline="") as f:
+        posiciones = None
+        for numero, linea in enumerate(f):
+            partes = linea.rstrip("\r\n").split("|")
+            if posiciones is None:
+                encabezado = [p.strip().lower() for p in partes]
+                if "d_codigo" not in encabezado:
+                    continue
+                posiciones = [next((encabezado.index(a) for a in alternativas if a in encabezado), None)
+                              for alternativas in _COLUMNAS.values()]
+                continue
+            yield tuple(partes[p].strip() if p is not None and p < len(partes) else "" for p in posiciones)
+            if numero % FILAS_POR_LOTE == 0:
+                time.sleep(0)
+
+
+class _DatosCP:
+    __slots__ = ("estado", "municipio", "ciudad", "colonias")
+
+    def __init__(self, estado: str, municipio: str, ciudad: str):
+        self.estado = estado
+        self.municipio = municipio
+        self.ciudad = ciudad
+        self.colonias: Any = []  # lista al construir, tupla de (nombre, tipo) al terminar
+
+    def a_dict(self, cp: str) -> Dict[str, Any]:
+        return {
+            "cp": cp,
+            "estado": self.estado,
+            "municipio": self.municipio,
+            "ciudad": self.ciudad,
+            "colonias": [{"nombre": nombre, "tipo": tipo} for nombre, tipo in self.colonias],
+        }
+
+
+class _IndiceCP:
+    """Índice inmutable una vez construido; se reemplaza completo en cada recarga."""
+    __slots__ = ("por_cp", "cps", "claves_colonias", "refs_colonias", "firma", "fuente",
+                 "total_asentamientos", "generado")
+
+    def __init__(self, filas: Iterator[Fila], firma: tuple, fuente: str):
+        por_cp: Dict[str, _DatosCP] = {}
+        total = 0
+        for cp, colonia, tipo, municipio, estado, ciudad in filas:
+            cp = cp.zfill(5)
+            if not cp.isdigit() or not colonia:
+                continue
+            datos = por_cp.get(cp)
+            if datos is None:
+                datos = por_cp[sys.intern(cp)] = _DatosCP(sys.intern(estado), sys.intern(municipio), sys.intern(ciudad))
+            datos.colonias.append((sys.intern(colonia), sys.intern(tipo)))
+            total += 1
+
+        cps = sorted(por_cp)
+        entradas = []
+        for posicion_cp, cp in enumerate(cps):
+            datos = por_cp[cp]
+            datos.colonias = tuple(sorted(set(datos.colonias)))[:1 << BITS_COLONIA]
+            for posicion, (nombre, _tipo) in enumerate(datos.colonias):
+                referencia = (posicion_cp << BITS_COLONIA) | posicion
+                # Los nombres se repiten mucho entre CPs ("Centro"): las claves se internan
+                normalizado = sys.intern(normalizar_texto(nombre))
+                entradas.append((normalizado, referencia))
+                # También se encuentra por cada palabra: "lomas de chapultepec" -> "chapultepec"
+                inicio = normalizado.find(" ")
+                while inicio != -1:
+                    resto = normalizado[inicio + 1:]
+                    if len(resto.split(" ", 1)[0]) >= MIN_LARGO_PALABRA:
+                        entradas.append((sys.intern(resto), referencia))
+                    inicio = normalizado.find(" ", inicio + 1)
+        entradas.sort()
+
+        self.por_cp = por_cp
+        self.cps = cps
+        self.claves_colonias = [entrada[0] for entrada in entradas]
+        self.refs_colonias = array("L", (entrada[1] for entrada in entradas))
+        self.firma = firma
+        self.fuente = fuente
+        self.total_asentamientos = total
+        self.generado = datetime.now(timezone.utc).isoformat()
+
+    @property
+    def version(self) -> str:
+        return f"{self.firma[0]}-{self.firma[1]}"
+
+
+class AlmacenCodigosPostales:
+    """
+    Consulta por CP y autocompletado por prefijo de CP o de colonia, siempre en
+    memoria. La primera petición espera a que se construya el índice; después,
+    si la base cambia, se reconstruye en segundo plano sin bloquear las consultas.
+    """
+
+    def __init__(self):
+        self._indice: Optional[_IndiceCP] = None
+        self._revisado_en = 0.0
+        self._cargas_en_curso = CargasEnCurso()
+        self._recarga: Optional[asyncio.Future] = None
+
+    def _construir(self) -> Optional[_IndiceCP]:
+        fuente = _fuente()
+        if fuente is None:
+            logging.warning(f"[CP] No existe {CP_DB_PATH} ni {CP_TXT_PATH}")
+            return None
+        tipo, ruta = fuente
+        firma = firma_archivo(ruta)
+        lector = _filas_sqlite if tipo == "sqlite" else _filas_txt
+        try:
+            with metricas.cronometro("cp.construir_indice"):
+                indice = _IndiceCP(lector(ruta), firma, tipo)
+        except (sqlite3.Error, OSError, ValueError) as e:
+            logging.error(f"[CP] No se pudo construir el índice desde {ruta}: {e}")
+            return None
+        metricas.incrementar("cp.reconstrucciones")
+        logging.info(f"[CP] Índice construido desde {ruta}: {len(indice.por_cp)} CPs, "
+                     f"{indice.total_asentamientos} asentamientos")
+        # Reemplazo atómico: las consultas en curso terminan con el índice anterior
+        self._indice = indice
+        self._revisado_en = time.monotonic()
+        return indice
+
+    def _desactualizado(self) -> bool:
+        ahora = time.monotonic()
+        if ahora - self._revisado_en < INTERVALO_REVALIDACION_SEG:
+            return False
+        self._revisado_en = ahora
+        fuente = _fuente()
+        return fuente is None or fuente[0] != self._indice.fuente or firma_archivo(fuente[1]) != self._indice.firma
+
+    async def recargar_async(self) -> Optional[_IndiceCP]:
+        """Reconstruye el índice en el pool de hilos (una sola vez aunque se pida varias)."""
+        return await self._cargas_en_curso.ejecutar("indice", self._construir)
+
+    async def indice_async(self) -> Optional[_IndiceCP]:
+        """
+        Índice vigente. Si no hay ninguno se espera a construirlo; si la base cambió
+        se lanza la reconstrucción en segundo plano y se responde con el actual.
+        """
+        if self._indice is None:
+            return await self.recargar_async()
+        if self._desactualizado() and (self._recarga is None or self._recarga.done()):
+            self._recarga = asyncio.ensure_future(self.recargar_async())
+        return self._indice
+
+    def consultar(self, cp: str) -> Optional[Dict[str, Any]]:
+        """Estado, municipio, ciudad y colonias de un CP exacto (None si no existe)."""
+        indice = self._indice
+        if indice is None:
+            return None
+        with metricas.cronometro("cp.consultar"):
+            cp = cp.strip()
+            datos = indice.por_cp.get(cp.zfill(5)) if cp.isdigit() else None
+            return datos.a_dict(cp.zfill(5)) if datos is not None else None
+
+    def buscar(self, consulta: str, limite: int = 10) -> List[Dict[str, Any]]:
+        """
+        Autocompletado: si 'consulta' son dígitos, CPs que empiezan con ella;
+        si no, colonias cuyo nombre (o alguna de sus palabras) empieza con ella.
+        """
+        indice = self._indice
+        consulta = (consulta or "").strip()
+        if indice is None or not consulta:
+            return []
+        resultados = []
+        if consulta.isdigit():
+            with metricas.cronometro("cp.buscar_cp"):
+                inicio = bisect.bisect_left(indice.cps, consulta)
+                for cp in indice.cps[inicio:inicio + limite]:
+                    if not cp.startswith(consulta):
+                        break
+                    datos = indice.por_cp[cp]
+                    resultados.append({"cp": cp, "estado": datos.estado, "municipio": datos.municipio,
+                                       "colonias": len(datos.colonias)})
+            return resultados
+
+        with metricas.cronometro("cp.buscar_colonia"):
+            prefijo = normalizar_texto(consulta)
+            vistos = set()
+            posicion = bisect.bisect_left(indice.claves_colonias, prefijo)
+            while posicion < len(indice.claves_colonias) and len(resultados) < limite:
+                if not indice.claves_colonias[posicion].startswith(prefijo):
+                    break
+                referencia = indice.refs_colonias[posicion]
+                posicion += 1
+                if referencia in vistos:
+                    continue
+                vistos.add(referencia)
+                cp = indice.cps[referencia >> BITS_COLONIA]
+                pos_colonia = referencia & ((1 << BITS_COLONIA) - 1)
+                datos = indice.por_cp[cp]
+                nombre, tipo = datos.colonias[pos_colonia]
+                resultados.append({"cp": cp, "colonia": nombre, "tipo": tipo,
+                                   "estado": datos.estado, "municipio": datos.municipio})
+        return resultados
+
+    def version(self) -> Optional[str]:
+        return self._indice.version if self._indice is not None else None
+
+    def estadisticas(self) -> Dict[str, Any]:
+        indice = self._indice
+        if indice is None:
+            return {"cargado": False}
+        return {
+            "cargado": True,
+            "fuente": indice.fuente,
+            "generado": indice.generado,
+            "codigos_postales": len(indice.por_cp),
+            "asentamientos": indice.total_asentamientos,
+            "entradas_colonias": len(indice.claves_colonias),
+            "recargando": self._recarga is not None and not self._recarga.done(),
+        }
+
+
+# Instancia única usada por toda la aplicación
+almacen_codigos_postales = AlmacenCodigosPostales()
@@ -0,0 +1,23 @@
+# en app/core/consultas_db.py
+"""
+Ayudas para consultar la colección de evaluaciones igual con Motor que con
+PyMongo (get_evaluacion_collection puede devolver cualquiera de los dos).
+"""
+
+import asyncio
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+async def resolver(resultado):
+    """Valor de una llamada a la colección: las de Motor devuelven corrutinas; las de PyMongo, el valor."""
+    return await resultado if asyncio.iscoroutine(resultado) else resultado
+
+
+def id_consulta(evaluacion_id: str):
+    """_id con el que buscar una evaluación: ObjectId si el texto lo es, si no el texto tal cual."""
+    try:
+        return ObjectId(evaluacion_id)
+    except (InvalidId, TypeError):
+        return evaluacion_id
@@ -0,0 +1,263 @@
+# en app/core/definicion_compacta.py
+"""
+Representación compacta e inmutable de las definiciones de preguntas.
+
+- Todas las cadenas (claves y textos) se internan con sys.intern.
+- Los objetos JSON se convierten en MapaCongelado (dict de solo lectura) y las
+  listas en ListaCongelada (tupla). Los valores iguales se guardan una sola vez
+  en la TablaInternado y se comparten: el mismo 'nombre' multiidioma, la misma
+  'frase_introduccion' o la misma pregunta ya fusionada, repetidos en varias
+  secciones o empresas, son un único objeto referenciado desde cada sección.
+  La tabla solo guarda referencias débiles: un valor se libera en cuanto ninguna
+  definición lo usa.
+
+MapaCongelado sigue siendo un dict (se serializa a JSON y se lee igual), pero
+cualquier intento de modificarlo lanza TypeError. Para obtener una copia
+modificable se usa descongelar() (o copy.deepcopy).
+"""
+
+import functools
+import sys
+import threading
+import weakref
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def _igual(a: Any, b: Any) -> bool:
+    # Igualdad estricta de JSON: true no es igual a 1 ni 1 a 1.0
+    return type(a) is type(b) and a == b
+
+
+def _inmutable(self, *args, **kwargs):
+    raise TypeError(f"{type(self).__name__} es de solo lectura; use descongelar() para obtener una copia modificable")
+
+
+class ListaCongelada(tuple):
+    """Arreglo JSON inmutable (tupla con igualdad estricta por tipo)."""
+    __slots__ = ()
+
+    def __eq__(self, otro) -> bool:
+        if not isinstance(otro, ListaCongelada):
+            return tuple.__eq__(self, otro)
+        return len(self) == len(otro) and all(_igual(a, b) for a, b in zip(self, otro))
+
+    def __ne__(self, otro) -> bool:
+        return not self.__eq__(otro)
+
+    __hash__ = tuple.__hash__
+
+    def __deepcopy__(self, memo):
+        return descongelar(self)
+
+
+class MapaCongelado(dict):
+    """Objeto JSON inmutable y hashable."""
+    __slots__ = ("_hash", "__weakref__")
+
+    def __init__(self, items: Iterable = ()):
+        dict.__init__(self, items)
+        self._hash = None
+
+    __setitem__ = __delitem__ = _inmutable
+    clear = pop = popitem = setdefault = update = __ior__ = _inmutable
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = hash(frozenset(self.items()))
+        return self._hash
+
+    def __eq__(self, otro) -> bool:
+        if not isinstance(otro, MapaCongelado):
+            return dict.__eq__(self, otro)
+        if len(self) != len(otro):
+            return False
+        for clave, valor in self.items():
+            if clave not in otro or not _igual(valor, dict.__getitem__(otro, clave)):
+                return False
+        return True
+
+    def __ne__(self, otro) -> bool:
+        return not self.__eq__(otro)
+
+    def __repr__(self) -> str:
+        return f"MapaCongelado({dict.__repr__(self)})"
+
+    def __reduce__(self):
+        return (MapaCongelado, (tuple(self.items()),))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        # La copia profunda de una estructura inmutable es su versión modificable
+        return descongelar(self)
+
+
+def descongelar(valor: Any) -> Any:
+    """Copia modificable (dicts y listas) de una estructura compacta o JSON normal."""
+    if isinstance(valor, str):
+        return valor
+    if isinstance(valor, Mapping):
+        return {k: descongelar(v) for k, v in valor.items()}
+    if isinstance(valor, (tuple, list)):
+        return [descongelar(v) for v in valor]
+    return valor
+
+
+class TablaInternado:
+    """
+    Guarda una sola instancia de cada MapaCongelado mientras alguien lo use: por
+    hash, solo referencias débiles, así que al expulsar de la caché la última
+    definición que usaba un valor, el valor se libera y sale de la tabla.
+    Las ListaCongelada son tuplas (no admiten referencias débiles) y no se
+    comparten por sí mismas; sus elementos sí.
+    """
+
+    def __init__(self):
+        # Reentrante: el callback de una referencia débil puede llegar con el lock tomado
+        self._lock = threading.RLock()
+        self._valores: Dict[int, List[weakref.ref]] = {}
+        self._vivos = 0
+        self.solicitados = 0
+
+    def __len__(self) -> int:
+        return self._vivos
+
+    def _olvidar(self, hash_valor: int, referencia: weakref.ref):
+        with self._lock:
+            referencias = self._valores.get(hash_valor)
+            # Por identidad: tras limpiar() la referencia ya no está en la tabla
+            posicion = next((i for i, r in enumerate(referencias or ()) if r is referencia), None)
+            if posicion is None:
+                return
+            del referencias[posicion]
+            self._vivos -= 1
+            if not referencias:
+                del self._valores[hash_valor]
+
+    def _compartido(self, valor: "MapaCongelado") -> "MapaCongelado":
+        hash_valor = hash(valor)
+        with self._lock:
+            self.solicitados += 1
+            referencias = self._valores.setdefault(hash_valor, [])
+            for referencia in list(referencias):
+                existente = referencia()
+                if existente is not None and existente == valor:
+                    return existente
+            referencias.append(weakref.ref(valor, functools.partial(self._olvidar, hash_valor)))
+            self._vivos += 1
+            return valor
+
+    def compactar(self, valor: Any) -> Any:
+        """Convierte un valor JSON a su forma compacta e inmutable, compartida si ya existía."""
+        if isinstance(valor, str):
+            return sys.intern(valor)
+        if isinstance(valor, (MapaCongelado, ListaCongelada)):
+            return valor
+        if isinstance(valor, Mapping):
+            return self._compartido(MapaCongelado(
+                (sys.intern(str(k)), self.compactar(v)) for k, v in valor.items()
+            ))
+        if isinstance(valor, (list, tuple)):
+            return ListaCongelada(self.compactar(v) for v in valor)
+        return valor
+
+    def pregunta(self, base: Mapping, propios: Optional[Mapping] = None) -> MapaCongelado:
+        """
+        Pregunta compacta: la definición 'base' del dato con los campos 'propios' del
+        grupo_datos encima (mismo resultado que {**base, **propios}). Si otra sección
+        o empresa produce la misma pregunta, se devuelve el objeto ya existente.
+        """
+        if propios:
+            base = {**base, **propios}
+        return self.compactar(base)
+
+    def definiciones(self, preguntas: Iterable[MapaCongelado], **extras) -> MapaCongelado:
+        """
+        Contenido compilado de un archivo: {"datos": (pregunta, ...), **extras}.
+        El contenido es propio de cada archivo; las preguntas y los extras se comparten.
+        """
+        items = [("datos", ListaCongelada(preguntas))]
+        items.extend((sys.intern(k), self.compactar(v)) for k, v in extras.items() if v is not None)
+        return MapaCongelado(items)
+
+    def limpiar(self):
+        with self._lock:
+            self._valores.clear()
+            self._vivos = 0
+            self.solicitados = 0
+
+
+# Tabla compartida por todas las definiciones del proceso
+tabla_internado = TablaInternado()
+
+
+def _objetos_alcanzables(raiz: Any, vistos: Optional[set] = None):
+    """'raiz' y todo lo que referencia, cada objeto una sola vez."""
+    vistos = set() if vistos is None else vistos
+    pendientes = [raiz]
+    while pendientes:
+        obj = pendientes.pop()
+        if id(obj) in vistos:
+            continue
+        vistos.add(id(obj))
+        yield obj
+        if isinstance(obj, dict):
+            pendientes.extend(obj.keys())
+            pendientes.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            pendientes.extend(obj)
+        elif not isinstance(obj, (str, int, float, type(None))):
+            # Objetos con __slots__ (ej: entradas de caché)
+            for atributo in getattr(type(obj), "__slots__", ()):
+                if atributo != "__weakref__" and hasattr(obj, atributo):
+                    pendientes.append(getattr(obj, atributo))
+
+
+def tamano_profundo(raiz: Any, vistos: Optional[set] = None) -> int:
+    """
+    Bytes ocupados por 'raiz' y todo lo que referencia, contando una sola vez
+    cada objeto (lo compartido no se cuenta dos veces).
+    """
+    return sum(sys.getsizeof(obj) for obj in _objetos_alcanzables(raiz, vistos))
+
+
+class ContadorBytes:
+    """
+    Bytes de un conjunto de estructuras (ej: las definiciones en caché) contando
+    una sola vez los objetos que comparten: cada objeto lleva cuántas de ellas lo
+    usan y sus bytes se descuentan cuando deja de usarlo la última.
+    No se protege a sí mismo: quien lo usa lo llama con su propio lock tomado.
+    """
+
+    def __init__(self):
+        self._usos: Dict[int, int] = {}
+        self.bytes = 0
+
+    def agregar(self, raiz: Any):
+        for obj in _objetos_alcanzables(raiz):
+            if isinstance(obj, (int, float, type(None))):
+                self.bytes += sys.getsizeof(obj)
+                continue
+            usos = self._usos.get(id(obj), 0)
+            if not usos:
+                self.bytes += sys.getsizeof(obj)
+            self._usos[id(obj)] = usos + 1
+
+    def quitar(self, raiz: Any):
+        """Deshace un agregar() de la misma estructura (que sigue viva: los ids siguen siendo suyos)."""
+        for obj in _objetos_alcanzables(raiz):
+            if isinstance(obj, (int, float, type(None))):
+                self.bytes -= sys.getsizeof(obj)
+                continue
+            usos = self._usos.get(id(obj), 0) - 1
+            if usos > 0:
+                self._usos[id(obj)] = usos
+            elif usos == 0:
+                del self._usos[id(obj)]
+                self.bytes -= sys.getsizeof(obj)
+
+    def limpiar(self):
+        self._usos.clear()
+        self.bytes = 0
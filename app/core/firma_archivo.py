@@ -0,0 +1,16 @@
+# en app/core/firma_archivo.py
+
+import os
+from typing import Optional, Tuple
+
+
+def firma_archivo(ruta) -> Tuple[Optional[int], Optional[int]]:
+    """
+    (mtime_ns, tamaño) de un archivo, para saber si cambió desde que se leyó.
+    Si no existe, (None, None).
+    """
+    try:
+        st = os.stat(ruta)
+    except OSError:
+        return (None, None)
+    return (st.st_mtime_ns, st.st_size)
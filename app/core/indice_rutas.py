@@ -0,0 +1,170 @@
+# en app/core/indice_rutas.py
+
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.config import INV_DATOS_DATOS_DIR, INV_DATOS_GRUPOS_DIR, INV_DATOS_GRUPOS_DATOS_DIR, INV_DATOS_SECCIONES_DIR, get_empresa_secciones_dir
+
+# Orígenes posibles de un archivo de sección, en el orden de prioridad de búsqueda
+ORIGEN_EMPRESA = "empresa"        # inv_datos/empresas/{empresa}/secciones/
+ORIGEN_SECCIONES = "secciones"    # inv_datos/secciones/
+ORIGEN_GRUPOS = "grupos"          # inv_datos/grupos/
+ORIGEN_DATOS = "datos"            # inv_datos/datos/
+ORIGEN_GRUPOS_DATOS = "grupos_datos"  # inv_datos/grupos/datos/*/
+
+
+def _archivos_json(directorio: Path) -> Dict[str, Path]:
+    if not directorio.is_dir():
+        return {}
+    return {f.name: f for f in directorio.iterdir() if f.suffix == '.json' and f.is_file()}
+
+
+class IndiceRutas:
+    """
+    Índice del árbol inv_datos construido con un solo recorrido: resuelve
+    (empresa, nombre_archivo) a sus archivos candidatos y la 'clave' de un dato
+    a su archivo individual, con un diccionario. Los resultados negativos también
+    se recuerdan. Si se agregan o eliminan archivos hay que llamar a reconstruir(),
+    o a actualizar_archivo() con la ruta de cada uno.
+    """
+
+    def __init__(self):
+        self._construido = False
+        self._por_empresa: Dict[str, Dict[str, Path]] = {}
+        self._secciones: Dict[str, Path] = {}
+        self._grupos: Dict[str, Path] = {}
+        self._datos: Dict[str, Path] = {}
+        # nombre de archivo -> [(subdirectorio, ruta)] en inv_datos/grupos/datos/*/
+        self._grupos_datos: Dict[str, List[Tuple[str, Path]]] = {}
+        # Resoluciones ya calculadas (incluye las vacías)
+        self._resueltas: Dict[Tuple[str, str], Tuple[Tuple[str, Path], ...]] = {}
+        self.construido_en: Optional[float] = None
+
+    def reconstruir(self):
+        """Recorre inv_datos y reemplaza el índice completo."""
+        inicio = time.perf_counter()
+        por_empresa: Dict[str, Dict[str, Path]] = {}
+        # inv_datos/empresas/{empresa}/secciones/ -> el directorio de empresas es dos niveles arriba
+        empresas_dir = get_empresa_secciones_dir("_").parent.parent
+        if empresas_dir.is_dir():
+            for empresa_dir in empresas_dir.iterdir():
+                if empresa_dir.is_dir():
+                    por_empresa[empresa_dir.name] = _archivos_json(get_empresa_secciones_dir(empresa_dir.name))
+
+        grupos_datos: Dict[str, List[Tuple[str, Path]]] = {}
+        if INV_DATOS_GRUPOS_DATOS_DIR.is_dir():
+            for subdir in sorted(INV_DATOS_GRUPOS_DATOS_DIR.iterdir()):
+                if subdir.is_dir():
+                    for nombre, ruta in _archivos_json(subdir).items():
+                        grupos_datos.setdefault(nombre, []).append((subdir.name, ruta))
+
+        self._por_empresa = por_empresa
+        self._secciones = _archivos_json(INV_DATOS_SECCIONES_DIR)
+        self._grupos = _archivos_json(INV_DATOS_GRUPOS_DIR)
+        self._datos = _archivos_json(INV_DATOS_DATOS_DIR)
+        self._grupos_datos = grupos_datos
+        self._resueltas = {}
+        self._construido = True
+        self.construido_en = time.time()
+        total = sum(len(v) for v in por_empresa.values()) + len(self._secciones) + len(self._grupos) + len(self._datos) + len(grupos_datos)
+        logging.info(f"[INDICE] inv_datos indexado: {total} archivos en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+    def actualizar_archivo(self, ruta: Path) -> Optional[Tuple[str, str, Optional[str]]]:
+        """
+        Agrega al índice (o quita, si ya no existe) un solo archivo, sin recorrer
+        inv_datos. Devuelve (origen, nombre, empresa o subdirectorio del grupo),
+        o None si la ruta no es de ninguna carpeta indexada.
+        """
+        self._asegurar_construido()
+        ruta = Path(ruta)
+        if ruta.suffix != '.json':
+            return None
+        directorio = ruta.parent
+        empresas_dir = get_empresa_secciones_dir("_").parent.parent
+        if directorio == INV_DATOS_SECCIONES_DIR:
+            origen, detalle, archivos = ORIGEN_SECCIONES, None, self._secciones
+        elif directorio == INV_DATOS_GRUPOS_DIR:
+            origen, detalle, archivos = ORIGEN_GRUPOS, None, self._grupos
+        elif directorio == INV_DATOS_DATOS_DIR:
+            origen, detalle, archivos = ORIGEN_DATOS, None, self._datos
+        elif directorio.parent == INV_DATOS_GRUPOS_DATOS_DIR:
+            origen, detalle, archivos = ORIGEN_GRUPOS_DATOS, directorio.name, None
+        elif directorio.parent.parent == empresas_dir and directorio == get_empresa_secciones_dir(directorio.parent.name):
+            origen, detalle = ORIGEN_EMPRESA, directorio.parent.name
+            archivos = self._por_empresa.setdefault(detalle, {})
+        else:
+            return None
+
+        existe = ruta.is_file()
+        if archivos is not None:
+            if existe:
+                archivos[ruta.name] = ruta
+            else:
+                archivos.pop(ruta.name, None)
+        else:
+            lista = [(s, r) for s, r in self._grupos_datos.get(ruta.name, []) if s != detalle]
+            if existe:
+                lista = sorted(lista + [(detalle, ruta)], key=lambda par: par[0])
+            if lista:
+                self._grupos_datos[ruta.name] = lista
+            else:
+                self._grupos_datos.pop(ruta.name, None)
+        # Las resoluciones de ese nombre (de cualquier empresa) se vuelven a calcular
+        for clave in [c for c in self._resueltas if c[1] == ruta.name]:
+            self._resueltas.pop(clave, None)
+        return origen, ruta.name, detalle
+
+    def _asegurar_construido(self):
+        if not self._construido:
+            self.reconstruir()
+
+    def candidatos_seccion(self, nombre_archivo: str, empresa: Optional[str] = None) -> Tuple[Tuple[str, Path], ...]:
+        """
+        Archivos existentes que pueden definir 'nombre_archivo', como (origen, ruta),
+        en el mismo orden de prioridad que la búsqueda original. Tupla vacía si no hay ninguno.
+        """
+        self._asegurar_construido()
+        clave = (empresa or "", nombre_archivo)
+        resueltos = self._resueltas.get(clave)
+        if resueltos is not None:
+            return resueltos
+
+        candidatos = []
+        if empresa:
+            ruta = self._por_empresa.get(empresa, {}).get(nombre_archivo)
+            if ruta is not None:
+                candidatos.append((ORIGEN_EMPRESA, ruta))
+        ruta = self._secciones.get(nombre_archivo)
+        if ruta is not None:
+            candidatos.append((ORIGEN_SECCIONES, ruta))
+        ruta = self._grupos.get(nombre_archivo)
+        if ruta is not None:
+            candidatos.append((ORIGEN_GRUPOS, ruta))
+        ruta = self._datos.get(nombre_archivo)
+        if ruta is not None:
+            candidatos.append((ORIGEN_DATOS, ruta))
+        for _subdir, ruta in self._grupos_datos.get(nombre_archivo, []):
+            candidatos.append((ORIGEN_GRUPOS_DATOS, ruta))
+
+        resueltos = tuple(candidatos)
+        self._resueltas[clave] = resueltos
+        return resueltos
+
+    def ruta_dato(self, clave: str, prefijo_grupo: Optional[str] = None) -> Optional[Path]:
+        """
+        Archivo individual de un dato: primero inv_datos/grupos/datos/{prefijo}/ si se
+        indica prefijo, luego inv_datos/datos/. None si no está en ninguno.
+        """
+        self._asegurar_construido()
+        nombre = f"{clave}.json"
+        if prefijo_grupo:
+            for subdir, ruta in self._grupos_datos.get(nombre, []):
+                if subdir == prefijo_grupo:
+                    return ruta
+        return self._datos.get(nombre)
+
+
+# Instancia única usada por toda la aplicación
+indice_rutas = IndiceRutas()
@@ -0,0 +1,174 @@
+# en app/core/invalidacion_inv_datos.py
+"""
+Invalidación incremental tras editar archivos de inv_datos desde el panel de
+administración (secciones, datos individuales, catálogos).
+
+Las rutas de escritura llaman a inv_datos_modificado_async() con los archivos que
+escribieron o borraron. Cada ruta se traduce a nodos del grafo de dependencias:
+
+    inv_datos/datos/B00001.json               -> (dato, B00001) y (archivo, B00001.json)
+    inv_datos/grupos/datos/G001/B00001.json   -> (dato, B00001) y (archivo, B00001.json)
+    inv_datos/secciones/Domicilio_01.json     -> (archivo, Domicilio_01.json)
+    inv_datos/empresas/X/secciones/...        -> (archivo, ...) solo para la empresa X
+    inv_datos/catalogos/PAISES.json           -> catálogo PAISES (solo payloads)
+
+y solo se descartan y recompilan las definiciones y los payloads que dependen de
+ellos (y se descartan sus validadores); el resto de las cachés sigue caliente. Un guion editado no necesita nada:
+su huella cambia y sus payloads se renderizan la primera vez que se piden.
+
+Las rutas que escriben inv_datos (panel de administración) no viven en este
+árbol, así que vigilante_inv_datos compara cada INTERVALO_VIGILANCIA_SEG el
+mtime y el tamaño de los JSON y llama a inv_datos_modificado_async() con los que
+cambiaron: cubre cualquier escritor, incluidas las ediciones hechas en otro
+worker, que de otro modo solo se verían al descartarse sus cachés.
+"""
+
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.config import INV_DATOS_CATALOGOS_DIR
+from app.core.indice_rutas import indice_rutas, ORIGEN_EMPRESA, ORIGEN_DATOS, ORIGEN_GRUPOS_DATOS
+from app.core.maestro_preguntas import maestro_preguntas, DEP_ARCHIVO, DEP_DATO, DEP_RUTA
+from app.core.catalogos import almacen_catalogos
+from app.core.cache_formulario import cache_formulario
+from app.core.validacion import motor_validacion
+from app.core.metricas import metricas
+from app.core.firma_archivo import firma_archivo
+from app.core.snapshot_inv_datos import INV_DATOS_DIR
+
+# Cada cuántos segundos se buscan JSON de inv_datos modificados (0 = no vigilar)
+INTERVALO_VIGILANCIA_SEG = float(os.getenv("INV_DATOS_VIGILAR_SEG", "5"))
+
+
+def nodos_de_ruta(ruta: Path) -> Tuple[Optional[str], Set[Tuple[str, str]]]:
+    """
+    Actualiza el índice de inv_datos con la ruta y devuelve (empresa, nodos): la
+    empresa es None si el cambio afecta a todas.
+    """
+    ruta = Path(ruta)
+    nodos = {(DEP_RUTA, str(ruta))}
+    ubicacion = indice_rutas.actualizar_archivo(ruta)
+    if ubicacion is None:
+        return None, nodos
+    origen, nombre, detalle = ubicacion
+    nodos.add((DEP_ARCHIVO, nombre))
+    if origen in (ORIGEN_DATOS, ORIGEN_GRUPOS_DATOS):
+        nodos.add((DEP_DATO, ruta.stem))
+    return (detalle if origen == ORIGEN_EMPRESA else None), nodos
+
+
+async def inv_datos_modificado_async(rutas: Iterable[Path], recompilar: bool = True) -> Dict[str, Any]:
+    """
+    Invalida lo que depende de los archivos indicados (escritos o eliminados) y,
+    con 'recompilar', vuelve a compilar esas definiciones y a renderizar esos
+    payloads antes de responder, para que la siguiente carga sea un acierto.
+    """
+    rutas = [Path(ruta) for ruta in rutas]
+    vigilante_inv_datos.anotar(rutas)
+    nodos_por_empresa: Dict[Optional[str], Set[Tuple[str, str]]] = {}
+    catalogos = set()
+    for ruta in rutas:
+        if ruta.parent == INV_DATOS_CATALOGOS_DIR and ruta.suffix == '.json':
+            almacen_catalogos.invalidar(ruta.stem)
+            catalogos.add(ruta.stem)
+            continue
+        empresa, nodos = nodos_de_ruta(ruta)
+        nodos_por_empresa.setdefault(empresa, set()).update(nodos)
+
+    secciones = set()
+    for empresa, nodos in nodos_por_empresa.items():
+        secciones.update(maestro_preguntas.invalidar_dependientes(nodos, empresa))
+    payloads = cache_formulario.invalidar_dependientes(secciones, catalogos)
+    validadores = motor_validacion.invalidar(secciones)
+    metricas.incrementar("inv_datos.ediciones")
+    logging.info(
+        f"[INV_DATOS] Edición: {len(secciones)} definiciones, {len(payloads)} payloads y {validadores}"
+        f" validadores invalidados ({len(catalogos)} catálogos)"
+    )
+
+    resultado = {"definiciones": len(secciones), "payloads": len(payloads), "validadores": validadores,
+                 "catalogos": len(catalogos)}
+    if recompilar:
+        with metricas.cronometro("inv_datos.recompilar"):
+            resultado["recompiladas"] = await maestro_preguntas.recompilar_async(secciones)
+            resultado["rerenderizados"] = await cache_formulario.rerenderizar_async(payloads)
+    return resultado
+
+
+def _firmas_json(raiz: Path) -> Dict[str, Tuple[Optional[int], Optional[int]]]:
+    firmas = {}
+    for directorio, _, archivos in os.walk(raiz):
+        for nombre in archivos:
+            if nombre.endswith(".json"):
+                ruta = str(Path(directorio) / nombre)
+                firmas[ruta] = firma_archivo(ruta)
+    return firmas
+
+
+class VigilanteInvDatos:
+    """
+    Detecta los JSON de inv_datos escritos, creados o borrados desde la revisión
+    anterior (por mtime y tamaño) e invalida lo que depende de ellos.
+    """
+
+    def __init__(self, raiz: Path = INV_DATOS_DIR, intervalo: float = INTERVALO_VIGILANCIA_SEG):
+        self.raiz = Path(raiz)
+        self.intervalo = intervalo
+        # ruta -> (mtime_ns, tamaño) de la última revisión; None hasta la primera
+        self._firmas: Optional[Dict[str, Tuple[Optional[int], Optional[int]]]] = None
+        self._tarea: Optional[asyncio.Task] = None
+
+    def anotar(self, rutas: Iterable[Path]):
+        """Da por vistas las rutas que ya invalidó quien las escribió, para no repetirlo."""
+        if self._firmas is None:
+            return
+        for ruta in rutas:
+            firma = firma_archivo(ruta)
+            if firma == (None, None):
+                self._firmas.pop(str(ruta), None)
+            else:
+                self._firmas[str(ruta)] = firma
+
+    async def revisar_async(self) -> List[Path]:
+        """
+        Recorre inv_datos (fuera del event loop) e invalida los archivos que
+        cambiaron. La primera revisión solo toma la referencia. Devuelve las rutas.
+        """
+        firmas = await asyncio.to_thread(_firmas_json, self.raiz)
+        anteriores, self._firmas = self._firmas, firmas
+        if anteriores is None:
+            return []
+        cambiadas = [Path(r) for r in sorted(set(anteriores) | set(firmas)) if anteriores.get(r) != firmas.get(r)]
+        if cambiadas:
+            metricas.incrementar("inv_datos.cambios_detectados", len(cambiadas))
+            await inv_datos_modificado_async(cambiadas)
+        return cambiadas
+
+    async def _vigilar(self):
+        while True:
+            try:
+                await self.revisar_async()
+            except Exception as e:
+                logging.error(f"[INV_DATOS] No se pudieron revisar los cambios de inv_datos: {e}")
+            await asyncio.sleep(self.intervalo)
+
+    def iniciar(self):
+        """Arranca la vigilancia en el event loop actual (no hace nada si el intervalo es 0)."""
+        if self.intervalo > 0 and self._tarea is None:
+            self._tarea = asyncio.get_running_loop().create_task(self._vigilar())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+
+
+# Instancia única; form_router la arranca y la detiene con la aplicación
+vigilante_inv_datos = VigilanteInvDatos()
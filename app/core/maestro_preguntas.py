@@ -1,13 +1,142 @@
 # en app/core/maestro_preguntas.py
 
+import asyncio
 import logging
 import json
+import os
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Iterable, List, Dict, Any, Optional, Set, Tuple
 
 # Importamos nuestras herramientas centrales
-from app.config import RESOURCES_PATH, INV_DATOS_DATOS_DIR, INV_DATOS_GRUPOS_DIR, INV_DATOS_GRUPOS_DATOS_DIR, INV_DATOS_SECCIONES_DIR, get_empresa_secciones_dir
+from app.config import RESOURCES_PATH, INV_DATOS_DATOS_DIR, INV_DATOS_GRUPOS_DATOS_DIR, INV_DATOS_SECCIONES_DIR
 from app.core.cargador_recursos import cargar_json, cargar_dato_pregunta
+from app.core.snapshot_inv_datos import al_cambiar_generacion, leer_json
+from app.core.indice_rutas import indice_rutas, ORIGEN_EMPRESA, ORIGEN_SECCIONES, ORIGEN_GRUPOS
+from app.core.carga_async import CargasEnCurso
+from app.core.firma_archivo import firma_archivo
+from app.core.metricas import metricas, depurar
+from app.core.definicion_compacta import ContadorBytes, tabla_internado, tamano_profundo, descongelar
+
+# Cada cuántos segundos, como máximo, se vuelve a hacer stat() de los archivos fuente
+# de una entrada en caché para detectar cambios en inv_datos.
+INTERVALO_REVALIDACION_SEG = float(os.getenv("MAESTRO_REVALIDACION_SEG", "1.0"))
+# Presupuesto de la caché de definiciones por (empresa, archivo); al excederse se
+# expulsan las entradas usadas menos recientemente. 0 = sin límite de bytes.
+MAX_ENTRADAS_CACHE = int(os.getenv("MAESTRO_MAX_ENTRADAS", "4096"))
+MAX_BYTES_CACHE = int(os.getenv("MAESTRO_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Tipos de nodo del grafo de dependencias de las definiciones compiladas
+DEP_DATO = "dato"          # clave de un dato individual referenciado en grupo_datos
+DEP_GRUPO = "grupo"        # prefijo de grupo (ej: G001) cuyos datos se buscan en grupos/datos/G001/
+DEP_ARCHIVO = "archivo"    # nombre del archivo de sección (en cualquiera de sus ubicaciones)
+DEP_RUTA = "ruta"          # archivo fuente concreto del que se leyó algo
+
+
+def _firma_fuente(ruta) -> tuple:
+    """
+    Identidad de un archivo fuente: (ruta, mtime_ns, tamaño).
+    Si el archivo no existe, la firma registra esa ausencia con (ruta, None, None).
+    """
+    return (str(ruta), *firma_archivo(ruta))
+
+
+def _leer_json(ruta: Path) -> Any:
+    # Desde el snapshot compilado de inv_datos si existe, si no desde el disco
+    return leer_json(ruta)
+
+
+def _cargar_dato(clave: str, prefijo_grupo: str = None) -> Tuple[Optional[Dict[str, Any]], Optional[Path]]:
+    """
+    Carga la definición individual de un dato y devuelve (datos, ruta).
+    La ruta se resuelve con el índice de inv_datos (grupos/datos/{prefijo}/ y luego datos/);
+    si el índice no la conoce se delega en cargar_dato_pregunta y la ruta es None.
+    """
+    ruta = indice_rutas.ruta_dato(clave, prefijo_grupo)
+    if ruta is not None:
+        try:
+            return _leer_json(ruta), ruta
+        except (json.JSONDecodeError, Exception) as e:
+            logging.error(f"[ERROR] No se pudo cargar {ruta}: {e}")
+            return None, ruta
+    return cargar_dato_pregunta(clave), None
+
+
+def _extraer_grupo_datos(seccion_data: Any) -> Optional[List[Any]]:
+    """
+    El archivo puede tener estructura como {"Generales_01": {"grupo_datos": [...]}}
+    o ser una lista directamente.
+    """
+    if isinstance(seccion_data, dict):
+        # Buscar el primer grupo_datos en cualquier clave
+        for value in seccion_data.values():
+            if isinstance(value, dict) and 'grupo_datos' in value:
+                return value['grupo_datos']
+    elif isinstance(seccion_data, list):
+        return seccion_data
+    return None
+
+
+def _extraer_de_seccion(seccion_data: Any, campo: str) -> Any:
+    """Busca un campo (ej: 'frase_introduccion') dentro del objeto anidado de la sección."""
+    if isinstance(seccion_data, dict):
+        for value in seccion_data.values():
+            if isinstance(value, dict) and campo in value:
+                return value[campo]
+    return None
+
+
+def _compactar_contenido(contenido: Dict[str, Any]) -> Dict[str, Any]:
+    """Forma compacta de un JSON que ya trae la lista de preguntas en 'datos'."""
+    preguntas = [tabla_internado.pregunta(p) for p in contenido.get('datos', []) if isinstance(p, dict)]
+    return tabla_internado.definiciones(preguntas, **{k: v for k, v in contenido.items() if k != 'datos'})
+
+
+def _dependencias(nombre_archivo: str, contenido: Dict[str, Any], fuentes: tuple,
+                  claves: Iterable[str]) -> frozenset:
+    """
+    Nodos de los que dependen unas definiciones: el nombre del archivo, cada archivo
+    fuente, cada clave referenciada (exista o no su archivo individual, para que
+    agregarlo también las invalide) y el prefijo de grupo si lo tiene.
+    """
+    nodos = {(DEP_ARCHIVO, nombre_archivo)}
+    nodos.update((DEP_RUTA, firma[0]) for firma in fuentes)
+    nodos.update((DEP_DATO, clave) for clave in claves)
+    nodos.update((DEP_DATO, p['clave']) for p in contenido.get('datos', ()) if isinstance(p.get('clave'), str))
+    if nombre_archivo.startswith('G') and '_' in nombre_archivo:
+        nodos.add((DEP_GRUPO, nombre_archivo.split('_')[0]))
+    return frozenset(nodos)
+
+
+class _EntradaDefinicion:
+    """Definiciones compiladas de un archivo junto con la firma de sus archivos fuente."""
+    __slots__ = ("contenido", "fuentes", "generacion", "revisado_en", "tamano", "dependencias")
+
+    def __init__(self, contenido: Dict[str, Any], fuentes: tuple, generacion: int, dependencias: frozenset = frozenset()):
+        self.contenido = contenido
+        self.fuentes = fuentes
+        self.generacion = generacion
+        self.dependencias = dependencias
+        self.revisado_en = time.monotonic()
+        # Solo para el desglose por empresa: cuenta completos los valores compartidos
+        # con otras entradas. El presupuesto de la caché usa _contador_bytes.
+        self.tamano = tamano_profundo(contenido)
+
+
+class _EstadisticasEmpresa:
+    __slots__ = ("aciertos", "fallos", "expulsiones")
+
+    def __init__(self):
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+
+def _normalizar_nombre(nombre_archivo: str) -> str:
+    return nombre_archivo if nombre_archivo.endswith('.json') else f"{nombre_archivo}.json"
+
 
 class MaestroDePreguntas:
     """
@@ -15,14 +144,30 @@ class MaestroDePreguntas:
     de los archivos JSON de entrevistas, evitando recargas innecesarias.
     """
     _instancia = None
-    _preguntas_cargadas: Dict[str, Any] = {}
+    # (empresa, archivo) -> definiciones, en orden de uso (LRU). La empresa es "" cuando
+    # no se indica; cada empresa tiene sus propias entradas aunque compartan archivos.
+    _preguntas_cargadas: "OrderedDict[Tuple[str, str], _EntradaDefinicion]" = OrderedDict()
+    # Bytes de las entradas en caché contando una vez lo que comparten (bajo _lock_cache)
+    _contador_bytes = ContadorBytes()
+    _lock_cache = threading.Lock()
+    _estadisticas: Dict[str, _EstadisticasEmpresa] = {}
     _lista_completa_campos: List[Dict[str, Any]] = []
+    # Se incrementa al invalidar toda la caché; las entradas de otra generación se descartan
+    _generacion: int = 0
+    _todas_cargadas: bool = False
+    # Cargas en el pool de hilos, por (empresa, archivo), compartidas entre solicitantes
+    _cargas_en_curso = CargasEnCurso()
+    # (empresa, archivo) sin definición conocida -> generación en la que se buscó
+    _no_encontrados: Dict[Tuple[str, str], int] = {}
+    # Grafo inverso de dependencias: nodo (tipo, valor) -> (empresa, archivo) de las
+    # entradas en caché que lo usan. Se mantiene junto con la caché bajo _lock_cache.
+    _dependientes: Dict[Tuple[str, str], Set[Tuple[str, str]]] = {}
 
     def __new__(cls):
+        # La carga es perezosa: cada sección se compila la primera vez que se pide,
+        # y la lista completa de campos solo cuando se llama a obtener_todos_los_campos
         if cls._instancia is None:
-            print("Inicializando el Maestro de Preguntas por primera vez...")
             cls._instancia = super(MaestroDePreguntas, cls).__new__(cls)
-            cls._instancia._cargar_todas_las_preguntas()
         return cls._instancia
 
     def _cargar_todas_las_preguntas(self):
@@ -30,8 +175,9 @@ class MaestroDePreguntas:
         Carga todos los archivos .json de la carpeta de recursos que definen preguntas.
         (Aquí asumimos que todos los JSON en /resources son de preguntas, se puede ajustar).
         """
-        if self._preguntas_cargadas:
+        if self._todas_cargadas:
             return
+        self._todas_cargadas = True
 
         logging.info("Maestro de Preguntas: Cargando todas las definiciones de entrevistas...")
         # Buscamos todos los archivos .json que definen entrevistas.
@@ -47,326 +193,415 @@ class MaestroDePreguntas:
             nombre_archivo = archivo_path.name
             contenido = cargar_json(nombre_archivo)
             if contenido and 'datos' in contenido:
-                self._preguntas_cargadas[nombre_archivo] = contenido
-                
-                # --- LÓGICA MODIFICADA ---
-                # Añadimos el 'archivo_origen' a cada pregunta antes de guardarla
-                preguntas_con_origen = []
-                for pregunta in contenido['datos']:
-                    pregunta['archivo_origen'] = nombre_archivo # <-- La línea clave
-                    preguntas_con_origen.append(pregunta)
-                
-                self._lista_completa_campos.extend(preguntas_con_origen)
-                # --- FIN DE LA MODIFICACIÓN ---
+                contenido = self._guardar_en_cache(None, nombre_archivo, _compactar_contenido(contenido), [_firma_fuente(archivo_path)])
+
+                # Cada pregunta de la lista lleva su 'archivo_origen'; sus valores
+                # (nombre, catálogo...) se comparten con las definiciones de la caché
+                self._lista_completa_campos.extend(
+                    tabla_internado.pregunta(pregunta, {'archivo_origen': nombre_archivo}) for pregunta in contenido['datos']
+                )
 
                 logging.info(f" -> '{nombre_archivo}' cargado.")
     
-    def obtener_definiciones(self, nombre_archivo: str, empresa: str = None) -> Optional[Dict[str, Any]]:
+    # --- CACHÉ COMPILADA DE DEFINICIONES ---
+    # Cada entrada guarda las definiciones ya fusionadas junto con la identidad
+    # (ruta, mtime, tamaño) de los archivos de los que se construyó. En un acierto
+    # solo se hace stat() de esas fuentes (y como máximo una vez por intervalo),
+    # nunca se vuelve a abrir ni a parsear el JSON.
+
+    def _entrada_vigente(self, entrada: "_EntradaDefinicion") -> bool:
         """
-        Obtiene las definiciones completas de un archivo, buscando en múltiples ubicaciones.
-        Si el archivo está en caché pero le falta frase_introduccion, se fuerza una recarga.
+        Indica si una entrada de caché sigue vigente comparando la firma de sus
+        archivos fuente. La comprobación se limita a una vez por intervalo.
         """
+        if entrada.generacion != self._generacion:
+            return False
+        ahora = time.monotonic()
+        if ahora - entrada.revisado_en < INTERVALO_REVALIDACION_SEG:
+            return True
+        for firma in entrada.fuentes:
+            if _firma_fuente(firma[0]) != firma:
+                return False
+        entrada.revisado_en = ahora
+        return True
+
+    def _stats(self, empresa: str) -> _EstadisticasEmpresa:
+        stats = self._estadisticas.get(empresa)
+        if stats is None:
+            stats = self._estadisticas.setdefault(empresa, _EstadisticasEmpresa())
+        return stats
+
+    def _consultar(self, clave: Tuple[str, str]) -> Optional[_EntradaDefinicion]:
+        """Entrada vigente de (empresa, archivo), marcándola como usada recientemente."""
+        entrada = self._preguntas_cargadas.get(clave)
+        if entrada is None:
+            return None
+        if not self._entrada_vigente(entrada):
+            logging.info(f"[CACHE] Archivos fuente de '{clave[1]}' ({clave[0] or 'sin empresa'}) modificados. Recompilando...")
+            metricas.incrementar("definiciones.invalidadas")
+            self._quitar(clave, entrada)
+            return None
+        with self._lock_cache:
+            if clave in self._preguntas_cargadas:
+                self._preguntas_cargadas.move_to_end(clave)
+        return entrada
+
+    def _quitar(self, clave: Tuple[str, str], entrada: Optional[_EntradaDefinicion] = None):
+        """Quita la entrada de 'clave' (solo si sigue siendo 'entrada', cuando se indica)."""
+        with self._lock_cache:
+            actual = self._preguntas_cargadas.get(clave)
+            if actual is None or (entrada is not None and actual is not entrada):
+                return
+            del self._preguntas_cargadas[clave]
+            self._contador_bytes.quitar(actual.contenido)
+            self._desenlazar(clave, actual)
+
+    # Estos dos se llaman con _lock_cache tomado
+    def _enlazar(self, clave: Tuple[str, str], entrada: _EntradaDefinicion):
+        for nodo in entrada.dependencias:
+            self._dependientes.setdefault(nodo, set()).add(clave)
+
+    def _desenlazar(self, clave: Tuple[str, str], entrada: _EntradaDefinicion):
+        for nodo in entrada.dependencias:
+            dependientes = self._dependientes.get(nodo)
+            if dependientes is not None:
+                dependientes.discard(clave)
+                if not dependientes:
+                    del self._dependientes[nodo]
+
+    def _guardar_en_cache(self, empresa: Optional[str], nombre_archivo: str, contenido: Dict[str, Any],
+                          fuentes: List[tuple], claves: Iterable[str] = ()) -> Dict[str, Any]:
+        fuentes = tuple(fuentes)
+        entrada = _EntradaDefinicion(contenido, fuentes, self._generacion,
+                                     _dependencias(nombre_archivo, contenido, fuentes, claves))
+        clave = (empresa or "", nombre_archivo)
+        with self._lock_cache:
+            anterior = self._preguntas_cargadas.pop(clave, None)
+            if anterior is not None:
+                self._contador_bytes.quitar(anterior.contenido)
+                self._desenlazar(clave, anterior)
+            self._preguntas_cargadas[clave] = entrada
+            self._contador_bytes.agregar(entrada.contenido)
+            self._enlazar(clave, entrada)
+            # Expulsar las menos usadas hasta volver al presupuesto (nunca la recién guardada)
+            while len(self._preguntas_cargadas) > 1 and (
+                len(self._preguntas_cargadas) > MAX_ENTRADAS_CACHE
+                or (MAX_BYTES_CACHE and self._contador_bytes.bytes > MAX_BYTES_CACHE)
+            ):
+                clave_expulsada, expulsada = self._preguntas_cargadas.popitem(last=False)
+                empresa_expulsada = clave_expulsada[0]
+                self._contador_bytes.quitar(expulsada.contenido)
+                self._desenlazar(clave_expulsada, expulsada)
+                self._stats(empresa_expulsada).expulsiones += 1
+                metricas.incrementar("definiciones.expulsiones")
+        return contenido
+
+    def invalidar_cache(self, nombre_archivo: str = None, empresa: str = None):
         """
-        Devuelve la estructura completa de un archivo de preguntas.
-        Primero busca en caché, luego en las nuevas ubicaciones si no está en caché.
+        Invalida las entradas de un archivo (de todas las empresas, o solo de 'empresa'),
+        todas las de una empresa, o sin argumentos toda la caché de definiciones
+        (incrementando el contador de generación).
         """
-        # Normalizar el nombre del archivo
-        if not nombre_archivo.endswith('.json'):
-            nombre_archivo = f"{nombre_archivo}.json"
-        
-        # Primero intenta desde la caché
-        if nombre_archivo in self._preguntas_cargadas:
-            contenido_cached = self._preguntas_cargadas[nombre_archivo]
-            
-            # Verificar si el archivo original tiene frase_introduccion pero el caché no
-            # O si los campos en caché no tienen los campos fusionados del grupo_datos
-            # Nota: Para verificar el caché, usamos la ruta antigua por compatibilidad
-            # El caché se actualizará cuando se busque con empresa
-            archivo_path_check = INV_DATOS_SECCIONES_DIR / nombre_archivo
-            if archivo_path_check.exists():
-                try:
-                    with open(archivo_path_check, 'r', encoding='utf-8') as f:
-                        seccion_data_check = json.load(f)
-                        grupo_datos_check = None
-                        if isinstance(seccion_data_check, dict):
-                            for key, value in seccion_data_check.items():
-                                if isinstance(value, dict):
-                                    if 'frase_introduccion' in value and 'frase_introduccion' not in contenido_cached:
-                                        logging.info(f"[INFO] Archivo '{nombre_archivo}' tiene frase_introduccion pero el caché no. Recargando...")
-                                        del self._preguntas_cargadas[nombre_archivo]
-                                        break
-                                    if 'grupo_datos' in value:
-                                        grupo_datos_check = value['grupo_datos']
-                                        break
-                        elif isinstance(seccion_data_check, list):
-                            grupo_datos_check = seccion_data_check
-                        
-                        # Verificar si los campos en caché tienen los campos fusionados del grupo_datos
-                        if grupo_datos_check and 'datos' in contenido_cached:
-                            datos_cached = contenido_cached.get('datos', [])
-                            for item_grupo in grupo_datos_check:
-                                if isinstance(item_grupo, dict):
-                                    clave_grupo = item_grupo.get('clave')
-                                    campos_grupo = {k: v for k, v in item_grupo.items() if k != 'clave'}
-                                    if clave_grupo and campos_grupo:
-                                        # Buscar el campo en caché
-                                        campo_cached = next((c for c in datos_cached if c.get('clave') == clave_grupo), None)
-                                        if campo_cached:
-                                            # Verificar si le faltan campos fusionados
-                                            campos_faltantes = [k for k in campos_grupo.keys() if k not in campo_cached]
-                                            if campos_faltantes:
-                                                logging.info(f"[INFO] Campo '{clave_grupo}' en caché le faltan campos fusionados: {campos_faltantes}. Recargando...")
-                                                del self._preguntas_cargadas[nombre_archivo]
-                                                break
-                                            # Verificar también si validacion_input está presente en grupo_datos pero no en caché o es diferente
-                                            if 'validacion_input' in campos_grupo:
-                                                validacion_cached = campo_cached.get('validacion_input')
-                                                validacion_grupo = campos_grupo.get('validacion_input')
-                                                if validacion_cached != validacion_grupo:
-                                                    logging.warning(f"[CACHE] Invalidando caché para '{nombre_archivo}': validacion_input diferente en campo '{clave_grupo}'. Caché: {validacion_cached}, Grupo: {validacion_grupo}")
-                                                    del self._preguntas_cargadas[nombre_archivo]
-                                                    break
-                except Exception as e:
-                    logging.warning(f"[WARNING] Error al verificar caché para '{nombre_archivo}': {e}")
-            
-            if nombre_archivo in self._preguntas_cargadas:
-                logging.info(f"[DEBUG] Archivo '{nombre_archivo}' encontrado en caché. Tiene frase_introduccion: {'frase_introduccion' in contenido_cached}")
-                return contenido_cached
-        
-        # Si no está en caché, busca en las nuevas ubicaciones directamente
-        # (sin llamar a obtener_preguntas para evitar recursión)
-        
-        # 1. Intentar en inv_datos/empresas/{empresa}/secciones/ o inv_datos/secciones/ (archivos que contienen listas de claves)
-        # Determinar el directorio de secciones según la empresa
-        secciones_dir = get_empresa_secciones_dir(empresa) if empresa else INV_DATOS_SECCIONES_DIR
-        archivo_path = secciones_dir / nombre_archivo
-        if archivo_path.exists() and archivo_path.is_file():
-            try:
-                with open(archivo_path, 'r', encoding='utf-8') as f:
-                    seccion_data = json.load(f)
-                    # El archivo puede tener estructura como {"Generales_01": {"grupo_datos": [...]}}
-                    # o ser una lista directamente
-                    grupo_datos = None
-                    if isinstance(seccion_data, dict):
-                        # Buscar el primer grupo_datos en cualquier clave
-                        for key, value in seccion_data.items():
-                            if isinstance(value, dict) and 'grupo_datos' in value:
-                                grupo_datos = value['grupo_datos']
-                                break
-                    elif isinstance(seccion_data, list):
-                        grupo_datos = seccion_data
-                    
-                    if grupo_datos:
-                        # Construir la lista de preguntas desde los archivos individuales
-                        preguntas_lista = []
-                        for item in grupo_datos:
-                            clave = item.get('clave') if isinstance(item, dict) else str(item)
-                            if clave:
-                                # Cargar el archivo individual desde inv_datos/datos/
-                                pregunta_data = cargar_dato_pregunta(clave)
-                                if pregunta_data:
-                                    # Fusionar campos del grupo_datos (catalogo, anclar, validacion_input, etc.) con los datos del archivo
-                                    if isinstance(item, dict):
-                                        # Debug: mostrar TODOS los campos del item antes de filtrar
-                                        logging.info(f"[FUSION DEBUG] Campo '{clave}': Item completo del grupo_datos: {list(item.keys())}")
-                                        if 'validacion_input' in item:
-                                            logging.info(f"[FUSION DEBUG] Campo '{clave}': validacion_input en item={item.get('validacion_input')}")
-                                        
-                                        # Fusionar todos los campos excepto 'clave' y 'nombre' (preservar nombre del archivo JSON)
-                                        # El 'nombre' del archivo JSON tiene la estructura multiidioma correcta
-                                        campos_fusionados = {k: v for k, v in item.items() if k not in ['clave', 'nombre']}
-                                        
-                                        # Debug: verificar qué campos se van a fusionar
-                                        logging.info(f"[FUSION DEBUG] Campo '{clave}': Campos a fusionar: {list(campos_fusionados.keys())}")
-                                        if 'validacion_input' in campos_fusionados:
-                                            logging.info(f"[FUSION] Campo '{clave}': validacion_input={campos_fusionados.get('validacion_input')} encontrado en grupo_datos")
-                                        else:
-                                            logging.warning(f"[FUSION] Campo '{clave}': NO tiene validacion_input en campos_fusionados. Item keys: {list(item.keys())}, Campos fusionados: {list(campos_fusionados.keys())}")
-                                        
-                                        # Debug: mostrar pregunta_data ANTES de fusionar
-                                        logging.info(f"[FUSION DEBUG] Campo '{clave}': pregunta_data ANTES de fusionar - keys: {list(pregunta_data.keys())}")
-                                        
-                                        # IMPORTANTE: Actualizar pregunta_data con campos_fusionados
-                                        # Esto sobrescribe cualquier campo existente en pregunta_data con los de grupo_datos
-                                        pregunta_data.update(campos_fusionados)
-                                        
-                                        # Debug: mostrar pregunta_data DESPUÉS de fusionar
-                                        logging.info(f"[FUSION DEBUG] Campo '{clave}': pregunta_data DESPUÉS de fusionar - keys: {list(pregunta_data.keys())}")
-                                        
-                                        # Verificar que validacion_input se haya fusionado correctamente DESPUÉS del update
-                                        if 'validacion_input' in pregunta_data:
-                                            logging.info(f"[FUSION] Campo '{clave}': validacion_input={pregunta_data.get('validacion_input')} fusionado correctamente en pregunta_data final")
-                                        else:
-                                            logging.error(f"[FUSION ERROR] Campo '{clave}': validacion_input NO está en pregunta_data después de fusionar. Propiedades finales: {list(pregunta_data.keys())}")
-                                        
-                                        logging.info(f"[FUSION] Campo '{clave}': Campos fusionados desde grupo_datos: {list(campos_fusionados.keys())}")
-                                    preguntas_lista.append(pregunta_data)
-                                elif isinstance(item, dict):
-                                    # Si no hay archivo individual, usar el item completo como pregunta
-                                    # Esto permite campos definidos solo en grupo_datos
-                                    pregunta_data = item.copy()
-                                    # Verificar que validacion_input esté presente
-                                    if 'validacion_input' in pregunta_data:
-                                        logging.info(f"[FUSION] Campo '{clave}': validacion_input={pregunta_data.get('validacion_input')} desde grupo_datos (sin archivo individual)")
-                                    preguntas_lista.append(pregunta_data)
-                                    logging.info(f"[FUSION] Campo '{clave}': Usando definición completa desde grupo_datos (sin archivo individual)")
-                        
-                        if preguntas_lista:
-                            contenido = {"datos": preguntas_lista}
-                            
-                            # Preservar frase_introduccion si existe en el objeto anidado
-                            # La estructura es: {"Domicilio_01": {"frase_introduccion": {...}, "grupo_datos": [...]}}
-                            if isinstance(seccion_data, dict):
-                                for key, value in seccion_data.items():
-                                    if isinstance(value, dict) and 'frase_introduccion' in value:
-                                        contenido['frase_introduccion'] = value['frase_introduccion']
-                                        logging.info(f"[INFO] Frase introductoria encontrada en '{nombre_archivo}' para clave '{key}'")
-                                        break
-                            
-                            # Agregar a caché para futuras consultas
-                            self._preguntas_cargadas[nombre_archivo] = contenido
-                            logging.info(f"[INFO] Archivo '{nombre_archivo}' cargado desde {secciones_dir} con {len(preguntas_lista)} preguntas")
-                            if 'frase_introduccion' in contenido:
-                                logging.info(f"[INFO] Frase introductoria preservada en contenido: {contenido.get('frase_introduccion')}")
-                            return contenido
-            except (json.JSONDecodeError, Exception) as e:
-                logging.error(f"[ERROR] No se pudo cargar {archivo_path}: {e}")
-        
-        # Fallback: si se buscó en la carpeta de la empresa y no se encontró, intentar en la ruta antigua
-        if empresa and secciones_dir != INV_DATOS_SECCIONES_DIR:
-            archivo_path_fallback = INV_DATOS_SECCIONES_DIR / nombre_archivo
-            if archivo_path_fallback.exists() and archivo_path_fallback.is_file():
-                try:
-                    with open(archivo_path_fallback, 'r', encoding='utf-8') as f:
-                        seccion_data = json.load(f)
-                        grupo_datos = None
-                        if isinstance(seccion_data, dict):
-                            for key, value in seccion_data.items():
-                                if isinstance(value, dict) and 'grupo_datos' in value:
-                                    grupo_datos = value['grupo_datos']
-                                    break
-                        elif isinstance(seccion_data, list):
-                            grupo_datos = seccion_data
-                        
-                        if grupo_datos:
-                            preguntas_lista = []
-                            for item in grupo_datos:
-                                clave = item.get('clave') if isinstance(item, dict) else str(item)
-                                if clave:
-                                    pregunta_data = cargar_dato_pregunta(clave)
-                                    if pregunta_data:
-                                        if isinstance(item, dict):
-                                            campos_fusionados = {k: v for k, v in item.items() if k not in ['clave', 'nombre']}
-                                            pregunta_data.update(campos_fusionados)
-                                        preguntas_lista.append(pregunta_data)
-                            
-                            if preguntas_lista:
-                                contenido = {"datos": preguntas_lista}
-                                if isinstance(seccion_data, dict):
-                                    for key, value in seccion_data.items():
-                                        if isinstance(value, dict) and 'frase_introduccion' in value:
-                                            contenido['frase_introduccion'] = value['frase_introduccion']
-                                            break
-                                self._preguntas_cargadas[nombre_archivo] = contenido
-                                logging.info(f"[INFO] Archivo '{nombre_archivo}' cargado desde fallback (inv_datos/secciones/) con {len(preguntas_lista)} preguntas")
-                                return contenido
-                except (json.JSONDecodeError, Exception) as e:
-                    logging.error(f"[ERROR] No se pudo cargar {archivo_path_fallback}: {e}")
-        
-        # 2. Intentar en inv_datos/grupos/ (archivos de sección de grupos como G001_01.json)
-        archivo_path = INV_DATOS_GRUPOS_DIR / nombre_archivo
-        if archivo_path.exists() and archivo_path.is_file():
-            try:
-                with open(archivo_path, 'r', encoding='utf-8') as f:
-                    seccion_data = json.load(f)
-                    # El archivo puede tener estructura como {"Generales_01": {"grupo_datos": [...]}}
-                    # o ser una lista directamente
-                    grupo_datos = None
-                    if isinstance(seccion_data, dict):
-                        # Buscar el primer grupo_datos en cualquier clave
-                        for key, value in seccion_data.items():
-                            if isinstance(value, dict) and 'grupo_datos' in value:
-                                grupo_datos = value['grupo_datos']
-                                break
-                    elif isinstance(seccion_data, list):
-                        grupo_datos = seccion_data
-                    
-                    if grupo_datos:
-                        # Extraer el prefijo del grupo (ej: G001 de G001_01)
-                        # Y buscar los archivos en inv_datos/grupos/datos/G001/
-                        prefijo_grupo = None
-                        if nombre_archivo.startswith('G') and '_' in nombre_archivo:
-                            prefijo_grupo = nombre_archivo.split('_')[0]  # Ej: "G001" de "G001_01.json"
-                        
-                        # Construir la lista de preguntas desde los archivos individuales
-                        preguntas_lista = []
-                        for item in grupo_datos:
-                            clave = item.get('clave') if isinstance(item, dict) else str(item)
-                            if clave:
-                                # Si tenemos un prefijo de grupo, buscar en inv_datos/grupos/datos/{prefijo}/
-                                # Si no, buscar en inv_datos/datos/
-                                pregunta_data = None
-                                if prefijo_grupo:
-                                    archivo_pregunta_path = INV_DATOS_GRUPOS_DATOS_DIR / prefijo_grupo / f"{clave}.json"
-                                    if archivo_pregunta_path.exists():
-                                        try:
-                                            with open(archivo_pregunta_path, 'r', encoding='utf-8') as pf:
-                                                pregunta_data = json.load(pf)
-                                        except (json.JSONDecodeError, Exception) as e:
-                                            logging.error(f"[ERROR] No se pudo cargar {archivo_pregunta_path}: {e}")
-                                
-                                # Si no se encontró en el grupo, intentar en datos/
-                                if not pregunta_data:
-                                    pregunta_data = cargar_dato_pregunta(clave)
-                                
-                                if pregunta_data:
-                                    # Fusionar campos del grupo_datos (catalogo, anclar, etc.) con los datos del archivo
-                                    if isinstance(item, dict):
-                                        pregunta_data.update({k: v for k, v in item.items() if k != 'clave'})
-                                    preguntas_lista.append(pregunta_data)
-                        
-                        if preguntas_lista:
-                            contenido = {"datos": preguntas_lista}
-                            # Agregar a caché para futuras consultas
-                            self._preguntas_cargadas[nombre_archivo] = contenido
-                            logging.info(f"[INFO] Archivo '{nombre_archivo}' cargado desde inv_datos/grupos/ con {len(preguntas_lista)} preguntas")
-                            return contenido
-            except (json.JSONDecodeError, Exception) as e:
-                logging.error(f"[ERROR] No se pudo cargar {archivo_path}: {e}")
-        
-        # 3. Intentar en inv_datos/datos/ (archivos que contienen directamente un array de datos)
-        archivo_path = INV_DATOS_DATOS_DIR / nombre_archivo
-        if archivo_path.exists() and archivo_path.is_file():
+        if nombre_archivo is None and empresa is None:
+            with self._lock_cache:
+                self._generacion += 1
+                self._preguntas_cargadas.clear()
+                self._dependientes.clear()
+                self._contador_bytes.limpiar()
+            self._no_encontrados.clear()
+            tabla_internado.limpiar()
+            return
+        if nombre_archivo is not None:
+            nombre_archivo = _normalizar_nombre(nombre_archivo)
+
+        def coincide(clave: Tuple[str, str]) -> bool:
+            return ((nombre_archivo is None or clave[1] == nombre_archivo)
+                    and (empresa is None or clave[0] == empresa))
+
+        for clave in [c for c in list(self._preguntas_cargadas) if coincide(c)]:
+            self._quitar(clave)
+        for clave_busqueda in [c for c in list(self._no_encontrados) if coincide(c)]:
+            self._no_encontrados.pop(clave_busqueda, None)
+
+    def invalidar_dependientes(self, nodos: Iterable[Tuple[str, str]], empresa: str = None) -> List[Tuple[str, str]]:
+        """
+        Quita de la caché solo las entradas que dependen de alguno de los nodos
+        (ej: (DEP_DATO, "B00001") al editar ese dato). Con 'empresa', solo las de
+        esa empresa (un archivo de empresas/{empresa}/secciones/ no afecta a otras).
+        Devuelve las (empresa, archivo) quitadas, para recompilarlas.
+        """
+        nodos = list(nodos)
+        with self._lock_cache:
+            afectadas = set()
+            for nodo in nodos:
+                afectadas.update(self._dependientes.get(nodo, ()))
+        if empresa is not None:
+            afectadas = {c for c in afectadas if c[0] == empresa}
+        for clave in afectadas:
+            self._quitar(clave)
+        metricas.incrementar("definiciones.invalidadas_por_dependencia", len(afectadas))
+        # Los resultados negativos no registran dependencias: se vuelven a buscar
+        for clave_busqueda in [c for c in list(self._no_encontrados) if empresa is None or c[0] == empresa]:
+            self._no_encontrados.pop(clave_busqueda, None)
+        return sorted(afectadas)
+
+    async def recompilar_async(self, claves: Iterable[Tuple[str, str]]) -> int:
+        """Vuelve a compilar (en el pool de hilos) las entradas quitadas; devuelve cuántas existen."""
+        definiciones = await asyncio.gather(*(
+            self.obtener_definiciones_async(archivo, empresa or None) for empresa, archivo in claves
+        ))
+        return sum(1 for d in definiciones if d is not None)
+
+    def _construir_desde_seccion(self, archivo_path: Path, nombre_archivo: str, fuentes: List[tuple],
+                                 incluir_items_sin_archivo: bool = True,
+                                 claves: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Construye las definiciones de un archivo de sección (lista de claves en 'grupo_datos'),
+        cargando cada dato individual y fusionando los campos del grupo_datos.
+        Las claves referenciadas se agregan a 'claves' (para el grafo de dependencias).
+        """
+        seccion_data = _leer_json(archivo_path)
+        grupo_datos = _extraer_grupo_datos(seccion_data)
+        if not grupo_datos:
+            return None
+
+        preguntas_lista = []
+        for item in grupo_datos:
+            clave = item.get('clave') if isinstance(item, dict) else str(item)
+            if not clave:
+                continue
+            if claves is not None:
+                claves.append(clave)
+            # Cargar el archivo individual desde inv_datos/datos/
+            pregunta_data, ruta_dato = _cargar_dato(clave)
+            if ruta_dato is not None:
+                fuentes.append(_firma_fuente(ruta_dato))
+            if pregunta_data:
+                # Fusionar todos los campos excepto 'clave' y 'nombre' (preservar nombre del archivo JSON).
+                # El 'nombre' del archivo JSON tiene la estructura multiidioma correcta.
+                # La definición del dato se comparte entre secciones y empresas; los campos
+                # del grupo_datos quedan como campos propios de la pregunta en esta sección.
+                campos_fusionados = None
+                if isinstance(item, dict):
+                    campos_fusionados = {k: v for k, v in item.items() if k not in ['clave', 'nombre']}
+                    depurar(lambda: f"[FUSION] Campo '{clave}': campos fusionados desde grupo_datos: {list(campos_fusionados)}")
+                preguntas_lista.append(tabla_internado.pregunta(pregunta_data, campos_fusionados))
+            elif incluir_items_sin_archivo and isinstance(item, dict):
+                # Si no hay archivo individual, usar el item completo como pregunta
+                # Esto permite campos definidos solo en grupo_datos
+                preguntas_lista.append(tabla_internado.pregunta(item))
+                depurar(lambda: f"[FUSION] Campo '{clave}': usando definición completa desde grupo_datos (sin archivo individual)")
+
+        if not preguntas_lista:
+            return None
+
+        # Preservar frase_introduccion si existe en el objeto anidado
+        # La estructura es: {"Domicilio_01": {"frase_introduccion": {...}, "grupo_datos": [...]}}
+        # También se conserva nombre_corto, usado como título de la sección en el formulario
+        return tabla_internado.definiciones(
+            preguntas_lista,
+            frase_introduccion=_extraer_de_seccion(seccion_data, 'frase_introduccion'),
+            nombre_corto=_extraer_de_seccion(seccion_data, 'nombre_corto'),
+        )
+
+    def _construir_desde_grupo(self, archivo_path: Path, nombre_archivo: str, fuentes: List[tuple],
+                               claves: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Construye las definiciones de un archivo de sección de grupos (inv_datos/grupos/),
+        buscando cada dato primero en inv_datos/grupos/datos/{prefijo}/.
+        """
+        grupo_datos = _extraer_grupo_datos(_leer_json(archivo_path))
+        if not grupo_datos:
+            return None
+
+        # Extraer el prefijo del grupo (ej: G001 de G001_01)
+        # Y buscar los archivos en inv_datos/grupos/datos/G001/
+        prefijo_grupo = None
+        if nombre_archivo.startswith('G') and '_' in nombre_archivo:
+            prefijo_grupo = nombre_archivo.split('_')[0]  # Ej: "G001" de "G001_01.json"
+
+        # Construir la lista de preguntas desde los archivos individuales
+        preguntas_lista = []
+        for item in grupo_datos:
+            clave = item.get('clave') if isinstance(item, dict) else str(item)
+            if not clave:
+                continue
+            if claves is not None:
+                claves.append(clave)
+            pregunta_data, ruta_dato = _cargar_dato(clave, prefijo_grupo)
+            if ruta_dato is not None:
+                fuentes.append(_firma_fuente(ruta_dato))
+            if pregunta_data:
+                # Fusionar campos del grupo_datos (catalogo, anclar, etc.) con los datos del archivo
+                campos_grupo = {k: v for k, v in item.items() if k != 'clave'} if isinstance(item, dict) else None
+                preguntas_lista.append(tabla_internado.pregunta(pregunta_data, campos_grupo))
+
+        if not preguntas_lista:
+            return None
+        return tabla_internado.definiciones(preguntas_lista)
+
+    def _compilar_definiciones(self, nombre_archivo: str, empresa: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Resuelve el archivo con el índice de inv_datos, construye sus definiciones
+        y las guarda en caché junto con la firma de sus archivos fuente.
+        Los candidatos se prueban en orden de prioridad:
+        1. inv_datos/empresas/{empresa}/secciones/
+        2. inv_datos/secciones/ (ruta antigua)
+        3. inv_datos/grupos/ (archivos de sección de grupos como G001_01.json)
+        4. inv_datos/datos/ (archivos que contienen directamente un array de datos)
+        5. inv_datos/grupos/datos/*/
+        """
+        clave_busqueda = (empresa or "", nombre_archivo)
+        if self._no_encontrados.get(clave_busqueda) == self._generacion:
+            return None
+
+        for origen, archivo_path in indice_rutas.candidatos_seccion(nombre_archivo, empresa):
+            fuentes = [_firma_fuente(archivo_path)]
+            claves: List[str] = []
             try:
-                with open(archivo_path, 'r', encoding='utf-8') as f:
-                    contenido = json.load(f)
-                    if 'datos' in contenido:
-                        # Agregar a caché para futuras consultas
-                        self._preguntas_cargadas[nombre_archivo] = contenido
-                        logging.info(f"[INFO] Archivo '{nombre_archivo}' cargado desde inv_datos/datos/")
-                        return contenido
+                if origen == ORIGEN_EMPRESA:
+                    contenido = self._construir_desde_seccion(archivo_path, nombre_archivo, fuentes, claves=claves)
+                elif origen == ORIGEN_SECCIONES:
+                    # Cuando se buscó primero en la carpeta de la empresa, esta es la ruta de fallback
+                    contenido = self._construir_desde_seccion(archivo_path, nombre_archivo, fuentes,
+                                                              incluir_items_sin_archivo=not empresa, claves=claves)
+                elif origen == ORIGEN_GRUPOS:
+                    contenido = self._construir_desde_grupo(archivo_path, nombre_archivo, fuentes, claves=claves)
+                else:
+                    contenido = _leer_json(archivo_path)
+                    contenido = _compactar_contenido(contenido) if 'datos' in contenido else None
             except (json.JSONDecodeError, Exception) as e:
                 logging.error(f"[ERROR] No se pudo cargar {archivo_path}: {e}")
-        
-        # 4. Intentar en inv_datos/grupos/datos/*/ (buscando en subdirectorios directamente)
-        if INV_DATOS_GRUPOS_DATOS_DIR.exists():
-            for subdir in INV_DATOS_GRUPOS_DATOS_DIR.iterdir():
-                if subdir.is_dir():
-                    archivo_path = subdir / nombre_archivo
-                    if archivo_path.exists() and archivo_path.is_file():
-                        try:
-                            with open(archivo_path, 'r', encoding='utf-8') as f:
-                                contenido = json.load(f)
-                                if 'datos' in contenido:
-                                    # Agregar a caché para futuras consultas
-                                    self._preguntas_cargadas[nombre_archivo] = contenido
-                                    logging.info(f"[INFO] Archivo '{nombre_archivo}' cargado desde inv_datos/grupos/datos/{subdir.name}/")
-                                    return contenido
-                        except (json.JSONDecodeError, Exception) as e:
-                            logging.error(f"[ERROR] No se pudo cargar {archivo_path}: {e}")
-        
+                continue
+            if contenido:
+                logging.info(f"[INFO] Archivo '{nombre_archivo}' cargado desde {archivo_path.parent} con {len(contenido['datos'])} preguntas")
+                return self._guardar_en_cache(empresa, nombre_archivo, contenido, fuentes, claves)
+
+        # Archivos legacy con 'datos' (inv_datos/secciones/ o RESOURCES_PATH) vía cargar_json
+        contenido = cargar_json(nombre_archivo)
+        if contenido and 'datos' in contenido:
+            logging.info(f"[INFO] Archivo '{nombre_archivo}' cargado con cargar_json (legacy)")
+            fuentes = [_firma_fuente(INV_DATOS_SECCIONES_DIR / nombre_archivo), _firma_fuente(RESOURCES_PATH / nombre_archivo)]
+            return self._guardar_en_cache(empresa, nombre_archivo, _compactar_contenido(contenido), fuentes)
+
+        # Se recuerda que no existe hasta la próxima invalidación/reconstrucción del índice
+        self._no_encontrados[clave_busqueda] = self._generacion
         return None
 
+    def reconstruir_indice(self):
+        """
+        Vuelve a indexar inv_datos (necesario tras agregar o eliminar archivos)
+        e invalida toda la caché de definiciones.
+        """
+        indice_rutas.reconstruir()
+        self.invalidar_cache()
+
+    def obtener_definiciones(self, nombre_archivo: str, empresa: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve la estructura completa de un archivo de preguntas.
+        Primero busca en la caché compilada (revalidada por stat de sus archivos fuente);
+        si no está o quedó obsoleta, la reconstruye desde las ubicaciones conocidas.
+        """
+        # Normalizar el nombre del archivo
+        nombre_archivo = _normalizar_nombre(nombre_archivo)
+
+        # Primero intenta desde la caché de esta empresa
+        entrada = self._consultar((empresa or "", nombre_archivo))
+        if entrada is not None:
+            self._stats(empresa or "").aciertos += 1
+            metricas.incrementar("definiciones.aciertos")
+            return entrada.contenido
+
+        self._stats(empresa or "").fallos += 1
+        metricas.incrementar("definiciones.fallos")
+        with metricas.cronometro("definiciones.compilar"):
+            return self._compilar_definiciones(nombre_archivo, empresa)
+
+    def consultar_cache(self, nombre_archivo: str, empresa: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve las definiciones solo si ya están en caché y siguen vigentes.
+        Nunca lee ni parsea archivos (a lo sumo hace stat de sus fuentes).
+        """
+        entrada = self._consultar((empresa or "", _normalizar_nombre(nombre_archivo)))
+        return entrada.contenido if entrada is not None else None
+
+    def precalentar(self, guion_secciones: List[Dict[str, Any]], empresa: str = None) -> Dict[str, int]:
+        """
+        Compila por adelantado las definiciones de las secciones de un guion para una
+        empresa (ej: al publicar una campaña), para que el primer candidato no pague la carga.
+        """
+        resultado = {"cargadas": 0, "no_encontradas": 0}
+        for seccion in guion_secciones:
+            if not seccion.get("archivo"):
+                continue
+            if self.obtener_definiciones(seccion["archivo"], empresa) is not None:
+                resultado["cargadas"] += 1
+            else:
+                resultado["no_encontradas"] += 1
+        return resultado
+
+    async def precalentar_async(self, guion_secciones: List[Dict[str, Any]], empresa: str = None) -> Dict[str, int]:
+        """Versión async de precalentar: las secciones se cargan en el pool de hilos."""
+        definiciones = await asyncio.gather(*(
+            self.obtener_definiciones_async(s["archivo"], empresa) for s in guion_secciones if s.get("archivo")
+        ))
+        cargadas = sum(1 for d in definiciones if d is not None)
+        return {"cargadas": cargadas, "no_encontradas": len(definiciones) - cargadas}
+
+    def estadisticas_cache(self) -> Dict[str, Any]:
+        """Ocupación de la caché de definiciones y aciertos/fallos/expulsiones por empresa."""
+        with self._lock_cache:
+            entradas_por_empresa: Dict[str, int] = {}
+            bytes_por_empresa: Dict[str, int] = {}
+            for (empresa, _archivo), entrada in self._preguntas_cargadas.items():
+                entradas_por_empresa[empresa] = entradas_por_empresa.get(empresa, 0) + 1
+                bytes_por_empresa[empresa] = bytes_por_empresa.get(empresa, 0) + entrada.tamano
+            total_entradas = len(self._preguntas_cargadas)
+            total_bytes = self._contador_bytes.bytes
+            nodos_dependencia = len(self._dependientes)
+        empresas = {}
+        for empresa in sorted(set(self._estadisticas) | set(entradas_por_empresa)):
+            stats = self._estadisticas.get(empresa) or _EstadisticasEmpresa()
+            empresas[empresa or "(sin empresa)"] = {
+                "entradas": entradas_por_empresa.get(empresa, 0),
+                "bytes_estimados": bytes_por_empresa.get(empresa, 0),
+                "aciertos": stats.aciertos,
+                "fallos": stats.fallos,
+                "expulsiones": stats.expulsiones,
+            }
+        return {
+            "entradas": total_entradas,
+            "max_entradas": MAX_ENTRADAS_CACHE,
+            "bytes_estimados": total_bytes,
+            "max_bytes": MAX_BYTES_CACHE,
+            "nodos_dependencia": nodos_dependencia,
+            "empresas": empresas,
+        }
+
+    async def obtener_definiciones_async(self, nombre_archivo: str, empresa: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Versión para handlers async de obtener_definiciones: un acierto de caché se
+        resuelve en el event loop; una carga se hace en el pool de hilos y las
+        peticiones concurrentes del mismo (empresa, archivo) comparten esa carga.
+        """
+        nombre_archivo = _normalizar_nombre(nombre_archivo)
+        contenido = self.consultar_cache(nombre_archivo, empresa)
+        if contenido is not None:
+            self._stats(empresa or "").aciertos += 1
+            metricas.incrementar("definiciones.aciertos")
+            return contenido
+        return await self._cargas_en_curso.ejecutar(
+            (empresa or "", nombre_archivo), self.obtener_definiciones, nombre_archivo, empresa
+        )
+
+    async def obtener_preguntas_async(self, nombre_archivo: str, empresa: str = None) -> List[Dict[str, Any]]:
+        """Versión async de obtener_preguntas (ver obtener_definiciones_async)."""
+        definiciones = await self.obtener_definiciones_async(nombre_archivo, empresa)
+        if definiciones:
+            return definiciones.get('datos', [])
+        logging.warning(f"[WARNING] No se encontró el archivo '{nombre_archivo}' en ninguna ubicación conocida.")
+        return []
+
     def obtener_preguntas(self, nombre_archivo: str, empresa: str = None) -> List[Dict[str, Any]]:
         """
         Devuelve solo la lista de preguntas ('datos') de un archivo.
@@ -396,12 +631,37 @@ class MaestroDePreguntas:
         logging.debug(f"[DEBUG] Buscado en: {INV_DATOS_DATOS_DIR} y {INV_DATOS_GRUPOS_DATOS_DIR}")
         return []
 
+    def reporte_memoria(self) -> Dict[str, Any]:
+        """
+        Tamaño de las definiciones en memoria: bytes reales (lo compartido se cuenta
+        una vez) frente a los que ocuparían con un dict independiente por pregunta.
+        """
+        # Se llama fuera del event loop: la caché puede cambiar mientras se mide
+        with self._lock_cache:
+            contenidos = [entrada.contenido for entrada in self._preguntas_cargadas.values()]
+        preguntas = [p for contenido in contenidos for p in contenido.get('datos', ())] + self._lista_completa_campos
+        bytes_compactos = tamano_profundo([contenidos, self._lista_completa_campos])
+        bytes_sin_compartir = sum(tamano_profundo(descongelar(c)) for c in contenidos)
+        bytes_sin_compartir += tamano_profundo(descongelar(self._lista_completa_campos))
+        return {
+            "archivos": len(contenidos),
+            "preguntas": len(preguntas),
+            "preguntas_distintas": len({id(p) for p in preguntas}),
+            "valores_internados": len(tabla_internado),
+            "bytes": bytes_compactos,
+            "bytes_sin_compartir": bytes_sin_compartir,
+            "reduccion": round(bytes_sin_compartir / bytes_compactos, 2) if bytes_compactos else None,
+        }
+
     def obtener_todos_los_campos(self) -> List[Dict[str, Any]]:
         """
         Devuelve una lista plana con TODOS los campos de TODAS las entrevistas.
         Ideal para construir el formulario en el frontend.
         """
+        self._cargar_todas_las_preguntas()
         return self._lista_completa_campos
 
 # Creamos una única instancia que será usada por toda la aplicación
-maestro_preguntas = MaestroDePreguntas()
\ No newline at end of file
+maestro_preguntas = MaestroDePreguntas()
+# Si otro proceso publica un snapshot nuevo de inv_datos, las definiciones compiladas dejan de valer
+al_cambiar_generacion(maestro_preguntas.invalidar_cache)
\ No newline at end of file
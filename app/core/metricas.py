@@ -0,0 +1,136 @@
+# en app/core/metricas.py
+
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict
+
+# Fracción de los mensajes de depuración que se emiten cuando el nivel DEBUG está activo
+TASA_MUESTREO_DEPURACION = float(os.getenv("FORM_DEBUG_MUESTREO", "0.1"))
+
+# Llamadas a base de datos hechas dentro de la petición actual. Es una lista mutable
+# para que las tareas hijas (asyncio.gather) sumen sobre el mismo contador.
+_db_en_peticion: contextvars.ContextVar[list] = contextvars.ContextVar("db_en_peticion", default=None)
+
+
+class _Tiempo:
+    __slots__ = ("conteo", "total", "maximo")
+
+    def __init__(self):
+        self.conteo = 0
+        self.total = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, segundos: float):
+        self.conteo += 1
+        self.total += segundos
+        if segundos > self.maximo:
+            self.maximo = segundos
+
+    def a_dict(self) -> Dict[str, Any]:
+        return {
+            "conteo": self.conteo,
+            "total_ms": round(self.total * 1000, 3),
+            "promedio_ms": round(self.total * 1000 / self.conteo, 3) if self.conteo else 0.0,
+            "max_ms": round(self.maximo * 1000, 3),
+        }
+
+
+class Metricas:
+    """
+    Contadores y cronómetros por fase del pipeline del formulario (aciertos de
+    caché, archivos leídos, bytes parseados, cargas de catálogos, render por
+    sección, llamadas a BD por petición...). Seguro para usar desde el pool de hilos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores: Dict[str, int] = {}
+        self._tiempos: Dict[str, _Tiempo] = {}
+        self.desde = time.time()
+
+    def incrementar(self, nombre: str, valor: int = 1):
+        with self._lock:
+            self._contadores[nombre] = self._contadores.get(nombre, 0) + valor
+
+    def registrar_tiempo(self, fase: str, segundos: float):
+        with self._lock:
+            tiempo = self._tiempos.get(fase)
+            if tiempo is None:
+                tiempo = self._tiempos[fase] = _Tiempo()
+            tiempo.registrar(segundos)
+
+    @contextmanager
+    def cronometro(self, fase: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar_tiempo(fase, time.perf_counter() - inicio)
+
+    def instantanea(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "desde": self.desde,
+                "contadores": dict(sorted(self._contadores.items())),
+                "tiempos": {fase: t.a_dict() for fase, t in sorted(self._tiempos.items())},
+            }
+
+    def reiniciar(self):
+        with self._lock:
+            self._contadores.clear()
+            self._tiempos.clear()
+            self.desde = time.time()
+
+
+# Instancia única usada por toda la aplicación
+metricas = Metricas()
+
+
+def iniciar_peticion():
+    """Reinicia el contador de llamadas a BD de la petición actual."""
+    _db_en_peticion.set([0])
+
+
+def finalizar_peticion(ruta: str):
+    """Registra cuántas llamadas a BD hizo la petición actual."""
+    contador = _db_en_peticion.get()
+    metricas.incrementar(f"db.peticiones.{ruta}")
+    metricas.incrementar(f"db.llamadas.{ruta}", contador[0] if contador else 0)
+
+
+async def medir_db(operacion: str, coro):
+    """Espera una operación de BD contándola y midiendo su duración."""
+    contador = _db_en_peticion.get()
+    if contador is not None:
+        contador[0] += 1
+    metricas.incrementar("db.llamadas")
+    with metricas.cronometro(f"db.{operacion}"):
+        return await coro
+
+
+class CanalDepuracion:
+    """
+    Trazas de depuración evaluadas de forma perezosa: el mensaje se construye
+    (llamando a la función recibida) solo si el logger tiene DEBUG activo y
+    el mensaje pasa el muestreo.
+    """
+
+    def __init__(self, nombre: str, tasa_muestreo: float = TASA_MUESTREO_DEPURACION):
+        self.logger = logging.getLogger(nombre)
+        self.tasa_muestreo = tasa_muestreo
+
+    def __call__(self, mensaje: Callable[[], str]):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        if self.tasa_muestreo < 1.0 and random.random() >= self.tasa_muestreo:
+            return
+        self.logger.debug(mensaje())
+
+
+# Canal para las trazas detalladas del pipeline del formulario (fusión de campos, render...)
+depurar = CanalDepuracion("app.formulario")
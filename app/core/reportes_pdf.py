@@ -0,0 +1,228 @@
+# en app/core/reportes_pdf.py
+"""
+Generación de reportes PDF en segundo plano, con caché en disco.
+
+- Cada reporte se identifica por la huella (sha256) de los datos de la
+  evaluación con los que se genera: mientras los datos no cambien, la descarga
+  es un archivo estático ya generado.
+- Los PDFs se generan en un pool de hilos propio y acotado; si la cola de
+  trabajos está llena, solicitar() lanza ColaLlena y la ruta responde 503.
+- Pedir el mismo reporte mientras se genera devuelve el mismo trabajo. Entre
+  procesos, un flock sobre '<archivo>.lock' evita generarlo dos veces.
+
+La función que produce los bytes del PDF la registra la aplicación al arrancar
+con configurar_generador(); se ejecuta fuera del event loop.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from app.core.metricas import metricas
+
+try:
+    import fcntl
+except ImportError:  # fuera de POSIX no hay flock: solo se evita la generación doble dentro del proceso
+    fcntl = None
+
+REPORTES_PDF_DIR = Path(os.getenv("REPORTES_PDF_DIR", "reportes_pdf"))
+# Hilos que generan PDFs a la vez y trabajos que pueden esperar turno
+MAX_HILOS_PDF = int(os.getenv("REPORTES_PDF_HILOS", "2"))
+MAX_TRABAJOS_EN_COLA = int(os.getenv("REPORTES_PDF_EN_COLA", "32"))
+# Reportes que se conservan en disco (se borran los más antiguos)
+MAX_REPORTES_DISCO = int(os.getenv("REPORTES_PDF_MAX_ARCHIVOS", "500"))
+# Cambiarla invalida todos los reportes ya generados (ej: al modificar la plantilla)
+VERSION_REPORTE = os.getenv("REPORTES_PDF_VERSION", "1")
+# Trabajos terminados que se recuerdan para responder a la consulta de estado
+MAX_TRABAJOS_RECORDADOS = 1024
+
+ejecutor_pdf = ThreadPoolExecutor(max_workers=MAX_HILOS_PDF, thread_name_prefix="reportes-pdf")
+
+_NOMBRE_VALIDO = re.compile(r"^[A-Za-z0-9_-]+$")
+_HUELLA_VALIDA = re.compile(r"^[0-9a-f]{64}$")
+
+# Estados de un trabajo
+EN_COLA = "en_cola"
+GENERANDO = "generando"
+LISTO = "listo"
+ERROR = "error"
+
+
+class ColaLlena(Exception):
+    """No se aceptan más trabajos de generación hasta que termine alguno."""
+
+
+def huella_reporte(evaluacion_uuid: str, datos: Dict[str, Any]) -> str:
+    """
+    Huella de los datos con los que se genera el reporte de una evaluación. Quien
+    llama pasa solo lo que el reporte muestra, para que los campos de control no
+    cambien la huella.
+    """
+    contenido = json.dumps(
+        {"version": VERSION_REPORTE, "uuid": evaluacion_uuid, "datos": datos},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def ruta_reporte(evaluacion_uuid: str, huella: str) -> Optional[Path]:
+    """Archivo en disco de un reporte; None si los identificadores no son válidos."""
+    if not _NOMBRE_VALIDO.match(evaluacion_uuid or "") or not _HUELLA_VALIDA.match(huella or ""):
+        return None
+    return REPORTES_PDF_DIR / f"{evaluacion_uuid}_{huella}.pdf"
+
+
+class TrabajoPDF:
+    __slots__ = ("id", "evaluacion_uuid", "estado", "error", "creado", "terminado")
+
+    def __init__(self, evaluacion_uuid: str, huella: str, estado: str = EN_COLA):
+        self.id = huella
+        self.evaluacion_uuid = evaluacion_uuid
+        self.estado = estado
+        self.error: Optional[str] = None
+        self.creado = time.time()
+        self.terminado: Optional[float] = time.time() if estado == LISTO else None
+
+    def a_dict(self) -> Dict[str, Any]:
+        return {"trabajo_id": self.id, "estado": self.estado, "error": self.error}
+
+
+class GestorReportesPDF:
+    """Trabajos de generación en curso y recientes, por huella."""
+
+    def __init__(self):
+        self._generador: Optional[Callable[[str, Dict[str, Any]], bytes]] = None
+        self._trabajos: "OrderedDict[str, TrabajoPDF]" = OrderedDict()
+        self._pendientes = 0
+
+    def configurar_generador(self, generador: Callable[[str, Dict[str, Any]], bytes]):
+        """Registra la función (evaluacion_uuid, datos) -> bytes del PDF."""
+        self._generador = generador
+
+    def _recordar(self, trabajo: TrabajoPDF):
+        self._trabajos[trabajo.id] = trabajo
+        self._trabajos.move_to_end(trabajo.id)
+        while len(self._trabajos) > MAX_TRABAJOS_RECORDADOS:
+            antiguo = next(iter(self._trabajos.values()))
+            if antiguo.estado in (EN_COLA, GENERANDO):
+                break
+            self._trabajos.popitem(last=False)
+
+    def solicitar(self, evaluacion_uuid: str, datos: Dict[str, Any]) -> TrabajoPDF:
+        """
+        Trabajo del reporte para estos datos: ya listo si está en disco, el que
+        está en curso si alguien más lo pidió, o uno nuevo encolado.
+        """
+        huella = huella_reporte(evaluacion_uuid, datos)
+        ruta = ruta_reporte(evaluacion_uuid, huella)
+        if ruta is None:
+            raise ValueError("Identificador de evaluación inválido.")
+
+        trabajo = self._trabajos.get(huella)
+        if trabajo is not None and trabajo.estado in (EN_COLA, GENERANDO):
+            metricas.incrementar("pdf.coalescidos")
+            return trabajo
+        if ruta.is_file():
+            metricas.incrementar("pdf.cache_hits")
+            trabajo = TrabajoPDF(evaluacion_uuid, huella, LISTO)
+            self._recordar(trabajo)
+            return trabajo
+        if self._generador is None:
+            raise RuntimeError("No hay generador de PDF configurado.")
+        if self._pendientes >= MAX_TRABAJOS_EN_COLA:
+            metricas.incrementar("pdf.rechazados")
+            raise ColaLlena()
+
+        trabajo = TrabajoPDF(evaluacion_uuid, huella)
+        self._recordar(trabajo)
+        self._pendientes += 1
+        loop = asyncio.get_running_loop()
+        futuro = loop.run_in_executor(ejecutor_pdf, self._generar, trabajo, ruta, datos)
+        futuro.add_done_callback(lambda f: self._terminar(trabajo, f))
+        return trabajo
+
+    def _generar(self, trabajo: TrabajoPDF, ruta: Path, datos: Dict[str, Any]):
+        trabajo.estado = GENERANDO
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        with open(f"{ruta}.lock", "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                # Otro proceso pudo generarlo mientras se esperaba el lock
+                if ruta.is_file():
+                    return
+                with metricas.cronometro("pdf.generar"):
+                    contenido = self._generador(trabajo.evaluacion_uuid, datos)
+                temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.tmp")
+                temporal.write_bytes(contenido)
+                os.replace(temporal, ruta)
+                metricas.incrementar("pdf.generados")
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        self._podar()
+
+    def _terminar(self, trabajo: TrabajoPDF, futuro: asyncio.Future):
+        self._pendientes -= 1
+        trabajo.terminado = time.time()
+        if futuro.cancelled():
+            # exception() lanzaría CancelledError dentro del callback
+            metricas.incrementar("pdf.cancelados")
+            trabajo.estado = ERROR
+            trabajo.error = "Se canceló la generación del PDF."
+            return
+        error = futuro.exception()
+        if error is None:
+            trabajo.estado = LISTO
+            return
+        logging.error(f"[PDF] Error generando el reporte de {trabajo.evaluacion_uuid}: {error}")
+        metricas.incrementar("pdf.errores")
+        trabajo.estado = ERROR
+        trabajo.error = "No se pudo generar el PDF."
+
+    def _podar(self):
+        """Borra los reportes más antiguos cuando hay más de MAX_REPORTES_DISCO."""
+        archivos = list(REPORTES_PDF_DIR.glob("*.pdf"))
+        if len(archivos) <= MAX_REPORTES_DISCO:
+            return
+        def _mtime(p: Path) -> float:
+            try:
+                return p.stat().st_mtime
+            except FileNotFoundError:
+                return 0.0
+        archivos.sort(key=_mtime)
+        for archivo in archivos[:len(archivos) - MAX_REPORTES_DISCO]:
+            for ruta in (archivo, Path(f"{archivo}.lock")):
+                try:
+                    ruta.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def consultar(self, evaluacion_uuid: str, trabajo_id: str) -> Optional[TrabajoPDF]:
+        """
+        Estado de un trabajo. Si no es de este proceso pero el archivo ya está en
+        disco (lo generó otro worker), se reporta como listo.
+        """
+        trabajo = self._trabajos.get(trabajo_id)
+        if trabajo is not None and trabajo.evaluacion_uuid == evaluacion_uuid:
+            return trabajo
+        ruta = ruta_reporte(evaluacion_uuid, trabajo_id)
+        if ruta is not None and ruta.is_file():
+            return TrabajoPDF(evaluacion_uuid, trabajo_id, LISTO)
+        return None
+
+    def estadisticas(self) -> Dict[str, Any]:
+        en_curso = sum(1 for t in self._trabajos.values() if t.estado in (EN_COLA, GENERANDO))
+        return {"pendientes": self._pendientes, "en_curso": en_curso, "recordados": len(self._trabajos)}
+
+
+# Instancia única usada por las rutas de reportes
+gestor_reportes_pdf = GestorReportesPDF()
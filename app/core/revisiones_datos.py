@@ -0,0 +1,221 @@
+# en app/core/revisiones_datos.py
+"""
+Revisiones de los datos guardados de una evaluación, para que /form/data pueda
+enviar solo lo que cambió desde la última carga del navegador.
+
+Cada guardado desde las rutas del formulario, una vez escritos los datos, anota
+en el documento de la evaluación (campo 'revisiones_datos') una revisión nueva
+y, por cada campo o registro de grupo escrito, [revisión, crc32 del valor escrito]:
+
+    {"rev": 12,
+     "campos": {"B00001": [12, 3719411872], ...},
+     "registros": {"03_GRUPO": {"<_id_registro>": [9, 220871233], ...}}}
+
+Al responder, un valor se considera conocido por el cliente solo si su crc
+coincide con el anotado; si no coincide (lo escribió otra vía, se perdió la
+anotación o se leyó antes de que terminara la escritura) se envía siempre, y la
+revisión informada baja para que se vuelva a enviar en la siguiente carga. Así
+una anotación perdida o desfasada cuesta bytes de más, nunca datos viejos.
+Los valores sin anotación vigente se anotan después de responder (anclar), para
+que dejen de enviarse en las cargas siguientes.
+
+La revisión se obtiene con un $inc atómico en BD, así que es única por
+evaluación aunque escriban varios workers a la vez, y se pide después de
+escribir los datos: una revisión publicada nunca es anterior a los datos que
+anota. Por eso quien lee debe leer las revisiones antes que los datos (ver
+leer_async): con el orden inverso, un token podría cubrir una escritura que
+los datos leídos aún no tenían.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from app.core.consultas_db import id_consulta, resolver
+from app.core.metricas import medir_db, metricas
+from app.database import get_evaluacion_collection
+
+# Campo del documento de la evaluación donde se guardan las revisiones
+CAMPO_REVISIONES = "revisiones_datos"
+# Claves e ids que se pueden usar como nombre de campo en BD; el resto no se anota
+# (sin anotación el valor se envía siempre, nunca se pierde)
+_CLAVE_ANOTABLE = re.compile(r"^[^.$][^.]*$")
+
+
+def _crc(valor: Any) -> int:
+    return zlib.crc32(json.dumps(valor, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def _huella_evaluacion(evaluacion_uuid: str) -> str:
+    return hashlib.sha1(evaluacion_uuid.encode("utf-8")).hexdigest()[:12]
+
+
+def token_revision(evaluacion_uuid: str, revision: int) -> str:
+    """Token opaco que recibe el cliente; lo devuelve en ?since= en la siguiente carga."""
+    return f"{_huella_evaluacion(evaluacion_uuid)}.{revision}"
+
+
+def leer_token(evaluacion_uuid: str, token: Optional[str]) -> Optional[int]:
+    """Revisión de un token; None si no es válido o es de otra evaluación."""
+    huella, _, revision = (token or "").partition(".")
+    if huella != _huella_evaluacion(evaluacion_uuid) or not revision.isdigit():
+        return None
+    return int(revision)
+
+
+def _vigente(entrada: Any, valor: Any) -> Optional[Tuple[int, bool]]:
+    """(revisión anotada, el valor actual es el anotado) o None si no hay anotación válida."""
+    if not isinstance(entrada, list) or len(entrada) != 2:
+        return None
+    return entrada[0], entrada[1] == _crc(valor)
+
+
+def calcular_delta(revisiones: Optional[Dict[str, Any]], datos: Dict[str, Any],
+                   desde: Optional[int] = None) -> Tuple[int, Optional[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Compara los datos guardados actuales con las revisiones anotadas.
+    Devuelve (revisión que se informa al cliente, delta, sin anotar). Sin 'desde'
+    (o si no es utilizable) el delta es None y el cliente debe usar los datos
+    completos. 'sin anotar' ({"campos": {...}, "registros": {...}}, vacío si todo
+    está anotado) es lo que conviene pasar a RegistroRevisiones.anclar_async.
+
+    El delta tiene la forma de datos_guardados:
+      {"entrevista": {clave: valor cambiado},
+       "grupos": {clave_grupo: {"ids": [todos los _id_registro en orden],
+                                "registros": [registros cambiados]}}}
+    Con "completo": true en un grupo, "registros" trae el grupo entero.
+    """
+    revisiones = revisiones if isinstance(revisiones, dict) else {}
+    revision = revisiones.get("rev") if isinstance(revisiones.get("rev"), int) else 0
+    informada = revision
+    if desde is not None and not 0 <= desde <= revision:
+        desde = None
+    con_delta = desde is not None
+
+    campos = revisiones.get("campos") or {}
+    entrevista = {}
+    sin_anotar: Dict[str, Any] = {}
+    for clave, valor in (datos.get("entrevista") or {}).items():
+        vigente = _vigente(campos.get(clave), valor)
+        if vigente is not None and vigente[1]:
+            if con_delta and vigente[0] > desde:
+                entrevista[clave] = valor
+            continue
+        if vigente is not None:
+            informada = min(informada, vigente[0] - 1)
+        sin_anotar.setdefault("campos", {})[clave] = valor
+        if con_delta:
+            entrevista[clave] = valor
+
+    registros_anotados = revisiones.get("registros") or {}
+    grupos = {}
+    datos_grupo = datos.get("grupos") or {}
+    for clave_grupo in set(datos_grupo) | set(registros_anotados):
+        registros = datos_grupo.get(clave_grupo) or []
+        anotados = registros_anotados.get(clave_grupo) or {}
+        ids: List[str] = []
+        cambiados = []
+        completo = False
+        for registro in registros:
+            registro_id = registro.get("_id_registro") if isinstance(registro, dict) else None
+            if not isinstance(registro_id, str):
+                completo = True
+                continue
+            ids.append(registro_id)
+            vigente = _vigente(anotados.get(registro_id), registro)
+            if vigente is not None and vigente[1]:
+                if con_delta and vigente[0] > desde:
+                    cambiados.append(registro)
+                continue
+            if vigente is not None:
+                informada = min(informada, vigente[0] - 1)
+            sin_anotar.setdefault("registros", {}).setdefault(clave_grupo, []).append(registro)
+            cambiados.append(registro)
+        if con_delta:
+            # Registros sin id no se pueden reconciliar: se envía el grupo entero
+            grupos[clave_grupo] = (
+                {"completo": True, "registros": registros} if completo
+                else {"ids": ids, "registros": cambiados}
+            )
+
+    if not con_delta:
+        return max(0, informada), None, sin_anotar
+    return max(0, informada), {"entrevista": entrevista, "grupos": grupos}, sin_anotar
+
+
+class RegistroRevisiones:
+    """Anota las escrituras del formulario en el documento de cada evaluación."""
+
+    async def leer_async(self, evaluacion_uuid: str) -> Optional[Dict[str, Any]]:
+        """Revisiones anotadas de la evaluación (leer antes que los datos a los que se aplican)."""
+        documento = await medir_db("leer_revisiones", resolver(get_evaluacion_collection().find_one(
+            {"_id": id_consulta(evaluacion_uuid)}, {CAMPO_REVISIONES: 1}
+        )))
+        return (documento or {}).get(CAMPO_REVISIONES)
+
+    async def registrar_async(self, evaluacion_uuid: str, campos: Optional[Dict[str, Any]] = None,
+                              registros: Optional[Dict[str, Iterable[Dict[str, Any]]]] = None,
+                              eliminados: Optional[Dict[str, Iterable[str]]] = None) -> Optional[int]:
+        """
+        Anota una revisión nueva con los campos de entrevista y los registros de
+        grupo escritos (y los registros eliminados). Se llama cuando la escritura
+        de los datos ya terminó. Un fallo solo se registra en el log: los datos ya
+        se guardaron y el crc hace que se sigan enviando.
+        """
+        asignar: Dict[str, Any] = {}
+        quitar: Dict[str, Any] = {}
+        for clave, valor in (campos or {}).items():
+            if _CLAVE_ANOTABLE.match(clave):
+                asignar[f"{CAMPO_REVISIONES}.campos.{clave}"] = _crc(valor)
+        for clave_grupo, lista in (registros or {}).items():
+            for registro in lista:
+                registro_id = registro.get("_id_registro")
+                if isinstance(registro_id, str) and _CLAVE_ANOTABLE.match(clave_grupo) and _CLAVE_ANOTABLE.match(registro_id):
+                    asignar[f"{CAMPO_REVISIONES}.registros.{clave_grupo}.{registro_id}"] = _crc(registro)
+        for clave_grupo, ids in (eliminados or {}).items():
+            for registro_id in ids:
+                if isinstance(registro_id, str) and _CLAVE_ANOTABLE.match(clave_grupo) and _CLAVE_ANOTABLE.match(registro_id):
+                    quitar[f"{CAMPO_REVISIONES}.registros.{clave_grupo}.{registro_id}"] = ""
+
+        try:
+            coleccion = get_evaluacion_collection()
+            filtro = {"_id": id_consulta(evaluacion_uuid)}
+            documento = await medir_db("revision_datos", resolver(coleccion.find_one_and_update(
+                filtro, {"$inc": {f"{CAMPO_REVISIONES}.rev": 1}},
+                projection={f"{CAMPO_REVISIONES}.rev": 1}, return_document=ReturnDocument.AFTER,
+            )))
+            if documento is None:
+                return None
+            revision = documento[CAMPO_REVISIONES]["rev"]
+            # Otra anotación de los mismos campos puede escribirse entre el $inc y el
+            # $set; si gana la de menor revisión, su crc no coincide con los datos
+            # que quedaron y el valor se sigue enviando hasta volver a anclarse
+            cambios: Dict[str, Any] = {}
+            if asignar:
+                cambios["$set"] = {ruta: [revision, crc] for ruta, crc in asignar.items()}
+            if quitar:
+                cambios["$unset"] = quitar
+            if cambios:
+                await medir_db("anotar_revision", resolver(coleccion.update_one(filtro, cambios)))
+            metricas.incrementar("revisiones.registradas")
+            return revision
+        except Exception as e:
+            logging.error(f"[FORM] No se pudo anotar la revisión de datos de {evaluacion_uuid}: {e}")
+            metricas.incrementar("revisiones.errores")
+            return None
+
+    async def anclar_async(self, evaluacion_uuid: str, sin_anotar: Dict[str, Any]):
+        """Anota los valores que calcular_delta encontró sin anotación vigente (tras responder)."""
+        if sin_anotar:
+            metricas.incrementar("revisiones.anclajes")
+            await self.registrar_async(evaluacion_uuid, campos=sin_anotar.get("campos"),
+                                       registros=sin_anotar.get("registros"))
+
+
+# Instancia única usada por las rutas del formulario
+registro_revisiones = RegistroRevisiones()
@@ -0,0 +1,349 @@
+# en app/core/snapshot_inv_datos.py
+"""
+Snapshot compilado del árbol inv_datos, para arrancar más rápido.
+
+Junta todos los JSON de inv_datos (empresas, secciones, grupos, datos y catálogos)
+en un solo archivo binario versionado que la aplicación mapea en memoria al
+arrancar, en lugar de recorrer y leer el árbol. Cada archivo se parsea solo
+cuando se pide por primera vez.
+
+Formato:
+    MAGIC (4 bytes) | versión (uint16) | largo del índice (uint32) | índice JSON | blobs
+El índice mapea la ruta relativa de cada JSON a [offset, largo, mtime_ns, tamaño].
+
+No es una caché de definiciones entre procesos: cada worker parsea los JSON que
+usa (hasta MAX_MATERIALIZADOS en su LRU) y compila sus propias definiciones en
+maestro_preguntas, así que agregar workers sigue multiplicando esa memoria. Lo
+que ahorra es el arranque: ningún worker recorre ni lee el árbol de archivos.
+Un solo proceso lo compila (bloqueo con flock sobre SNAPSHOT_PATH.lock) y lo
+publica con un rename atómico; cada worker detecta la nueva generación por
+stat del archivo (inodo/mtime) y vuelve a mapearlo, invalidando sus cachés.
+
+Uso (compilar después de modificar inv_datos):
+    python -m app.core.snapshot_inv_datos [--destino RUTA]
+    python -m app.core.snapshot_inv_datos --asegurar    # solo si está desactualizado
+"""
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import INV_DATOS_DATOS_DIR
+from app.core.metricas import metricas
+
+try:
+    import fcntl
+except ImportError:  # fuera de POSIX no hay flock: usar un solo worker o compilar antes de arrancar
+    fcntl = None
+
+MAGIC = b"KINV"
+VERSION_FORMATO = 1
+_CABECERA = struct.Struct("<4sHI")
+
+# Raíz del árbol inv_datos (padre de inv_datos/datos)
+INV_DATOS_DIR = INV_DATOS_DATOS_DIR.parent
+SNAPSHOT_PATH = Path(os.getenv("INV_DATOS_SNAPSHOT", str(INV_DATOS_DIR / "inv_datos.snapshot")))
+# Si es "1", antes de usar un archivo del snapshot se compara su mtime/tamaño con el del disco
+VERIFICAR_FUENTES = os.getenv("INV_DATOS_SNAPSHOT_VERIFICAR", "1") == "1"
+# Si es "1", el primer uso compila el snapshot (bajo bloqueo entre procesos) si falta o está desactualizado
+# (INV_DATOS_SNAPSHOT_COMPARTIDO es el nombre anterior de la variable)
+COMPILAR_AL_ARRANCAR = os.getenv(
+    "INV_DATOS_SNAPSHOT_AUTOCOMPILAR", os.getenv("INV_DATOS_SNAPSHOT_COMPARTIDO", "0")
+) == "1"
+# Cada cuántos segundos, como máximo, se comprueba si se publicó una nueva generación del snapshot
+INTERVALO_GENERACION_SEG = float(os.getenv("INV_DATOS_SNAPSHOT_REVALIDACION_SEG", "2.0"))
+# JSON ya parseados que conserva cada worker (LRU); el resto se vuelve a parsear desde el mmap
+MAX_MATERIALIZADOS = int(os.getenv("INV_DATOS_SNAPSHOT_MEMO", "256"))
+
+
+def compilar_snapshot(raiz: Path = INV_DATOS_DIR, destino: Path = SNAPSHOT_PATH) -> Dict[str, Any]:
+    """
+    Recorre todos los .json bajo 'raiz' y escribe el snapshot en 'destino'.
+    La escritura es atómica (archivo temporal + rename), así que un proceso que
+    esté leyendo el snapshot anterior no se ve afectado.
+    """
+    raiz = Path(raiz)
+    destino = Path(destino)
+    indice = {}
+    omitidos = {}
+    blobs = []
+    offset = 0
+    for ruta in sorted(raiz.rglob("*.json")):
+        if not ruta.is_file():
+            continue
+        contenido = ruta.read_bytes()
+        try:
+            json.loads(contenido)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            logging.error(f"[SNAPSHOT] Se omite {ruta}: JSON inválido ({e})")
+            st = ruta.stat()
+            omitidos[ruta.relative_to(raiz).as_posix()] = [st.st_mtime_ns, st.st_size]
+            continue
+        st = ruta.stat()
+        indice[ruta.relative_to(raiz).as_posix()] = [offset, len(contenido), st.st_mtime_ns, st.st_size]
+        blobs.append(contenido)
+        offset += len(contenido)
+
+    cabecera_json = json.dumps({
+        "version_formato": VERSION_FORMATO,
+        "generado": datetime.now(timezone.utc).isoformat(),
+        "archivos": indice,
+        "omitidos": omitidos,
+    }, ensure_ascii=False).encode("utf-8")
+
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporal = tempfile.mkstemp(dir=destino.parent, prefix=destino.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_CABECERA.pack(MAGIC, VERSION_FORMATO, len(cabecera_json)))
+            f.write(cabecera_json)
+            for blob in blobs:
+                f.write(blob)
+        os.replace(temporal, destino)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.unlink(temporal)
+        raise
+
+    logging.info(f"[SNAPSHOT] {len(indice)} archivos compilados en {destino} ({offset} bytes de datos)")
+    return {"archivos": len(indice), "bytes": offset, "destino": str(destino)}
+
+
+class SnapshotInvDatos:
+    """
+    Snapshot mapeado en memoria. Solo se parsea el índice al abrirlo; cada JSON
+    se materializa la primera vez que se pide y los últimos MAX_MATERIALIZADOS
+    se conservan ya parseados.
+    """
+
+    def __init__(self, ruta: Path, raiz: Path = INV_DATOS_DIR):
+        self.ruta = Path(ruta)
+        self.raiz = Path(raiz)
+        with open(self.ruta, "rb") as f:
+            # Identidad de la generación mapeada: un rename atómico cambia el inodo
+            st = os.fstat(f.fileno())
+            self.identidad = (st.st_ino, st.st_mtime_ns, st.st_size)
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, largo_indice = _CABECERA.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION_FORMATO:
+            self._mmap.close()
+            raise ValueError(f"Snapshot {self.ruta} con formato no soportado ({magic!r}, v{version})")
+        inicio_indice = _CABECERA.size
+        cabecera = json.loads(self._mmap[inicio_indice:inicio_indice + largo_indice])
+        self._base_datos = inicio_indice + largo_indice
+        self._archivos: Dict[str, list] = cabecera["archivos"]
+        self._omitidos: Dict[str, list] = cabecera.get("omitidos", {})
+        self.generado = cabecera.get("generado")
+        self._materializados: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._archivos)
+
+    def _relativa(self, ruta) -> Optional[str]:
+        try:
+            return Path(ruta).relative_to(self.raiz).as_posix()
+        except ValueError:
+            return None
+
+    def contiene(self, ruta) -> bool:
+        relativa = self._relativa(ruta)
+        return relativa is not None and relativa in self._archivos
+
+    def desactualizados(self) -> List[str]:
+        """
+        Rutas relativas que difieren entre el snapshot y el árbol en disco
+        (modificadas, agregadas o eliminadas). Lista vacía si está al día.
+        """
+        en_disco = {}
+        for ruta in self.raiz.rglob("*.json"):
+            if ruta.is_file():
+                st = ruta.stat()
+                en_disco[ruta.relative_to(self.raiz).as_posix()] = (st.st_mtime_ns, st.st_size)
+        compilados = {r: tuple(v[2:4]) for r, v in self._archivos.items()}
+        compilados.update((r, tuple(v)) for r, v in self._omitidos.items())
+        diferentes = [r for r, firma in en_disco.items() if compilados.get(r) != firma]
+        diferentes.extend(r for r in compilados if r not in en_disco)
+        return diferentes
+
+    def obtener(self, ruta) -> Optional[Any]:
+        """
+        Devuelve el JSON ya parseado de 'ruta' si está en el snapshot (y, si se
+        verifica, si el archivo en disco no cambió desde que se compiló).
+        El objeto devuelto puede ser compartido: no debe modificarse.
+        """
+        relativa = self._relativa(ruta)
+        if relativa is None:
+            return None
+        entrada = self._archivos.get(relativa)
+        if entrada is None:
+            return None
+        offset, largo, mtime_ns, tamano = entrada
+        if VERIFICAR_FUENTES:
+            try:
+                st = os.stat(ruta)
+            except OSError:
+                return None
+            if st.st_mtime_ns != mtime_ns or st.st_size != tamano:
+                return None
+        metricas.incrementar("inv_datos.snapshot_aciertos")
+        with self._lock:
+            contenido = self._materializados.get(relativa)
+            if contenido is not None:
+                self._materializados.move_to_end(relativa)
+                return contenido
+        inicio = self._base_datos + offset
+        contenido = json.loads(self._mmap[inicio:inicio + largo])
+        metricas.incrementar("inv_datos.snapshot_materializados")
+        metricas.incrementar("inv_datos.bytes_parseados", largo)
+        if MAX_MATERIALIZADOS > 0:
+            with self._lock:
+                self._materializados[relativa] = contenido
+                while len(self._materializados) > MAX_MATERIALIZADOS:
+                    self._materializados.popitem(last=False)
+        return contenido
+
+    def cerrar(self):
+        self._materializados.clear()
+        self._mmap.close()
+
+
+_snapshot: Optional[SnapshotInvDatos] = None
+_snapshot_intentado = False
+_revisado_en = 0.0
+_lock_snapshot = threading.Lock()
+# Funciones a llamar cuando se mapea una nueva generación (ej: invalidar cachés derivadas)
+_oyentes: List[Callable[[], None]] = []
+
+
+def al_cambiar_generacion(funcion: Callable[[], None]):
+    """Registra una función que se llama cada vez que el worker adopta una nueva generación del snapshot."""
+    _oyentes.append(funcion)
+
+
+def _identidad_publicada() -> Optional[tuple]:
+    try:
+        st = os.stat(SNAPSHOT_PATH)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def asegurar_snapshot(raiz: Path = INV_DATOS_DIR, destino: Path = SNAPSHOT_PATH, forzar: bool = False) -> bool:
+    """
+    Compila el snapshot si no existe, está desactualizado o se fuerza. Usa un bloqueo
+    de archivo, así que si varios workers arrancan a la vez solo uno compila y los
+    demás esperan y usan el resultado. Devuelve True si se compiló una nueva generación.
+    """
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    with open(destino.with_name(destino.name + ".lock"), "a+") as bloqueo:
+        if fcntl is not None:
+            fcntl.flock(bloqueo.fileno(), fcntl.LOCK_EX)
+        try:
+            if not forzar and destino.is_file():
+                try:
+                    existente = SnapshotInvDatos(destino, raiz)
+                    try:
+                        diferentes = existente.desactualizados()
+                    finally:
+                        existente.cerrar()
+                    if not diferentes:
+                        return False
+                    logging.info(f"[SNAPSHOT] {len(diferentes)} archivos cambiaron desde la última compilación")
+                except ValueError as e:
+                    logging.warning(f"[SNAPSHOT] Se recompila {destino}: {e}")
+            compilar_snapshot(raiz, destino)
+            return True
+        finally:
+            if fcntl is not None:
+                fcntl.flock(bloqueo.fileno(), fcntl.LOCK_UN)
+
+
+def _adoptar(nuevo: Optional[SnapshotInvDatos]):
+    global _snapshot
+    anterior = _snapshot
+    _snapshot = nuevo
+    # El mmap anterior no se cierra explícitamente: puede haber lecturas en curso en
+    # otros hilos; se libera cuando deja de estar referenciado
+    if anterior is not None and nuevo is not None:
+        logging.info(f"[SNAPSHOT] Nueva generación mapeada (generado {nuevo.generado})")
+        for funcion in _oyentes:
+            try:
+                funcion()
+            except Exception as e:
+                logging.error(f"[SNAPSHOT] Error notificando el cambio de generación: {e}")
+
+
+def obtener_snapshot() -> Optional[SnapshotInvDatos]:
+    """
+    Snapshot mapeado actual; None si no existe o es inválido. Se abre la primera
+    vez que se necesita y, como máximo cada INTERVALO_GENERACION_SEG, se comprueba
+    si otro proceso publicó una nueva generación para mapearla.
+    """
+    global _snapshot_intentado, _revisado_en
+    ahora = time.monotonic()
+    if _snapshot_intentado and ahora - _revisado_en < INTERVALO_GENERACION_SEG:
+        return _snapshot
+    with _lock_snapshot:
+        if _snapshot_intentado and ahora - _revisado_en < INTERVALO_GENERACION_SEG:
+            return _snapshot
+        if not _snapshot_intentado and COMPILAR_AL_ARRANCAR:
+            try:
+                asegurar_snapshot()
+            except OSError as e:
+                logging.error(f"[SNAPSHOT] No se pudo compilar {SNAPSHOT_PATH}: {e}")
+        _snapshot_intentado = True
+        _revisado_en = ahora
+        identidad = _identidad_publicada()
+        if identidad is None or (_snapshot is not None and _snapshot.identidad == identidad):
+            return _snapshot
+        try:
+            nuevo = SnapshotInvDatos(SNAPSHOT_PATH)
+            logging.info(f"[SNAPSHOT] {len(nuevo)} archivos disponibles desde {SNAPSHOT_PATH} (generado {nuevo.generado})")
+            _adoptar(nuevo)
+        except Exception as e:
+            logging.error(f"[SNAPSHOT] No se pudo abrir {SNAPSHOT_PATH}: {e}")
+    return _snapshot
+
+
+def leer_json(ruta: Path) -> Any:
+    """
+    Lee un JSON de inv_datos: desde el snapshot si está disponible y vigente,
+    si no directamente del disco.
+    """
+    snapshot = obtener_snapshot()
+    if snapshot is not None:
+        contenido = snapshot.obtener(ruta)
+        if contenido is not None:
+            return contenido
+    with open(ruta, 'rb') as f:
+        contenido = f.read()
+    metricas.incrementar("inv_datos.archivos_leidos")
+    metricas.incrementar("inv_datos.bytes_parseados", len(contenido))
+    return json.loads(contenido)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Compila el árbol inv_datos en un snapshot binario.")
+    parser.add_argument("--raiz", default=str(INV_DATOS_DIR), help="Directorio inv_datos a compilar")
+    parser.add_argument("--destino", default=str(SNAPSHOT_PATH), help="Ruta del snapshot a generar")
+    parser.add_argument("--asegurar", action="store_true", help="Compilar solo si falta o está desactualizado")
+    args = parser.parse_args()
+    if args.asegurar:
+        compilado = asegurar_snapshot(Path(args.raiz), Path(args.destino))
+        print(f"Snapshot {'compilado' if compilado else 'ya estaba al día'}: {args.destino}")
+    else:
+        resultado = compilar_snapshot(Path(args.raiz), Path(args.destino))
+        print(f"Snapshot generado: {resultado['destino']} ({resultado['archivos']} archivos, {resultado['bytes']} bytes)")
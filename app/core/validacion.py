@@ -0,0 +1,248 @@
+# en app/core/validacion.py
+"""
+Validación en el servidor de los datos que envía el formulario.
+
+Las reglas salen de las mismas definiciones que se usan para renderizar:
+    - validacion_input == "NUMERICO": el valor debe ser un número (se normaliza,
+      ej: " 1,500 " -> "1500"); 'minimo' / 'maximo' opcionales acotan el rango.
+    - catalogo + acepta_valores_fuera_del_catalogo == "No": el valor debe ser
+      una de las opciones del catálogo (en cualquier idioma).
+Los campos sin regla y los valores vacíos se aceptan tal cual.
+
+Las reglas de cada (empresa, archivo) se compilan una sola vez en un
+ValidadorSeccion y se reutilizan mientras el maestro devuelva el mismo objeto
+de definiciones (que cambia cuando cambian sus archivos fuente). El validador
+solo guarda una referencia débil a ese objeto, para no retener definiciones
+que el maestro ya descartó.
+"""
+
+import asyncio
+import math
+import os
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.catalogos import almacen_catalogos
+from app.core.maestro_preguntas import maestro_preguntas
+from app.core.metricas import metricas
+
+_VACIOS = ("", None)
+# Validadores compilados que se conservan (por sección y por conjunto de secciones)
+MAX_VALIDADORES = int(os.getenv("VALIDACION_MAX_VALIDADORES", "1024"))
+
+
+def _a_numero(valor: Any) -> Optional[float]:
+    if isinstance(valor, bool):
+        return None
+    if isinstance(valor, (int, float)):
+        numero = float(valor)
+    else:
+        try:
+            numero = float(valor)
+        except (TypeError, ValueError):
+            return None
+    return numero if math.isfinite(numero) else None
+
+
+def _no_acepta_otros(valor: Any) -> bool:
+    return isinstance(valor, str) and valor.strip().casefold() == "no"
+
+
+class _Regla:
+    __slots__ = ("clave", "numerico", "minimo", "maximo", "catalogo")
+
+    def __init__(self, clave: str, numerico: bool, minimo: Optional[float], maximo: Optional[float],
+                 catalogo: Optional[str]):
+        self.clave = clave
+        self.numerico = numerico
+        self.minimo = minimo
+        self.maximo = maximo
+        self.catalogo = catalogo
+
+    @classmethod
+    def compilar(cls, pregunta: Dict[str, Any]) -> Optional["_Regla"]:
+        """Regla de una pregunta; None si la pregunta no tiene nada que validar."""
+        clave = pregunta.get("clave")
+        if not clave:
+            return None
+        numerico = pregunta.get("validacion_input") == "NUMERICO"
+        minimo = _a_numero(pregunta.get("minimo")) if pregunta.get("minimo") not in _VACIOS else None
+        maximo = _a_numero(pregunta.get("maximo")) if pregunta.get("maximo") not in _VACIOS else None
+        catalogo = pregunta.get("catalogo")
+        if not (isinstance(catalogo, str) and _no_acepta_otros(pregunta.get("acepta_valores_fuera_del_catalogo"))):
+            catalogo = None
+        if not numerico and minimo is None and maximo is None and catalogo is None:
+            return None
+        return cls(clave, numerico or minimo is not None or maximo is not None, minimo, maximo, catalogo)
+
+    def aplicar(self, valor: Any) -> Tuple[Any, Optional[str]]:
+        """Devuelve (valor normalizado, None) o (valor, mensaje de error)."""
+        if valor in _VACIOS:
+            return valor, None
+        if not isinstance(valor, (str, int, float, bool)):
+            return valor, "Valor con formato inválido."
+
+        if self.numerico:
+            texto = valor.strip().replace(",", "").replace(" ", "") if isinstance(valor, str) else valor
+            numero = _a_numero(texto)
+            if numero is None:
+                return valor, "Debe ser un número."
+            if self.minimo is not None and numero < self.minimo:
+                return valor, f"Debe ser mayor o igual a {self.minimo:g}."
+            if self.maximo is not None and numero > self.maximo:
+                return valor, f"Debe ser menor o igual a {self.maximo:g}."
+            valor = texto
+
+        if self.catalogo is not None:
+            # Un catálogo que no se pudo cargar no bloquea el guardado
+            if almacen_catalogos.contiene(self.catalogo, str(valor).strip()) is False:
+                return valor, "El valor no es una opción del catálogo."
+        return valor, None
+
+
+class ValidadorSeccion:
+    """Reglas compiladas por clave de campo; se aplican a todo el payload de una vez."""
+    __slots__ = ("reglas", "_origen", "partes")
+
+    def __init__(self, reglas: Dict[str, _Regla], origen: Any = None, partes: Tuple["ValidadorSeccion", ...] = ()):
+        self.reglas = reglas
+        # Definiciones a partir de las que se compiló (referencia débil)
+        self._origen = None
+        if origen is not None:
+            try:
+                self._origen = weakref.ref(origen)
+            except TypeError:
+                # Un dict normal no admite referencias débiles
+                self._origen = lambda: origen
+        # Validadores de sección combinados en este
+        self.partes = partes
+
+    def compilado_de(self, definiciones: Any) -> bool:
+        """Si se compiló a partir de este mismo objeto de definiciones."""
+        if self._origen is None:
+            return definiciones is None
+        return self._origen() is definiciones
+
+    @classmethod
+    def compilar(cls, definiciones: Optional[Dict[str, Any]]) -> "ValidadorSeccion":
+        reglas = {}
+        for pregunta in (definiciones or {}).get("datos", ()):
+            regla = _Regla.compilar(pregunta)
+            if regla is not None:
+                reglas[regla.clave] = regla
+        return cls(reglas, definiciones)
+
+    @classmethod
+    def combinar(cls, validadores: List["ValidadorSeccion"]) -> "ValidadorSeccion":
+        reglas = {}
+        for validador in validadores:
+            reglas.update(validador.reglas)
+        return cls(reglas, partes=tuple(validadores))
+
+    def catalogos(self) -> set:
+        return {regla.catalogo for regla in self.reglas.values() if regla.catalogo}
+
+    def validar(self, datos: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """
+        Aplica las reglas a 'datos'. Devuelve (datos normalizados, errores por campo);
+        si hay errores no debe guardarse nada.
+        """
+        if not self.reglas:
+            return datos, {}
+        with metricas.cronometro("validacion.validar"):
+            limpios = dict(datos)
+            errores = {}
+            for clave, valor in datos.items():
+                regla = self.reglas.get(clave)
+                if regla is None:
+                    continue
+                normalizado, error = regla.aplicar(valor)
+                if error is not None:
+                    errores[clave] = error
+                else:
+                    limpios[clave] = normalizado
+        if errores:
+            metricas.incrementar("validacion.rechazos")
+            metricas.incrementar("validacion.campos_rechazados", len(errores))
+        return limpios, errores
+
+
+def _clave_archivo(nombre_archivo: str) -> str:
+    return nombre_archivo if nombre_archivo.endswith(".json") else f"{nombre_archivo}.json"
+
+
+class MotorValidacion:
+    """
+    Caché de validadores compilados por (empresa, archivo) y por conjunto de
+    secciones, cada una con a lo sumo MAX_VALIDADORES entradas (se descartan las
+    menos usadas).
+    """
+
+    def __init__(self, max_validadores: int = MAX_VALIDADORES):
+        self._max = max_validadores
+        self._por_seccion: "OrderedDict[Tuple[str, str], ValidadorSeccion]" = OrderedDict()
+        self._por_guion: "OrderedDict[Tuple[str, Tuple[str, ...]], ValidadorSeccion]" = OrderedDict()
+
+    def _recordar(self, cache: OrderedDict, clave: tuple, validador: ValidadorSeccion):
+        cache[clave] = validador
+        cache.move_to_end(clave)
+        while len(cache) > self._max:
+            cache.popitem(last=False)
+            metricas.incrementar("validacion.descartados")
+
+    async def _seccion(self, nombre_archivo: str, empresa: Optional[str]) -> ValidadorSeccion:
+        definiciones = await maestro_preguntas.obtener_definiciones_async(nombre_archivo, empresa)
+        clave = (empresa or "", _clave_archivo(nombre_archivo))
+        validador = self._por_seccion.get(clave)
+        if validador is None or not validador.compilado_de(definiciones):
+            metricas.incrementar("validacion.compilaciones")
+            validador = ValidadorSeccion.compilar(definiciones)
+        self._recordar(self._por_seccion, clave, validador)
+        return validador
+
+    async def _cargar_catalogos(self, validador: ValidadorSeccion):
+        # Los catálogos se cargan fuera del event loop antes de validar contra ellos
+        await asyncio.gather(*(almacen_catalogos.version_async(c) for c in validador.catalogos()))
+
+    async def validador_seccion_async(self, nombre_archivo: str, empresa: Optional[str]) -> ValidadorSeccion:
+        """Validador de un archivo de sección (ej: los registros de un grupo)."""
+        validador = await self._seccion(nombre_archivo, empresa)
+        await self._cargar_catalogos(validador)
+        return validador
+
+    async def validador_secciones_async(self, nombres_archivo: Iterable[str], empresa: Optional[str]) -> ValidadorSeccion:
+        """Validador con las reglas de varias secciones (los datos planos de toda la entrevista)."""
+        nombres_archivo = tuple(_clave_archivo(n) for n in nombres_archivo)
+        secciones = await asyncio.gather(*(self._seccion(n, empresa) for n in nombres_archivo))
+        clave = (empresa or "", nombres_archivo)
+        validador = self._por_guion.get(clave)
+        if validador is None or len(validador.partes) != len(secciones) or any(
+                a is not b for a, b in zip(validador.partes, secciones)):
+            validador = ValidadorSeccion.combinar(secciones)
+        self._recordar(self._por_guion, clave, validador)
+        await self._cargar_catalogos(validador)
+        return validador
+
+    def invalidar(self, secciones: Optional[Iterable[Tuple[str, str]]] = None) -> int:
+        """
+        Descarta los validadores de las (empresa, archivo) indicadas y los que
+        las combinan (todos si no se indica ninguna). Devuelve cuántos descartó.
+        """
+        if secciones is None:
+            descartados = len(self._por_seccion) + len(self._por_guion)
+            self._por_seccion.clear()
+            self._por_guion.clear()
+            return descartados
+        secciones = {(empresa or "", _clave_archivo(archivo)) for empresa, archivo in secciones}
+        claves = [c for c in self._por_seccion if c in secciones]
+        claves_guion = [c for c in self._por_guion if any((c[0], archivo) in secciones for archivo in c[1])]
+        for clave in claves:
+            del self._por_seccion[clave]
+        for clave in claves_guion:
+            del self._por_guion[clave]
+        return len(claves) + len(claves_guion)
+
+
+# Instancia única usada por las rutas del formulario
+motor_validacion = MotorValidacion()
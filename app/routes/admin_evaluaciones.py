@@ -0,0 +1,249 @@
+# app/routes/admin_evaluaciones.py
+"""
+API del listado de evaluaciones del panel de administración.
+
+- El listado se pagina por keyset sobre (fecha_creacion, _id) descendente: cada
+  página trae un cursor opaco para pedir la siguiente, sin skip, así que el
+  costo no crece con el tamaño de la colección. El cursor guarda el tipo BSON
+  de fecha_creacion: las evaluaciones con la fecha como texto o sin fecha
+  también se alcanzan, en el mismo orden entre tipos que usa MongoDB al ordenar.
+- Solo se proyectan los campos que muestra la lista.
+- Filtros en el servidor por empresa (empresa_gestion) y estado (pendiente,
+  en_curso, terminada).
+- La conversación y los archivos de la evaluación seleccionada se piden aparte,
+  cuando el administrador abre su pestaña.
+
+Se monta en /admin/api junto al resto de rutas de administración y con la misma
+dependencia de sesión de administrador.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.core.consultas_db import id_consulta, resolver
+from app.database import get_evaluacion_collection
+
+admin_evaluaciones_router = APIRouter()
+
+MAX_POR_PAGINA = 200
+# Campos que muestra cada elemento de la lista
+CAMPOS_LISTADO = (
+    "nombre_candidato", "apellidos_candidato", "puesto", "tipo_estudio", "empresa_gestion",
+    "fecha_creacion", "fechahora_inicio", "fechahora_termino",
+)
+# Campo de la evaluación con el historial de la conversación (lista de {rol, contenido, timestamp})
+CAMPO_CONVERSACION = "conversation_log"
+# Metadatos con los que se guardan en GridFS los archivos adjuntos de una evaluación
+CAMPO_ARCHIVO_EVALUACION = "metadata.evaluacion_id"
+CAMPO_ARCHIVO_GRUPO = "metadata.grupo"
+
+_FILTROS_ESTADO = {
+    "pendiente": {"fechahora_inicio": None, "fechahora_termino": None},
+    "en_curso": {"fechahora_inicio": {"$ne": None}, "fechahora_termino": None},
+    "terminada": {"fechahora_termino": {"$ne": None}},
+}
+_ORDEN = [("fecha_creacion", -1), ("_id", -1)]
+# Tipos posibles de fecha_creacion y de _id en el orden descendente del listado
+# (MongoDB ordena primero por tipo: fecha > texto > número > nulo/ausente, ObjectId > texto)
+_TIPOS_FECHA = ("fecha", "texto", "numero", "nulo")
+_TIPOS_ID = ("objectid", "texto")
+_TIPO_BSON = {"fecha": "date", "texto": "string", "numero": "number", "objectid": "objectId"}
+
+
+async def _a_lista(cursor, limite: int) -> List[Dict[str, Any]]:
+    """Materializa un cursor de Motor (async) o de PyMongo (en un hilo, para no bloquear el event loop)."""
+    if asyncio.iscoroutinefunction(getattr(cursor, "to_list", None)):
+        return await cursor.to_list(length=limite)
+    return await asyncio.to_thread(lambda: list(cursor.limit(limite)))
+
+
+def _tipo_fecha(fecha: Any) -> str:
+    if isinstance(fecha, datetime):
+        return "fecha"
+    if isinstance(fecha, str):
+        return "texto"
+    if isinstance(fecha, (int, float)) and not isinstance(fecha, bool):
+        return "numero"
+    return "nulo"
+
+
+def _codificar_cursor(documento: Dict[str, Any]) -> str:
+    fecha = documento.get("fecha_creacion")
+    tipo = _tipo_fecha(fecha)
+    _id = documento["_id"]
+    datos = {
+        "t": tipo,
+        "f": fecha.isoformat() if tipo == "fecha" else (None if tipo == "nulo" else fecha),
+        "i": str(_id),
+        "o": isinstance(_id, ObjectId),
+    }
+    return base64.urlsafe_b64encode(json.dumps(datos).encode("utf-8")).decode("ascii")
+
+
+def _posteriores(campo: str, tipo: str, valor: Any, tipos: tuple) -> List[Dict[str, Any]]:
+    """Condiciones para que 'campo' quede estrictamente después de 'valor' en orden descendente."""
+    # $lt solo compara valores del mismo tipo; los tipos menores se piden aparte
+    condiciones = [] if tipo == "nulo" else [{campo: {"$lt": valor}}]
+    for menor in tipos[tipos.index(tipo) + 1:]:
+        condiciones.append({campo: None} if menor == "nulo" else {campo: {"$type": _TIPO_BSON[menor]}})
+    return condiciones
+
+
+def _filtro_despues_de(cursor: str) -> Dict[str, Any]:
+    """Filtro keyset: documentos estrictamente después (en el orden del listado) del cursor."""
+    datos = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    if not isinstance(datos, dict) or datos.get("t") not in _TIPOS_FECHA or not isinstance(datos.get("i"), str):
+        raise ValueError("Cursor con formato desconocido")
+    tipo, fecha = datos["t"], datos.get("f")
+    if tipo == "fecha":
+        fecha = datetime.fromisoformat(fecha)
+    elif tipo == "texto" and not isinstance(fecha, str):
+        raise ValueError("Cursor con fecha inválida")
+    elif tipo == "numero" and (not isinstance(fecha, (int, float)) or isinstance(fecha, bool)):
+        raise ValueError("Cursor con fecha inválida")
+    elif tipo == "nulo":
+        fecha = None
+    tipo_id = "objectid" if datos.get("o") else "texto"
+    _id = ObjectId(datos["i"]) if tipo_id == "objectid" else datos["i"]
+    # {campo: None} también coincide con los documentos sin el campo, que se ordenan como nulos
+    return {"$or": _posteriores("fecha_creacion", tipo, fecha, _TIPOS_FECHA) + [
+        {"fecha_creacion": fecha, "$or": _posteriores("_id", tipo_id, _id, _TIPOS_ID)},
+    ]}
+
+
+def _estado_evaluacion(documento: Dict[str, Any]) -> str:
+    if documento.get("fechahora_termino"):
+        return "terminada"
+    if documento.get("fechahora_inicio"):
+        return "en_curso"
+    return "pendiente"
+
+
+def _elemento_listado(documento: Dict[str, Any]) -> Dict[str, Any]:
+    elemento = {"id": str(documento["_id"]), "estado": _estado_evaluacion(documento)}
+    for campo in CAMPOS_LISTADO:
+        elemento[campo] = documento.get(campo)
+    return jsonable_encoder(elemento)
+
+
+async def asegurar_indices():
+    """Índices que usa el listado; se llama una vez al arrancar la aplicación."""
+    coleccion = get_evaluacion_collection()
+    await resolver(coleccion.create_index(_ORDEN, name="listado_fecha_id"))
+    await resolver(coleccion.create_index([("empresa_gestion", 1)] + _ORDEN, name="listado_empresa_fecha_id"))
+
+
+@admin_evaluaciones_router.get("/evaluaciones")
+async def listar_evaluaciones(
+    empresa: Optional[str] = None,
+    estado: Optional[str] = None,
+    despues: Optional[str] = None,
+    limite: int = 50,
+    ):
+    """
+    Una página del listado de evaluaciones, de la más reciente a la más antigua.
+    'despues' es el cursor 'siguiente' devuelto por la página anterior.
+    """
+    if estado and estado not in _FILTROS_ESTADO:
+        return JSONResponse(status_code=400, content={"success": False, "message": "Estado inválido."})
+    limite = max(1, min(limite, MAX_POR_PAGINA))
+
+    condiciones = []
+    if empresa:
+        condiciones.append({"empresa_gestion": empresa})
+    if estado:
+        condiciones.append(_FILTROS_ESTADO[estado])
+    if despues:
+        try:
+            condiciones.append(_filtro_despues_de(despues))
+        except (ValueError, KeyError, InvalidId, TypeError):
+            return JSONResponse(status_code=400, content={"success": False, "message": "Cursor inválido."})
+    filtro = {"$and": condiciones} if len(condiciones) > 1 else (condiciones[0] if condiciones else {})
+
+    coleccion = get_evaluacion_collection()
+    cursor = coleccion.find(filtro, {campo: 1 for campo in CAMPOS_LISTADO}).sort(_ORDEN)
+    # Se pide uno de más para saber si hay otra página
+    documentos = await _a_lista(cursor, limite + 1)
+    hay_mas = len(documentos) > limite
+    documentos = documentos[:limite]
+
+    return {
+        "success": True,
+        "evaluaciones": [_elemento_listado(d) for d in documentos],
+        "siguiente": _codificar_cursor(documentos[-1]) if hay_mas else None,
+    }
+
+
+@admin_evaluaciones_router.get("/evaluaciones/{evaluacion_id}/conversacion")
+async def obtener_conversacion(evaluacion_id: str, desde: int = 0, limite: int = 500):
+    """Mensajes de la conversación de una evaluación (solo ese campo, en tramos de 'limite')."""
+    limite = max(1, min(limite, 2000))
+    coleccion = get_evaluacion_collection()
+    documento = await resolver(coleccion.find_one(
+        {"_id": id_consulta(evaluacion_id)},
+        {"_id": 1, CAMPO_CONVERSACION: {"$slice": [max(0, desde), limite]}},
+    ))
+    if documento is None:
+        return JSONResponse(status_code=404, content={"success": False, "message": "Evaluación no encontrada."})
+
+    mensajes = []
+    for mensaje in documento.get(CAMPO_CONVERSACION) or []:
+        if not isinstance(mensaje, dict) or "rol" not in mensaje or "contenido" not in mensaje:
+            continue
+        contenido = mensaje["contenido"]
+        elemento = {"rol": mensaje["rol"], "timestamp": mensaje.get("timestamp")}
+        if isinstance(contenido, str) and contenido.startswith("fs://"):
+            partes = contenido[len("fs://"):].split("/", 1)
+            elemento["archivo"] = partes[1] if len(partes) > 1 else "archivo"
+        else:
+            elemento["contenido"] = contenido
+        mensajes.append(elemento)
+
+    return jsonable_encoder({
+        "success": True,
+        "mensajes": mensajes,
+        "siguiente": desde + limite if len(documento.get(CAMPO_CONVERSACION) or []) == limite else None,
+    })
+
+
+@admin_evaluaciones_router.get("/evaluaciones/{evaluacion_id}/archivos")
+async def obtener_archivos(evaluacion_id: str):
+    """Archivos adjuntos de una evaluación (solo metadatos de GridFS), agrupados por sección."""
+    coleccion = get_evaluacion_collection()
+    archivos_gridfs = coleccion.database["fs.files"]
+    cursor = archivos_gridfs.find(
+        {CAMPO_ARCHIVO_EVALUACION: evaluacion_id},
+        {"filename": 1, "length": 1, "uploadDate": 1, CAMPO_ARCHIVO_GRUPO: 1},
+    ).sort([("uploadDate", 1)])
+    try:
+        documentos = await _a_lista(cursor, 10000)
+    except Exception as e:
+        logging.error(f"[ADMIN] No se pudieron listar los archivos de {evaluacion_id}: {e}")
+        return JSONResponse(status_code=500, content={"success": False, "message": "No se pudieron listar los archivos."})
+
+    grupos: Dict[str, List[Dict[str, Any]]] = {}
+    campo_grupo = CAMPO_ARCHIVO_GRUPO.split(".", 1)[1]
+    for documento in documentos:
+        grupo = (documento.get("metadata") or {}).get(campo_grupo) or "otros"
+        grupos.setdefault(grupo, []).append({
+            "id": str(documento["_id"]),
+            "name": documento.get("filename"),
+            "tamano": documento.get("length"),
+            "fecha": documento.get("uploadDate"),
+        })
+
+    return jsonable_encoder({
+        "success": True,
+        "total": len(documentos),
+        "grupos": [{"key": clave, "files": archivos} for clave, archivos in grupos.items()],
+    })
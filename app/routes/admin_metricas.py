@@ -0,0 +1,45 @@
+# app/routes/admin_metricas.py
+"""
+Métricas del pipeline del formulario para el panel de administración.
+
+    GET /metricas/formulario            -> contadores, tiempos y estado de las cachés
+    GET /metricas/formulario?memoria=1  -> además, el tamaño en memoria de las definiciones
+
+Expone datos de todas las empresas y evaluaciones, así que no cuelga de /form:
+se monta en /admin/api junto al resto de rutas de administración y con la misma
+dependencia de sesión de administrador.
+"""
+
+import asyncio
+
+from fastapi import APIRouter
+
+from app.core.maestro_preguntas import maestro_preguntas
+from app.core.codigos_postales import almacen_codigos_postales
+from app.core.reportes_pdf import gestor_reportes_pdf
+from app.core.cargas_archivos import gestor_cargas
+from app.core.cache_estado import cache_estado
+from app.core.metricas import metricas
+
+admin_metricas_router = APIRouter()
+
+
+@admin_metricas_router.get("/metricas/formulario")
+async def get_metricas(memoria: bool = False):
+    """
+    Contadores y tiempos por fase del pipeline del formulario (caché de definiciones,
+    lectura de inv_datos, catálogos, render y llamadas a BD por petición), más la
+    ocupación de la caché de definiciones por empresa, el estado del índice de códigos postales,
+    los trabajos de reportes PDF, las cargas de archivos en curso y la caché de estados.
+    Con ?memoria=1 incluye el tamaño en memoria de la caché de definiciones.
+    """
+    instantanea = metricas.instantanea()
+    instantanea["cache_definiciones"] = maestro_preguntas.estadisticas_cache()
+    instantanea["codigos_postales"] = almacen_codigos_postales.estadisticas()
+    instantanea["reportes_pdf"] = gestor_reportes_pdf.estadisticas()
+    instantanea["cargas_archivos"] = gestor_cargas.estadisticas()
+    instantanea["cache_estado"] = cache_estado.estadisticas()
+    if memoria:
+        # Recorre y descongela toda la caché de definiciones: fuera del event loop
+        instantanea["memoria_definiciones"] = await asyncio.to_thread(maestro_preguntas.reporte_memoria)
+    return instantanea
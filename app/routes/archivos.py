@@ -0,0 +1,187 @@
+# app/routes/archivos.py
+"""
+Carga reanudable de los archivos del candidato (sección de documentos: AR_01
+identificación frente, AR_02 reverso, AR_03 comprobante de domicilio...).
+
+    POST /archivos                          -> declara el archivo {seccion, clave, nombre, tamano, sha256, tipo}
+    GET  /archivos/cargas/{carga}           -> bytes recibidos (para reanudar)
+    PUT  /archivos/cargas/{carga}?desde=N   -> fragmento crudo a partir del byte N
+    GET  /archivos/miniaturas/{archivo_id}  -> miniatura JPEG (si ya se generó)
+
+Al completarse, el archivo se guarda en GridFS con los mismos metadatos que
+lista el panel de administración (evaluacion_id y grupo = sección), y el campo
+queda con la referencia "fs://{id}/{nombre}".
+Se monta en /form, con la misma dependencia de candidato que el formulario.
+"""
+
+import asyncio
+import logging
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import FileResponse, JSONResponse
+from gridfs import GridFSBucket
+
+from app.core import gestor_estado
+from app.core.cargas_archivos import (
+    gestor_cargas, ruta_miniatura, Carga, CargaInvalida, CargaOcupada, DesfaseCarga, TAMANO_FRAGMENTO,
+)
+from app.core.cache_formulario import secciones_entrevista
+from app.core.consultas_db import resolver
+from app.core.maestro_preguntas import maestro_preguntas
+from app.core.metricas import medir_db
+from app.core.revisiones_datos import registro_revisiones
+from app.database import get_evaluacion_collection
+from .consent import get_current_candidate
+
+archivos_router = APIRouter()
+
+
+def _error(status: int, mensaje: str, **extra) -> JSONResponse:
+    return JSONResponse(status_code=status, content={"success": False, "message": mensaje, **extra})
+
+
+async def _archivo_existente(evaluacion_uuid: str, clave: str, sha256: str):
+    """Archivo ya guardado en GridFS con el mismo contenido para este campo, o None."""
+    archivos_gridfs = get_evaluacion_collection().database["fs.files"]
+    return await resolver(archivos_gridfs.find_one(
+        {"metadata.evaluacion_id": evaluacion_uuid, "metadata.clave": clave, "metadata.sha256": sha256},
+        {"_id": 1, "filename": 1},
+    ))
+
+
+def _subir_a_gridfs(base, carga: Carga, metadata: dict) -> str:
+    # Motor envuelve la base de PyMongo en 'delegate'; la subida usa siempre el cliente síncrono
+    bucket = GridFSBucket(getattr(base, "delegate", base))
+    with open(carga.ruta, "rb") as origen:
+        return str(bucket.upload_from_stream(carga.nombre, origen, metadata=metadata))
+
+
+async def _guardar_en_gridfs(carga: Carga, sha256: str) -> str:
+    """
+    Sube el archivo ya completo a GridFS. Todo se hace en un hilo: la lectura por
+    bloques del disco y las escrituras de los chunks a Mongo.
+    """
+    metadata = {
+        "evaluacion_id": carga.evaluacion_uuid, "grupo": carga.seccion, "clave": carga.clave,
+        "sha256": sha256, "contentType": carga.tipo,
+    }
+    return await asyncio.to_thread(_subir_a_gridfs, get_evaluacion_collection().database, carga, metadata)
+
+
+async def _registrar_campo(evaluacion_uuid: str, clave: str, archivo_id: str, nombre: str) -> str:
+    valor = f"fs://{archivo_id}/{nombre}"
+    await medir_db("guardar_datos_entrevista", gestor_estado.guardar_datos_entrevista_async(evaluacion_uuid, clave, valor))
+    # La revisión se anota una vez escrito el campo
+    await registro_revisiones.registrar_async(evaluacion_uuid, campos={clave: valor})
+    return valor
+
+
+@archivos_router.post("/archivos")
+async def declarar_archivo(request: Request, candidate_data: dict = Depends(get_current_candidate)):
+    """
+    Declara un archivo a cargar en un campo de tipo ARCHIVO. Responde con la
+    carga y cuántos bytes ya tiene (0, o lo recibido antes de un corte), o con el
+    archivo ya guardado si el mismo contenido ya se había cargado para ese campo.
+    El sha256 es opcional (ver cargas_archivos): sin él no se puede reutilizar un
+    archivo ya guardado antes de recibirlo.
+    """
+    evaluacion_uuid = str(candidate_data["_id"])
+    datos = await request.json()
+    if not isinstance(datos, dict):
+        return _error(400, "Formato de datos inválido.")
+    seccion, clave = str(datos.get("seccion") or ""), str(datos.get("clave") or "")
+
+    # El campo debe ser de una sección del guion del candidato
+    archivos = {s["archivo"].replace(".json", "") for s in secciones_entrevista(candidate_data.get("guion_secciones", []))}
+    if seccion.replace(".json", "") not in archivos:
+        return _error(400, "Sección inválida.")
+    preguntas = await maestro_preguntas.obtener_preguntas_async(seccion, candidate_data.get("empresa_gestion"))
+    if not any(p.get("clave") == clave and p.get("tipo") == "ARCHIVO" for p in preguntas):
+        return _error(400, "Campo inválido.")
+
+    try:
+        carga = gestor_cargas.declarar(evaluacion_uuid, seccion.replace(".json", ""), clave, datos.get("nombre"),
+                                       datos.get("tamano"), datos.get("sha256"), datos.get("tipo"))
+    except CargaInvalida as e:
+        return _error(400, str(e))
+
+    if carga.sha256 is not None:
+        existente = await _archivo_existente(evaluacion_uuid, clave, carga.sha256)
+        if existente is not None:
+            gestor_cargas.descartar(carga)
+            valor = await _registrar_campo(evaluacion_uuid, clave, str(existente["_id"]), existente.get("filename") or carga.nombre)
+            return {"success": True, "completa": True, "archivo_id": str(existente["_id"]), "valor": valor}
+
+    return {
+        "success": True, "completa": False, "carga_id": carga.id,
+        "recibido": carga.recibido, "tamano": carga.tamano, "tamano_fragmento": TAMANO_FRAGMENTO,
+    }
+
+
+@archivos_router.get("/archivos/cargas/{carga_id}")
+async def estado_carga(carga_id: str, candidate_data: dict = Depends(get_current_candidate)):
+    carga = gestor_cargas.obtener(str(candidate_data["_id"]), carga_id)
+    if carga is None:
+        return _error(404, "Carga no encontrada.")
+    return {"success": True, "carga_id": carga.id, "recibido": carga.recibido, "tamano": carga.tamano}
+
+
+@archivos_router.put("/archivos/cargas/{carga_id}")
+async def recibir_fragmento(request: Request, carga_id: str, desde: int,
+                            candidate_data: dict = Depends(get_current_candidate)):
+    """
+    Recibe un fragmento (cuerpo crudo) que empieza en el byte 'desde'. Con el
+    último, verifica el sha256, guarda el archivo y registra el campo.
+    """
+    evaluacion_uuid = str(candidate_data["_id"])
+    carga = gestor_cargas.obtener(evaluacion_uuid, carga_id)
+    if carga is None:
+        return _error(404, "Carga no encontrada.")
+
+    try:
+        async with gestor_cargas.bloqueo(carga):
+            recibido = await gestor_cargas.recibir(carga, desde, request.stream())
+            if recibido < carga.tamano:
+                return {"success": True, "completa": False, "recibido": recibido}
+
+            sha256 = await gestor_cargas.verificar(carga)
+            existente = await _archivo_existente(evaluacion_uuid, carga.clave, sha256)
+            if existente is not None:
+                archivo_id = str(existente["_id"])
+            else:
+                archivo_id = await _guardar_en_gridfs(carga, sha256)
+            valor = await _registrar_campo(evaluacion_uuid, carga.clave, archivo_id, carga.nombre)
+            miniatura = gestor_cargas.terminar(carga, archivo_id)
+    except DesfaseCarga as e:
+        return _error(409, str(e), recibido=e.recibido)
+    except CargaOcupada:
+        return _error(409, "La carga ya está recibiendo otro fragmento.", recibido=carga.recibido)
+    except CargaInvalida as e:
+        return _error(400, str(e), recibido=carga.recibido)
+    except Exception as e:
+        logging.error(f"[ARCHIVOS] Error guardando {carga.nombre} de {evaluacion_uuid}: {e}")
+        return _error(500, "No se pudo guardar el archivo.", recibido=carga.recibido)
+
+    return {
+        "success": True, "completa": True, "recibido": carga.tamano,
+        "archivo_id": archivo_id, "valor": valor, "miniatura": miniatura,
+    }
+
+
+@archivos_router.get("/archivos/miniaturas/{archivo_id}")
+async def obtener_miniatura(archivo_id: str, candidate_data: dict = Depends(get_current_candidate)):
+    ruta = ruta_miniatura(archivo_id)
+    if ruta is None or not ruta.is_file():
+        return _error(404, "Miniatura no disponible.")
+    # Solo las miniaturas de los archivos del propio candidato
+    try:
+        filtro = {"_id": ObjectId(archivo_id), "metadata.evaluacion_id": str(candidate_data["_id"])}
+    except (InvalidId, TypeError):
+        return _error(404, "Miniatura no disponible.")
+    if await resolver(get_evaluacion_collection().database["fs.files"].find_one(filtro, {"_id": 1})) is None:
+        return _error(404, "Miniatura no disponible.")
+    # Un archivo guardado nunca cambia
+    return FileResponse(ruta, media_type="image/jpeg",
+                        headers={"Cache-Control": "private, max-age=31536000, immutable"})
@@ -1,203 +1,341 @@
 # app/routes/form.py
 
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, Optional
+
 from fastapi import APIRouter, Depends, Request
-from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from bson import ObjectId
 
 # Importaciones de tu aplicación
 from app.core import gestor_estado
 from app.core.maestro_preguntas import maestro_preguntas
-from app.core.cargador_recursos import cargar_seccion_entrevista
+from app.core.catalogos import almacen_catalogos
+from app.core.codigos_postales import almacen_codigos_postales
+from app.core.cache_estado import cache_estado
+from app.core.revisiones_datos import registro_revisiones, calcular_delta, token_revision, leer_token
+from app.core.validacion import motor_validacion
+from app.core.invalidacion_inv_datos import vigilante_inv_datos
+from app.core.metricas import metricas, medir_db, iniciar_peticion, finalizar_peticion
+from app.core.cache_formulario import (
+    cache_formulario, calcular_etag, etag_coincide, acepta_gzip, extraer_nombre_por_idioma, secciones_entrevista,
+    MIN_BYTES_GZIP,
+)
 from app.database import get_evaluacion_collection
 from .consent import get_current_candidate # Reutilizamos la dependencia de consentimiento
 
-form_router = APIRouter()
+async def _medir_peticion(request: Request):
+    """Dependencia común: mide cada petición y cuenta sus llamadas a BD."""
+    iniciar_peticion()
+    inicio = time.perf_counter()
+    yield
+    ruta = getattr(request.scope.get("route"), "path", request.url.path)
+    metricas.registrar_tiempo(f"peticion.{ruta}", time.perf_counter() - inicio)
+    finalizar_peticion(ruta)
+
+form_router = APIRouter(dependencies=[Depends(_medir_peticion)])
+# Las ediciones de inv_datos (panel de administración u otro worker) invalidan las cachés del formulario
+form_router.add_event_handler("startup", vigilante_inv_datos.iniciar)
+form_router.add_event_handler("shutdown", vigilante_inv_datos.detener)
+
+# Máximo de operaciones aceptadas en una sola petición a /save_group_batch
+MAX_OPERACIONES_LOTE = int(os.getenv("FORM_MAX_OPERACIONES_LOTE", "200"))
+_CLAVE_GRUPO_VALIDA = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# En app/routes/form.py
+
+async def _cargar_datos_guardados(evaluacion_uuid: str) -> Dict[str, Any]:
+    """Datos de entrevista y de grupos del candidato, leídos a la vez."""
+    datos_entrevista, datos_grupo = await asyncio.gather(
+        medir_db("cargar_datos_entrevista", gestor_estado.cargar_datos_entrevista_async(evaluacion_uuid)),
+        medir_db("cargar_datos_grupo", gestor_estado.cargar_datos_grupo_async(evaluacion_uuid)),
+    )
+    return jsonable_encoder({"entrevista": datos_entrevista, "grupos": datos_grupo})
+
+async def _obtener_idioma(evaluacion_uuid: str) -> str:
+    return await cache_estado.obtener_idioma_async(evaluacion_uuid)
 
-def extraer_nombre_por_idioma(nombre_obj, idioma: str = "ESP") -> str:
+async def _cargar_revisiones_y_datos(evaluacion_uuid: str):
     """
-    Extrae el nombre en el idioma especificado desde un objeto multiidioma.
-    Si el nombre es un string, lo devuelve tal cual.
+    Revisiones anotadas y datos guardados del candidato. Las revisiones se leen
+    primero: una revisión se publica después de escribir sus datos, así que lo
+    que cubre ya está en los datos leídos a continuación.
     """
-    if isinstance(nombre_obj, str):
-        return nombre_obj
-    if isinstance(nombre_obj, dict):
-        # Intentar obtener el idioma solicitado, con fallback a ESP
-        texto = nombre_obj.get(idioma.upper())
-        if not texto:
-            texto = nombre_obj.get("ESP")
-        if not texto:
-            # Si no hay ESP, tomar el primer valor disponible
-            texto = next(iter(nombre_obj.values()), None) if nombre_obj else None
-        return texto if texto else ""
-    return ""
+    revisiones = await registro_revisiones.leer_async(evaluacion_uuid)
+    return revisiones, await _cargar_datos_guardados(evaluacion_uuid)
 
-# En app/routes/form.py
+def _datos_de_seccion(seccion: Dict[str, Any], datos_guardados: Dict[str, Any]) -> Dict[str, Any]:
+    """Solo los datos guardados que pertenecen a una sección (mismo formato que en /form/data)."""
+    if seccion["naturaleza"] == "grupo":
+        clave_grupo = seccion["key"].replace(".json", "")
+        return {"entrevista": {}, "grupos": {clave_grupo: (datos_guardados.get("grupos") or {}).get(clave_grupo, [])}}
+    entrevista = datos_guardados.get("entrevista") or {}
+    claves = {p.get("clave") for p in seccion["preguntas"]}
+    return {"entrevista": {c: v for c, v in entrevista.items() if c in claves}, "grupos": {}}
 
 @form_router.get("/data")
-async def get_form_data(candidate_data: dict = Depends(get_current_candidate)):
+async def get_form_data(
+    request: Request,
+    stream: bool = False,
+    datos: bool = True,
+    since: Optional[str] = None,
+    candidate_data: dict = Depends(get_current_candidate)
+    ):
+    """
+    Devuelve las secciones del formulario (renderizadas y cacheadas por empresa,
+    guion e idioma) junto con los datos guardados del candidato y su 'revision'.
+    Responde 304 si el navegador ya tiene exactamente esta versión (ETag).
+    Con ?stream=1 responde NDJSON y envía cada sección en cuanto está lista
+    (con &datos=0, sin datos guardados).
+    Con ?since=<revision> responde solo los datos guardados que cambiaron desde
+    esa revisión, sin secciones (ver _form_data_delta).
+    """
     evaluacion_uuid = str(candidate_data["_id"])
     guion_secciones = candidate_data.get("guion_secciones", [])
-    
-    # Obtener el idioma del estado del usuario
-    estado_actual = await gestor_estado.obtener_estado_async(evaluacion_uuid)
-    idioma = estado_actual.get("idioma", "ESP")
-    
-    secciones_ordenadas = []
-    for seccion_info in guion_secciones:
-        # --- LÓGICA DE FILTRADO ---
-        # Solo procesamos las secciones que son de tipo 'entrevista'
-        if seccion_info.get("tipo") == "entrevista":
-            nombre_archivo = seccion_info.get("archivo")
-            if not nombre_archivo: continue
-            
-            # Obtener la empresa desde la evaluación
-            empresa = candidate_data.get("empresa_gestion")
-            preguntas = maestro_preguntas.obtener_preguntas(nombre_archivo, empresa)
-            
-            # Cargar el JSON completo de la sección para extraer nombre_corto
-            import logging
-            from app.config import get_empresa_secciones_dir, INV_DATOS_SECCIONES_DIR
-            from pathlib import Path
-            import json
-            
-            # Normalizar el nombre del archivo
-            nombre_archivo_normalizado = nombre_archivo
-            if not nombre_archivo_normalizado.endswith('.json'):
-                nombre_archivo_normalizado = f"{nombre_archivo_normalizado}.json"
-            
-            logging.info(f"[FORM] Cargando sección: archivo original='{nombre_archivo}', normalizado='{nombre_archivo_normalizado}', empresa='{empresa}'")
-            
-            # Intentar cargar el JSON directamente
-            seccion_json = None
-            secciones_dir = get_empresa_secciones_dir(empresa) if empresa else INV_DATOS_SECCIONES_DIR
-            archivo_path = secciones_dir / nombre_archivo_normalizado
-            
-            logging.info(f"[FORM] Buscando archivo en: {archivo_path}")
-            
-            if archivo_path.exists():
-                try:
-                    with open(archivo_path, 'r', encoding='utf-8') as f:
-                        seccion_json = json.load(f)
-                    logging.info(f"[FORM] Archivo cargado exitosamente desde: {archivo_path}")
-                except Exception as e:
-                    logging.error(f"[FORM] Error al cargar archivo {archivo_path}: {e}")
-            else:
-                logging.warning(f"[FORM] Archivo no encontrado en: {archivo_path}")
-                # Intentar con cargar_seccion_entrevista como fallback
-                seccion_json = cargar_seccion_entrevista(nombre_archivo, empresa)
-                if seccion_json:
-                    logging.info(f"[FORM] Archivo cargado usando cargar_seccion_entrevista")
-                else:
-                    logging.warning(f"[FORM] No se pudo cargar el archivo ni con cargar_seccion_entrevista")
-            
-            # Extraer nombre_corto del JSON
-            nombre_seccion = nombre_archivo.replace('.json', '').replace('_', ' ').capitalize()  # Fallback
-            if seccion_json and isinstance(seccion_json, dict):
-                logging.info(f"[FORM] Estructura del JSON: claves={list(seccion_json.keys())}")
-                # El JSON tiene estructura: {"ClaveSeccion": {"nombre_corto": {...}, "grupo_datos": [...]}}
-                nombre_corto_obj = None
-                
-                # Buscar nombre_corto en la estructura anidada
-                for key, value in seccion_json.items():
-                    logging.info(f"[FORM] Revisando clave '{key}': tipo={type(value)}, es dict={isinstance(value, dict)}")
-                    if isinstance(value, dict):
-                        logging.info(f"[FORM] Claves dentro de '{key}': {list(value.keys())}")
-                        if "nombre_corto" in value:
-                            nombre_corto_obj = value.get("nombre_corto")
-                            logging.info(f"[FORM] Encontrado nombre_corto en clave '{key}': {nombre_corto_obj}")
-                            break
-                        else:
-                            logging.info(f"[FORM] No hay 'nombre_corto' en la clave '{key}'")
-                
-                # Si encontramos nombre_corto, extraerlo según el idioma
-                if nombre_corto_obj:
-                    nombre_seccion = extraer_nombre_por_idioma(nombre_corto_obj, idioma)
-                    logging.info(f"[FORM] Nombre de sección extraído: '{nombre_seccion}' (idioma: {idioma})")
-                else:
-                    logging.warning(f"[FORM] No se encontró nombre_corto en el JSON para {nombre_archivo}. Estructura completa: {list(seccion_json.keys())}")
-            else:
-                logging.warning(f"[FORM] No se pudo cargar el JSON o no es un dict para {nombre_archivo}, tipo: {type(seccion_json)}")
-            
-            logging.info(f"[FORM] Nombre final de sección: '{nombre_seccion}'")
-            
-            # Pre-procesamos las preguntas para el botón de catálogo y nombres
-            logging.info(f"[FORM] Procesando {len(preguntas)} preguntas para sección {nombre_archivo}")
-            for pregunta in preguntas:
-                # Convertir el nombre multiidioma a string según el idioma del usuario
-                if "nombre" in pregunta:
-                    pregunta["nombre"] = extraer_nombre_por_idioma(pregunta["nombre"], idioma)
-                
-                # Debug: verificar si el campo tiene validacion_input
-                clave_pregunta = pregunta.get('clave', 'SIN_CLAVE')
-                validacion = pregunta.get("validacion_input")
-                if validacion == "NUMERICO":
-                    logging.info(f"[FORM] Campo numérico detectado en backend: {clave_pregunta} - {pregunta.get('nombre')}")
-                elif clave_pregunta in ['201', '203', '205', '220', '221', '222', '223']:
-                    # Estos campos DEBERÍAN ser numéricos según los JSON
-                    logging.warning(f"[FORM] Campo {clave_pregunta} debería ser numérico pero validacion_input={validacion}. Propiedades: {list(pregunta.keys())}")
-                
-                # Pre-procesar catálogo si existe
-                if pregunta.get("tipo") == "CATÁLOGO":
-                    catalogo_ref = pregunta.get("catalogo")
-                    if catalogo_ref:
-                        # Cargar el catálogo desde el archivo JSON
-                        from app.config import INV_DATOS_CATALOGOS_DIR
-                        import json
-                        catalogo_path = INV_DATOS_CATALOGOS_DIR / f"{catalogo_ref}.json"
-                        if catalogo_path.exists():
-                            try:
-                                with open(catalogo_path, 'r', encoding='utf-8') as f:
-                                    catalogo_data = json.load(f)
-                                    # Extraer los valores según el idioma del usuario
-                                    opciones_catalogo = []
-                                    if "items" in catalogo_data:
-                                        for item in catalogo_data["items"]:
-                                            valor_obj = item.get("valor", {})
-                                            if isinstance(valor_obj, dict):
-                                                # Obtener el valor en el idioma del usuario
-                                                valor_texto = valor_obj.get(idioma.upper()) or valor_obj.get("ESP") or str(valor_obj)
-                                            else:
-                                                valor_texto = str(valor_obj)
-                                            opciones_catalogo.append(valor_texto)
-                                    pregunta["catalogo"] = opciones_catalogo
-                            except Exception as e:
-                                print(f"[ERROR] No se pudo cargar el catálogo '{catalogo_ref}': {e}")
-                                pregunta["catalogo"] = []
-                        else:
-                            print(f"[WARNING] No se encontró el archivo de catálogo: {catalogo_path}")
-                            pregunta["catalogo"] = []
-
-            secciones_ordenadas.append({
-                "key": nombre_archivo,
-                "nombre": nombre_seccion,
-                "naturaleza": seccion_info.get("naturaleza", "dato_plano"),
-                "preguntas": preguntas
-            })
-
-    datos_entrevista = await gestor_estado.cargar_datos_entrevista_async(evaluacion_uuid)
-    datos_grupo = await gestor_estado.cargar_datos_grupo_async(evaluacion_uuid)
-    
-    return {
-        "success": True,
-        "secciones": secciones_ordenadas, # Enviamos la lista ya filtrada
-        "datos_guardados": {
-            "entrevista": datos_entrevista,
-            "grupos": datos_grupo
-        }
-    }
+    empresa = candidate_data.get("empresa_gestion")
+
+    if since is not None:
+        return await _form_data_delta(evaluacion_uuid, since)
+
+    if stream:
+        return StreamingResponse(
+            _form_data_ndjson(evaluacion_uuid, empresa, guion_secciones, datos),
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "private, no-store"}
+        )
+
+    async def secciones_en_idioma():
+        # Obtener el idioma del estado del usuario y con él las secciones de tipo
+        # 'entrevista' ya renderizadas (solo lectura, no se modifican aquí)
+        idioma = await _obtener_idioma(evaluacion_uuid)
+        return await cache_formulario.obtener_payload_async(empresa, guion_secciones, idioma)
+
+    # Estado + render y las lecturas de datos guardados son independientes: se
+    # lanzan a la vez y la latencia es la de la rama más lenta, no la suma
+    payload, (revisiones, datos_guardados) = await asyncio.gather(
+        secciones_en_idioma(),
+        _cargar_revisiones_y_datos(evaluacion_uuid),
+    )
+    revision, _, sin_anotar = calcular_delta(revisiones, datos_guardados)
+    revision = token_revision(evaluacion_uuid, revision)
+
+    etag = calcular_etag(f"{payload.etag}:{revision}", datos_guardados)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    anclar = BackgroundTask(registro_revisiones.anclar_async, evaluacion_uuid, sin_anotar) if sin_anotar else None
+    if etag_coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers, background=anclar)
+
+    # {"success", "idioma", "secciones", "datos_guardados"}: las secciones van ya
+    # serializadas (y comprimidas) desde la caché; solo se codifican los datos guardados
+    cuerpo = payload.cuerpo_form_data()
+    if acepta_gzip(request.headers.get("accept-encoding")) and len(cuerpo.prefijo) >= MIN_BYTES_GZIP:
+        headers["Content-Encoding"] = "gzip"
+        contenido = cuerpo.cuerpo_gzip(datos_guardados, revision=revision)
+    else:
+        contenido = cuerpo.cuerpo(datos_guardados, revision=revision)
+    return Response(content=contenido, media_type="application/json", headers=headers, background=anclar)
+
+async def _form_data_delta(evaluacion_uuid: str, since: str) -> JSONResponse:
+    """
+    Cuerpo de /form/data?since=<revision>: {"success", "revision", "delta", "datos_guardados"}.
+    Con "delta": true, datos_guardados trae solo los campos y registros cambiados
+    (ver revisiones_datos.calcular_delta); si la revisión no es utilizable (otra
+    evaluación, anotaciones reiniciadas) se envían completos con "delta": false.
+    """
+    revisiones, datos_guardados = await _cargar_revisiones_y_datos(evaluacion_uuid)
+    revision, delta, sin_anotar = calcular_delta(revisiones, datos_guardados, leer_token(evaluacion_uuid, since))
+    metricas.incrementar("form_data.delta" if delta is not None else "form_data.delta_completo")
+    return JSONResponse(
+        content={
+            "success": True,
+            "revision": token_revision(evaluacion_uuid, revision),
+            "delta": delta is not None,
+            "datos_guardados": delta if delta is not None else datos_guardados
+        },
+        headers={"Cache-Control": "private, no-store"},
+        background=BackgroundTask(registro_revisiones.anclar_async, evaluacion_uuid, sin_anotar) if sin_anotar else None
+    )
+
+def _linea_ndjson(mensaje: Dict[str, Any]) -> bytes:
+    return (json.dumps(mensaje, ensure_ascii=False) + "\n").encode("utf-8")
+
+async def _form_data_ndjson(evaluacion_uuid: str, empresa: Optional[str], guion_secciones: list, con_datos: bool = True):
+    """
+    Cuerpo de /form/data?stream=1. Mensajes, uno por línea:
+      {"tipo": "indice", "idioma", "secciones": [{key, nombre, naturaleza}]}
+      {"tipo": "seccion", "posicion", "seccion", "datos_guardados"}   (en orden de llegada)
+      {"tipo": "fin", "total", "revision"}  o  {"tipo": "error", "message"}
+    Sin datos (con_datos=False) las secciones no traen datos_guardados ni el fin
+    la revisión: el navegador ya los tiene y los sincroniza con ?since=.
+    """
+    datos_tarea = asyncio.ensure_future(_cargar_revisiones_y_datos(evaluacion_uuid)) if con_datos else None
+    try:
+        idioma = await _obtener_idioma(evaluacion_uuid)
+        indice = await cache_formulario.obtener_indice_async(empresa, guion_secciones, idioma)
+        yield _linea_ndjson({"tipo": "indice", "idioma": idioma, "secciones": indice})
+
+        total = 0
+        datos_guardados = None
+        async for posicion, seccion in cache_formulario.secciones_conforme_listas(empresa, guion_secciones, idioma):
+            mensaje = {"tipo": "seccion", "posicion": posicion, "seccion": seccion}
+            if con_datos:
+                if datos_guardados is None:
+                    revisiones, datos_guardados = await datos_tarea
+                mensaje["datos_guardados"] = _datos_de_seccion(seccion, datos_guardados)
+            yield _linea_ndjson(mensaje)
+            total += 1
+        fin = {"tipo": "fin", "total": total}
+        if con_datos:
+            if datos_guardados is None:
+                revisiones, datos_guardados = await datos_tarea
+            revision, _, sin_anotar = calcular_delta(revisiones, datos_guardados)
+            fin["revision"] = token_revision(evaluacion_uuid, revision)
+        yield _linea_ndjson(fin)
+        if con_datos and sin_anotar:
+            await registro_revisiones.anclar_async(evaluacion_uuid, sin_anotar)
+    except Exception as e:
+        logging.error(f"[FORM] Error enviando el formulario por secciones ({evaluacion_uuid}): {e}")
+        yield _linea_ndjson({"tipo": "error", "message": "Error al cargar los datos del formulario."})
+    finally:
+        if datos_tarea is not None and not datos_tarea.done():
+            datos_tarea.cancel()
+
+@form_router.get("/outline")
+async def get_form_outline(candidate_data: dict = Depends(get_current_candidate)):
+    """
+    Índice del formulario (key, nombre y naturaleza de cada sección) sin preguntas
+    ni datos guardados, para mostrar la navegación antes de cargar las secciones.
+    """
+    evaluacion_uuid = str(candidate_data["_id"])
+    idioma = await _obtener_idioma(evaluacion_uuid)
+    indice = await cache_formulario.obtener_indice_async(
+        candidate_data.get("empresa_gestion"), candidate_data.get("guion_secciones", []), idioma
+    )
+    return {"success": True, "idioma": idioma, "secciones": indice}
+
+@form_router.get("/section/{key}")
+async def get_form_section(request: Request, key: str, candidate_data: dict = Depends(get_current_candidate)):
+    """
+    Una sección del formulario (preguntas renderizadas) con solo sus datos guardados.
+    'key' es el 'archivo' de la sección en el guion, con o sin '.json'. Soporta ETag/304.
+    """
+    evaluacion_uuid = str(candidate_data["_id"])
+    empresa = candidate_data.get("empresa_gestion")
+    key_normalizada = key.replace(".json", "")
+    seccion_info = next(
+        (s for s in secciones_entrevista(candidate_data.get("guion_secciones", []))
+         if s["archivo"].replace(".json", "") == key_normalizada),
+        None
+    )
+    if seccion_info is None:
+        return JSONResponse(status_code=404, content={"success": False, "message": "Sección no encontrada."})
+
+    async def seccion_en_idioma():
+        idioma = await _obtener_idioma(evaluacion_uuid)
+        return idioma, await cache_formulario.obtener_seccion_async(empresa, seccion_info, idioma)
+
+    (idioma, payload), datos_guardados = await asyncio.gather(
+        seccion_en_idioma(),
+        _cargar_datos_guardados(evaluacion_uuid),
+    )
+    seccion = payload.secciones[0]
+    datos_seccion = _datos_de_seccion(seccion, datos_guardados)
+
+    etag = calcular_etag(payload.etag, datos_seccion)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    return JSONResponse(
+        content={
+            "success": True,
+            "idioma": idioma,
+            "seccion": seccion,
+            "datos_guardados": datos_seccion
+        },
+        headers=headers
+    )
+
+def _respuesta_invalida(errores: Dict[str, str]) -> JSONResponse:
+    """422 con el error de cada campo rechazado por la validación del servidor."""
+    return JSONResponse(status_code=422, content={
+        "success": False, "message": "Algunos campos tienen valores inválidos.", "errores": errores
+    })
+
+def _campos_modificados(datos_actuales: Dict[str, Any], datos_nuevos: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Devuelve solo los campos cuyo valor difiere del guardado.
+    Un campo vacío que nunca se guardó no cuenta como cambio.
+    """
+    cambios = {}
+    for clave, valor in datos_nuevos.items():
+        if clave in datos_actuales:
+            if datos_actuales[clave] == valor:
+                continue
+        elif valor in ("", None):
+            continue
+        cambios[clave] = valor
+    return cambios
 
 @form_router.post("/save_section")
 async def save_form_section(request: Request, candidate_data: dict = Depends(get_current_candidate)):
     """
     Recibe y guarda los datos de una sección de la entrevista (no de grupo).
+    Valida los campos con las reglas de sus definiciones (422 con los errores por
+    campo si alguno no las cumple), solo escribe los que cambiaron respecto al
+    estado guardado y devuelve cuántos se escribieron.
+    gestor_estado solo escribe campo a campo, así que la sección no se guarda de
+    forma atómica: si una escritura falla, los campos anteriores quedan guardados.
     """
     evaluacion_uuid = str(candidate_data["_id"])
     datos_a_guardar = await request.json()
-    
-    for clave, valor in datos_a_guardar.items():
-        await gestor_estado.guardar_datos_entrevista_async(evaluacion_uuid, clave, valor)
-    
-    return {"success": True, "message": "Sección guardada correctamente."}
+    if not isinstance(datos_a_guardar, dict):
+        return JSONResponse(status_code=400, content={"success": False, "message": "Formato de datos inválido."})
+
+    if datos_a_guardar:
+        archivos = [s["archivo"] for s in secciones_entrevista(candidate_data.get("guion_secciones", []))
+                    if s.get("naturaleza") != "grupo"]
+        validador = await motor_validacion.validador_secciones_async(archivos, candidate_data.get("empresa_gestion"))
+        datos_a_guardar, errores = validador.validar(datos_a_guardar)
+        if errores:
+            return _respuesta_invalida(errores)
+
+    cambios = {}
+    if datos_a_guardar:
+        datos_actuales = await medir_db("cargar_datos_entrevista", gestor_estado.cargar_datos_entrevista_async(evaluacion_uuid)) or {}
+        cambios = _campos_modificados(datos_actuales, datos_a_guardar)
+
+    # Una escritura tras otra: cada una actualiza el documento de la evaluación y,
+    # lanzadas a la vez, una podía pisar lo que escribió otra
+    escritos = {}
+    try:
+        for clave, valor in cambios.items():
+            await medir_db("guardar_datos_entrevista", gestor_estado.guardar_datos_entrevista_async(evaluacion_uuid, clave, valor))
+            escritos[clave] = valor
+    except Exception as e:
+        logging.error(f"[FORM] Error al guardar la sección de {evaluacion_uuid}: {e}")
+        return JSONResponse(status_code=500, content={
+            "success": False, "message": "No se pudieron guardar todos los campos.", "campos_guardados": len(escritos)
+        })
+    finally:
+        # Una sola revisión con lo que llegó a escribirse, aunque la sección quedara a medias
+        if escritos:
+            await registro_revisiones.registrar_async(evaluacion_uuid, campos=escritos)
+
+    return {
+        "success": True,
+        "message": "Sección guardada correctamente.",
+        "campos_guardados": len(cambios),
+        "campos_sin_cambios": len(datos_a_guardar) - len(cambios)
+    }
 
 
 @form_router.post("/save_group_item/{clave_grupo}")
@@ -207,16 +345,186 @@ async def save_group_item(
     candidate_data: dict = Depends(get_current_candidate)
     ):
     """
-    Recibe y guarda un nuevo item en una sección de grupo.
+    Recibe y guarda un nuevo item en una sección de grupo, validado con las
+    reglas de la sección del grupo (422 con los errores por campo).
     """
     evaluacion_uuid = str(candidate_data["_id"])
+    if not _CLAVE_GRUPO_VALIDA.match(clave_grupo):
+        return JSONResponse(status_code=400, content={"success": False, "message": "Clave de grupo inválida."})
     item_a_guardar = await request.json()
-    
+    if not isinstance(item_a_guardar, dict):
+        return JSONResponse(status_code=400, content={"success": False, "message": "Formato de datos inválido."})
+
+    validador = await motor_validacion.validador_seccion_async(clave_grupo, candidate_data.get("empresa_gestion"))
+    item_a_guardar, errores = validador.validar(item_a_guardar)
+    if errores:
+        return _respuesta_invalida(errores)
+
     # Se asegura de llamar a la función correcta
-    await gestor_estado.guardar_datos_grupo_async(evaluacion_uuid, clave_grupo, item_a_guardar)
+    await medir_db("guardar_datos_grupo", gestor_estado.guardar_datos_grupo_async(evaluacion_uuid, clave_grupo, item_a_guardar))
+    # La revisión se anota una vez escrito el registro
+    await registro_revisiones.registrar_async(evaluacion_uuid, registros={clave_grupo: [item_a_guardar]})
     
     return {"success": True, "message": "Registro añadido correctamente."}
 
+def _version_registro(registro: Optional[Dict[str, Any]]) -> int:
+    """Versión de un registro de grupo; los guardados sin versión cuentan como 0."""
+    if not registro:
+        return 0
+    try:
+        return int(registro.get("_version") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def _preparar_lote_grupo(registros_actuales: list, operaciones: list, validador=None):
+    """
+    Valida las operaciones de un lote contra los registros guardados del grupo.
+    Devuelve (resultados por operación, escrituras, hay_errores).
+    Cada operación es {"accion": "guardar", "registro": {...}, "version": n} o
+    {"accion": "eliminar", "registro_id": "...", "version": n}; 'version' es
+    opcional y, si viene, debe coincidir con la guardada (concurrencia optimista).
+    """
+    actuales = {r.get("_id_registro"): r for r in registros_actuales if r.get("_id_registro")}
+    resultados = []
+    escrituras = []
+    vistos = set()
+    hay_errores = False
+
+    for indice, operacion in enumerate(operaciones):
+        accion = operacion.get("accion") if isinstance(operacion, dict) else None
+        if accion == "guardar":
+            registro = operacion.get("registro")
+            registro_id = registro.get("_id_registro") if isinstance(registro, dict) else None
+        elif accion == "eliminar":
+            registro = None
+            registro_id = operacion.get("registro_id")
+        else:
+            registro = registro_id = None
+        resultado = {"indice": indice, "accion": accion, "registro_id": registro_id}
+        resultados.append(resultado)
+
+        if accion not in ("guardar", "eliminar") or not registro_id or not isinstance(registro_id, str):
+            resultado.update(estado="invalido", message="Operación sin accion válida o sin registro_id.")
+            hay_errores = True
+            continue
+        if registro_id in vistos:
+            resultado.update(estado="invalido", message="El registro aparece más de una vez en el lote.")
+            hay_errores = True
+            continue
+        vistos.add(registro_id)
+
+        if accion == "guardar" and validador is not None:
+            registro, errores = validador.validar(registro)
+            if errores:
+                resultado.update(estado="invalido", errores=errores, message="Algunos campos tienen valores inválidos.")
+                hay_errores = True
+                continue
+
+        existente = actuales.get(registro_id)
+        version_actual = _version_registro(existente)
+        esperada = operacion.get("version")
+        if esperada is not None and esperada != version_actual:
+            resultado.update(estado="conflicto", version=version_actual,
+                             message="El registro fue modificado por otra petición.")
+            hay_errores = True
+            continue
+
+        if accion == "guardar":
+            nuevo = {**registro, "_version": version_actual + 1}
+            escrituras.append(("guardar", nuevo))
+            resultado.update(estado="guardado", version=nuevo["_version"])
+        elif existente is None:
+            resultado.update(estado="sin_cambios", version=0)
+        else:
+            escrituras.append(("eliminar", registro_id))
+            resultado.update(estado="eliminado")
+
+    return resultados, escrituras, hay_errores
+
+@form_router.post("/save_group_batch/{clave_grupo}")
+async def save_group_batch(
+    request: Request,
+    clave_grupo: str,
+    candidate_data: dict = Depends(get_current_candidate)
+    ):
+    """
+    Aplica en una sola petición varias altas, modificaciones y bajas de registros
+    de un grupo ({"operaciones": [...]}) y devuelve el resultado de cada una.
+    Todo el lote se valida antes de escribir (incluidas las reglas de los campos):
+    si alguna operación tiene conflicto de versión no se escribe nada y se
+    responde 409 (422 si solo hay operaciones inválidas).
+    Las escrituras no son atómicas: gestor_estado solo escribe registro a
+    registro, así que el lote se aplica uno tras otro y las versiones se
+    comprueban contra la lectura previa. Si una escritura falla, las anteriores
+    quedan aplicadas (y anotadas) y se responde 500 con el estado de cada una.
+    """
+    evaluacion_uuid = str(candidate_data["_id"])
+    if not _CLAVE_GRUPO_VALIDA.match(clave_grupo):
+        return JSONResponse(status_code=400, content={"success": False, "message": "Clave de grupo inválida."})
+    data = await request.json()
+    operaciones = data.get("operaciones") if isinstance(data, dict) else None
+    if not isinstance(operaciones, list) or not operaciones:
+        return JSONResponse(status_code=400, content={"success": False, "message": "Faltan las operaciones."})
+    if len(operaciones) > MAX_OPERACIONES_LOTE:
+        return JSONResponse(status_code=413, content={
+            "success": False, "message": f"El lote supera el máximo de {MAX_OPERACIONES_LOTE} operaciones."
+        })
+
+    validador, grupos = await asyncio.gather(
+        motor_validacion.validador_seccion_async(clave_grupo, candidate_data.get("empresa_gestion")),
+        medir_db("cargar_datos_grupo", gestor_estado.cargar_datos_grupo_async(evaluacion_uuid)),
+    )
+    resultados, escrituras, hay_errores = _preparar_lote_grupo(
+        (grupos or {}).get(clave_grupo) or [], operaciones, validador
+    )
+    if hay_errores:
+        # 409 si hay conflictos de versión; si solo hay datos inválidos, 422
+        codigo = 409 if any(r["estado"] == "conflicto" for r in resultados) else 422
+        return _lote_no_aplicado(codigo, resultados, "El lote no se aplicó.")
+
+    # Una escritura tras otra, como en save_section: lanzadas a la vez, una podía
+    # pisar lo que escribió otra en el documento de la evaluación
+    aplicados = [r for r in resultados if r["estado"] in ("guardado", "eliminado")]
+    escritas = []
+    fallo = None
+    for resultado, (accion, valor) in zip(aplicados, escrituras):
+        try:
+            if accion == "guardar":
+                await medir_db("guardar_datos_grupo", gestor_estado.guardar_datos_grupo_async(evaluacion_uuid, clave_grupo, valor))
+            else:
+                await medir_db("eliminar_datos_grupo", gestor_estado.eliminar_datos_grupo_async(evaluacion_uuid, clave_grupo, valor))
+        except Exception as e:
+            logging.error(f"[FORM] Error en lote de {clave_grupo} ({resultado['registro_id']}): {e}")
+            resultado.update(estado="error", message="No se pudo escribir el registro.")
+            resultado.pop("version", None)
+            fallo = resultado
+            break
+        escritas.append((accion, valor))
+
+    # Lo escrito se anota aunque el lote se haya interrumpido
+    if escritas:
+        await registro_revisiones.registrar_async(
+            evaluacion_uuid,
+            registros={clave_grupo: [valor for accion, valor in escritas if accion == "guardar"]},
+            eliminados={clave_grupo: [valor for accion, valor in escritas if accion == "eliminar"]},
+        )
+    if fallo is not None:
+        for resultado in aplicados[len(escritas) + 1:]:
+            resultado["estado"] = "no_aplicado"
+            resultado.pop("version", None)
+        return JSONResponse(status_code=500, content={
+            "success": False, "message": "Algunos registros no se guardaron.", "resultados": resultados
+        })
+    return {"success": True, "message": "Registros actualizados correctamente.", "resultados": resultados}
+
+def _lote_no_aplicado(codigo: int, resultados: list, mensaje: str) -> JSONResponse:
+    for resultado in resultados:
+        if resultado["estado"] in ("guardado", "eliminado"):
+            # Válida, pero no se escribió porque el lote no se aplicó
+            resultado["estado"] = "no_aplicado"
+            resultado.pop("version", None)
+    return JSONResponse(status_code=codigo, content={"success": False, "message": mensaje, "resultados": resultados})
+
 @form_router.post("/delete_group_item/{clave_grupo}")
 async def delete_group_item(
     request: Request,
@@ -232,8 +540,11 @@ async def delete_group_item(
 
     if not registro_id:
         return JSONResponse(status_code=400, content={"success": False, "message": "Falta el registro_id."})
+    if not _CLAVE_GRUPO_VALIDA.match(clave_grupo):
+        return JSONResponse(status_code=400, content={"success": False, "message": "Clave de grupo inválida."})
 
-    await gestor_estado.eliminar_datos_grupo_async(evaluacion_uuid, clave_grupo, registro_id)
+    await medir_db("eliminar_datos_grupo", gestor_estado.eliminar_datos_grupo_async(evaluacion_uuid, clave_grupo, registro_id))
+    await registro_revisiones.registrar_async(evaluacion_uuid, eliminados={clave_grupo: [registro_id]})
     
     return {"success": True, "message": "Registro eliminado correctamente."}
 
@@ -243,20 +554,92 @@ async def mark_form_as_visited(
     candidate_data: dict = Depends(get_current_candidate)
     ):
     """
-    Marca en el estado del usuario que ha visitado el formulario.
+    Marca en el estado del usuario que ha visitado el formulario (no escribe
+    nada si ya estaba marcado).
     """
     evaluacion_uuid = str(candidate_data["_id"])
-    estado_actual = await gestor_estado.obtener_estado_async(evaluacion_uuid)
-    
-    # Añadimos la nueva bandera
-    estado_actual["ha_visitado_formulario"] = True
-    
-    await gestor_estado.guardar_estado_async(evaluacion_uuid, estado_actual)
-    
+    await cache_estado.actualizar_async(evaluacion_uuid, {"ha_visitado_formulario": True})
     return {"success": True}
 
-# Aquí podrías añadir la ruta para los catálogos si es necesario
-# @form_router.get("/catalogo/{clave_catalogo}")
-# async def get_catalogo_data(clave_catalogo: str):
-#     # Lógica para leer un JSON de catálogo y devolverlo
-#     ...
\ No newline at end of file
+@form_router.get("/catalogo/{clave_catalogo}")
+async def get_catalogo_data(
+    request: Request,
+    clave_catalogo: str,
+    q: Optional[str] = None,
+    idioma: Optional[str] = None,
+    limite: int = 50,
+    candidate_data: dict = Depends(get_current_candidate)
+    ):
+    """
+    Devuelve las opciones de un catálogo en el idioma del candidato.
+    Con 'q' hace búsqueda por prefijo (máximo 'limite' resultados).
+    Se usa para los catálogos grandes que no se incluyen en /form/data.
+    """
+    if not almacen_catalogos.clave_valida(clave_catalogo):
+        return JSONResponse(status_code=404, content={"success": False, "message": "Catálogo no encontrado."})
+    # La primera carga del catálogo se hace fuera del event loop
+    version = await almacen_catalogos.version_async(clave_catalogo)
+    if version is None:
+        return JSONResponse(status_code=404, content={"success": False, "message": "Catálogo no encontrado."})
+
+    if not idioma:
+        idioma = await _obtener_idioma(str(candidate_data["_id"]))
+    idioma = idioma.upper()
+    limite = max(1, min(limite, 500))
+
+    etag = f'"{version}-{idioma}-{limite}-{hashlib.sha1((q or "").encode("utf-8")).hexdigest()[:12]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=300"}
+    if etag_coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    opciones = almacen_catalogos.obtener_opciones(clave_catalogo, idioma)
+    if q:
+        resultado = almacen_catalogos.buscar(clave_catalogo, idioma, q, limite)
+    else:
+        resultado = list(opciones)
+
+    return JSONResponse(
+        content={
+            "success": True,
+            "clave": clave_catalogo,
+            "total": len(opciones),
+            "opciones": resultado
+        },
+        headers=headers
+    )
+
+@form_router.get("/codigo_postal/{cp}")
+async def get_codigo_postal(request: Request, cp: str, candidate_data: dict = Depends(get_current_candidate)):
+    """
+    Estado, municipio, ciudad y colonias de un código postal, para completar
+    el domicilio en cuanto el candidato escribe los 5 dígitos.
+    """
+    if not cp.isdigit() or len(cp) > 5:
+        return JSONResponse(status_code=400, content={"success": False, "message": "Código postal inválido."})
+    if await almacen_codigos_postales.indice_async() is None:
+        return JSONResponse(status_code=503, content={"success": False, "message": "Códigos postales no disponibles."})
+
+    etag = f'"cp-{almacen_codigos_postales.version()}-{cp}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=3600"}
+    if etag_coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    datos = almacen_codigos_postales.consultar(cp)
+    if datos is None:
+        return JSONResponse(status_code=404, content={"success": False, "message": "Código postal no encontrado."})
+    return JSONResponse(content={"success": True, **datos}, headers=headers)
+
+@form_router.get("/codigos_postales")
+async def buscar_codigos_postales(
+    q: str,
+    limite: int = 10,
+    candidate_data: dict = Depends(get_current_candidate)
+    ):
+    """
+    Autocompletado del domicilio: con dígitos busca CPs por prefijo, con texto
+    busca colonias cuyo nombre (o alguna de sus palabras) empieza con 'q'.
+    """
+    if await almacen_codigos_postales.indice_async() is None:
+        return JSONResponse(status_code=503, content={"success": False, "message": "Códigos postales no disponibles."})
+    limite = max(1, min(limite, 50))
+    return {"success": True, "resultados": almacen_codigos_postales.buscar(q, limite)}
@@ -0,0 +1,105 @@
+# app/routes/reportes.py
+"""
+Reporte PDF de una evaluación, generado en segundo plano.
+
+    POST /evaluaciones/{uuid}/pdf                      -> encola (o reutiliza) el trabajo
+    GET  /evaluaciones/{uuid}/pdf/trabajos/{trabajo}   -> estado del trabajo
+    GET  /evaluaciones/{uuid}/pdf/{trabajo}            -> el PDF ya generado (archivo estático)
+
+El id del trabajo es la huella de los datos de la evaluación, así que la URL de
+descarga no cambia mientras los datos no cambien y se puede cachear.
+Se monta en /api. Cada ruta exige la sesión del candidato (get_current_candidate,
+como el formulario) y solo sirve los reportes de su propia evaluación.
+"""
+
+import asyncio
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse
+
+from app.core import gestor_estado
+from app.core.cache_estado import cache_estado
+from app.core.metricas import medir_db
+from app.core.reportes_pdf import gestor_reportes_pdf, ruta_reporte, ColaLlena, LISTO, ERROR
+from .consent import get_current_candidate
+
+reportes_router = APIRouter()
+
+# Campos de control del estado que el reporte no muestra: no entran en los datos
+# ni en la huella, así que registrarlos no obliga a regenerar el PDF
+# ('revisiones_datos' solo en estados escritos antes de que las revisiones
+# pasaran al documento de la evaluación)
+CAMPOS_ESTADO_SIN_REPORTE = ("revisiones_datos", "ha_visitado_formulario")
+
+
+async def _datos_reporte(evaluacion_uuid: str) -> Dict[str, Any]:
+    """Lo que muestra el reporte: estado de la evaluación y datos capturados."""
+    estado, datos_entrevista, datos_grupo = await asyncio.gather(
+        cache_estado.obtener_async(evaluacion_uuid),
+        medir_db("cargar_datos_entrevista", gestor_estado.cargar_datos_entrevista_async(evaluacion_uuid)),
+        medir_db("cargar_datos_grupo", gestor_estado.cargar_datos_grupo_async(evaluacion_uuid)),
+    )
+    estado = {clave: valor for clave, valor in estado.items() if clave not in CAMPOS_ESTADO_SIN_REPORTE}
+    return jsonable_encoder({"estado": estado, "entrevista": datos_entrevista, "grupos": datos_grupo})
+
+
+def _respuesta_trabajo(evaluacion_uuid: str, trabajo) -> JSONResponse:
+    contenido = {"success": trabajo.estado != ERROR, **trabajo.a_dict()}
+    if trabajo.estado == LISTO:
+        contenido["url"] = f"api/evaluaciones/{evaluacion_uuid}/pdf/{trabajo.id}"
+        return JSONResponse(status_code=200, content=contenido)
+    if trabajo.estado == ERROR:
+        return JSONResponse(status_code=500, content=contenido)
+    return JSONResponse(status_code=202, content=contenido)
+
+
+def _ajena(candidate_data: dict, evaluacion_uuid: str) -> bool:
+    return str(candidate_data["_id"]) != evaluacion_uuid
+
+
+def _no_encontrado(mensaje: str) -> JSONResponse:
+    return JSONResponse(status_code=404, content={"success": False, "message": mensaje})
+
+
+@reportes_router.post("/evaluaciones/{evaluacion_uuid}/pdf")
+async def solicitar_pdf(evaluacion_uuid: str, candidate_data: dict = Depends(get_current_candidate)):
+    """Encola la generación del reporte; si ya existe para los datos actuales, responde listo."""
+    # Otra evaluación responde igual que una inexistente
+    if _ajena(candidate_data, evaluacion_uuid):
+        return _no_encontrado("Evaluación no encontrada.")
+    datos = await _datos_reporte(evaluacion_uuid)
+    try:
+        trabajo = gestor_reportes_pdf.solicitar(evaluacion_uuid, datos)
+    except ColaLlena:
+        return JSONResponse(
+            status_code=503,
+            content={"success": False, "message": "Hay demasiados reportes en generación; intenta en unos segundos."},
+            headers={"Retry-After": "5"},
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "message": str(e)})
+    return _respuesta_trabajo(evaluacion_uuid, trabajo)
+
+
+@reportes_router.get("/evaluaciones/{evaluacion_uuid}/pdf/trabajos/{trabajo_id}")
+async def estado_pdf(evaluacion_uuid: str, trabajo_id: str, candidate_data: dict = Depends(get_current_candidate)):
+    trabajo = None if _ajena(candidate_data, evaluacion_uuid) else gestor_reportes_pdf.consultar(evaluacion_uuid, trabajo_id)
+    if trabajo is None:
+        return _no_encontrado("Trabajo no encontrado.")
+    return _respuesta_trabajo(evaluacion_uuid, trabajo)
+
+
+@reportes_router.get("/evaluaciones/{evaluacion_uuid}/pdf/{trabajo_id}")
+async def descargar_pdf(evaluacion_uuid: str, trabajo_id: str, candidate_data: dict = Depends(get_current_candidate)):
+    ruta = None if _ajena(candidate_data, evaluacion_uuid) else ruta_reporte(evaluacion_uuid, trabajo_id)
+    if ruta is None or not ruta.is_file():
+        return _no_encontrado("Reporte no encontrado.")
+    # El contenido de una huella nunca cambia
+    return FileResponse(
+        ruta,
+        media_type="application/pdf",
+        filename=f"Reporte_{evaluacion_uuid[:8]}.pdf",
+        headers={"Cache-Control": "private, max-age=31536000, immutable"},
+    )
@@ -0,0 +1,280 @@
+# benchmarks/bench_formulario.py
+"""
+Benchmarks de carga de definiciones (MaestroDePreguntas) y del payload completo
+del formulario (cache_formulario y GET /form/data) sobre un árbol inv_datos sintético.
+
+Para cada escenario reporta latencia en frío (cachés vacías) y en caliente,
+bloques de memoria asignados, memoria retenida y pico de memoria (tracemalloc).
+Los tiempos se miden sin tracemalloc; la memoria en una corrida aparte.
+
+Uso:
+    python benchmarks/bench_formulario.py --empresas 5 --secciones 20 --campos 40 --catalogo-grande 50000
+    python benchmarks/bench_formulario.py --json resultados.json
+    python benchmarks/bench_formulario.py --base resultados.json --tolerancia 0.25   # sale con 1 si hay regresiones
+"""
+
+import argparse
+import asyncio
+import gc
+import inspect
+import json
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from entorno import instalar_entorno, crear_app  # noqa: E402
+from generar_inv_datos import generar_inv_datos  # noqa: E402
+
+
+def _ejecutar(loop: asyncio.AbstractEventLoop, funcion: Callable[[], Any]):
+    resultado = funcion()
+    if inspect.isawaitable(resultado):
+        resultado = loop.run_until_complete(resultado)
+    return resultado
+
+
+def medir(loop: asyncio.AbstractEventLoop, funcion: Callable[[], Any], repeticiones: int,
+          preparar: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+    """
+    Ejecuta 'funcion' 'repeticiones' veces (llamando a 'preparar' antes de cada una,
+    fuera del tiempo medido) y luego una vez más bajo tracemalloc.
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        _ejecutar(loop, funcion)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    if preparar:
+        preparar()
+    gc.collect()
+    bloques_antes = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        _ejecutar(loop, funcion)
+        actual, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    bloques = sys.getallocatedblocks() - bloques_antes
+
+    tiempos.sort()
+    return {
+        "repeticiones": repeticiones,
+        "min_ms": round(tiempos[0], 3),
+        "p50_ms": round(statistics.median(tiempos), 3),
+        "p95_ms": round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 3),
+        "promedio_ms": round(statistics.fmean(tiempos), 3),
+        "bloques_retenidos": bloques,
+        "memoria_retenida_kb": round(actual / 1024, 1),
+        "pico_kb": round(pico / 1024, 1),
+    }
+
+
+def ejecutar_benchmarks(args) -> Dict[str, Any]:
+    raiz = Path(args.inv_datos) if args.inv_datos else Path(tempfile.mkdtemp(prefix="bench_inv_datos_"))
+    inicio = time.perf_counter()
+    forma = generar_inv_datos(
+        raiz, empresas=args.empresas, secciones=args.secciones, campos=args.campos,
+        idiomas=args.idiomas, catalogos=args.catalogos, items_catalogo=args.items_catalogo,
+        catalogo_grande=args.catalogo_grande, codigos_postales=args.codigos_postales, semilla=args.semilla,
+    )
+    print(f"inv_datos sintético en {raiz} ({(time.perf_counter() - inicio):.1f} s)", file=sys.stderr)
+
+    ruta_snapshot = raiz / "inv_datos.snapshot" if args.snapshot else None
+    gestor = instalar_entorno(raiz, latencia_db_seg=args.latencia_db_ms / 1000, snapshot=ruta_snapshot)
+
+    # Los módulos de la aplicación se importan después de instalar el entorno
+    import app.core.snapshot_inv_datos as snapshot_inv_datos
+    from app.core.maestro_preguntas import maestro_preguntas
+    from app.core.catalogos import almacen_catalogos
+    from app.core.cache_formulario import cache_formulario
+    from app.core.codigos_postales import almacen_codigos_postales
+
+    if ruta_snapshot:
+        snapshot_inv_datos.compilar_snapshot(raiz, ruta_snapshot)
+
+    def enfriar():
+        maestro_preguntas.reconstruir_indice()
+        almacen_catalogos.invalidar()
+        cache_formulario.invalidar()
+        if snapshot_inv_datos._snapshot is not None:
+            snapshot_inv_datos._snapshot.cerrar()
+        snapshot_inv_datos._snapshot = None
+        snapshot_inv_datos._snapshot_intentado = False
+
+    empresa = forma["empresas"][0]
+    guion = forma["guion_secciones"]
+    archivos = [s["archivo"] for s in guion]
+    catalogo_grande = "C000_BENCH"
+
+    def cargar_definiciones(empresas: List[str]):
+        def cargar():
+            for nombre_empresa in empresas:
+                for nombre_archivo in archivos:
+                    maestro_preguntas.obtener_definiciones(nombre_archivo, nombre_empresa)
+        return cargar
+
+    escenarios = [
+        ("definiciones.frio", cargar_definiciones([empresa]), args.repeticiones_frio, enfriar),
+        ("definiciones.caliente", cargar_definiciones([empresa]), args.repeticiones, None),
+        ("definiciones.todas_empresas.frio", cargar_definiciones(forma["empresas"]), args.repeticiones_frio, enfriar),
+        ("payload.frio", lambda: cache_formulario.obtener_payload(empresa, guion, "ESP"), args.repeticiones_frio, enfriar),
+        ("payload.caliente", lambda: cache_formulario.obtener_payload(empresa, guion, "ESP"), args.repeticiones, None),
+        ("payload.idiomas.frio", lambda: [cache_formulario.obtener_payload(empresa, guion, idioma) for idioma in forma["idiomas"]],
+         args.repeticiones_frio, enfriar),
+        ("catalogo_grande.carga", lambda: almacen_catalogos.obtener_opciones(catalogo_grande, "ESP"),
+         args.repeticiones_frio, lambda: almacen_catalogos.invalidar(catalogo_grande)),
+        ("catalogo_grande.buscar", lambda: almacen_catalogos.buscar(catalogo_grande, "ESP", "opción 0012", 20),
+         args.repeticiones, None),
+    ]
+
+    if args.codigos_postales:
+        # Las consultas se miden sobre el índice ya construido
+        asyncio.run(almacen_codigos_postales.recargar_async())
+        escenarios += [
+            ("cp.indice.construir", almacen_codigos_postales.recargar_async, args.repeticiones_frio, None),
+            ("cp.consultar", lambda: almacen_codigos_postales.consultar("01000"), args.repeticiones, None),
+            ("cp.buscar_cp", lambda: almacen_codigos_postales.buscar("012", 10), args.repeticiones, None),
+            ("cp.buscar_colonia", lambda: almacen_codigos_postales.buscar("jardines", 10), args.repeticiones, None),
+        ]
+
+    try:
+        import httpx
+    except ImportError:
+        httpx = None
+        print("httpx no está instalado: se omiten los escenarios HTTP", file=sys.stderr)
+
+    loop = asyncio.new_event_loop()
+    cliente = None
+    if httpx is not None:
+        candidato = {"_id": "bench-eval", "empresa_gestion": empresa, "guion_secciones": guion}
+        gestor.entrevista["bench-eval"] = {f"B{n:05d}": f"valor {n}" for n in range(0, forma["claves"], 3)}
+        cliente = httpx.AsyncClient(transport=httpx.ASGITransport(app=crear_app(candidato)), base_url="http://bench")
+        etag = {}
+
+        async def form_data():
+            respuesta = await cliente.get("/form/data")
+            assert respuesta.status_code == 200, respuesta.status_code
+            etag["valor"] = respuesta.headers["etag"]
+
+        async def form_data_sin_gzip():
+            respuesta = await cliente.get("/form/data", headers={"Accept-Encoding": "identity"})
+            assert respuesta.status_code == 200, respuesta.status_code
+
+        async def form_data_304():
+            respuesta = await cliente.get("/form/data", headers={"If-None-Match": etag["valor"]})
+            assert respuesta.status_code == 304, respuesta.status_code
+
+        escenarios += [
+            ("http.form_data.frio", form_data, args.repeticiones_frio, enfriar),
+            ("http.form_data.caliente", form_data, args.repeticiones, None),
+            ("http.form_data.sin_gzip", form_data_sin_gzip, args.repeticiones, None),
+            ("http.form_data.304", form_data_304, args.repeticiones, None),
+        ]
+
+    resultados = {}
+    try:
+        for nombre, funcion, repeticiones, preparar in escenarios:
+            if args.filtro and args.filtro not in nombre:
+                continue
+            if preparar is None:
+                _ejecutar(loop, funcion)  # calentar
+            resultados[nombre] = medir(loop, funcion, repeticiones, preparar)
+            print(f"  {nombre:<34} p50 {resultados[nombre]['p50_ms']:>10.3f} ms", file=sys.stderr)
+        # Tamaño de la caché de definiciones con todas las empresas cargadas
+        cargar_definiciones(forma["empresas"])()
+        memoria_definiciones = maestro_preguntas.reporte_memoria()
+    finally:
+        if cliente is not None:
+            loop.run_until_complete(cliente.aclose())
+        loop.close()
+
+    return {
+        "forma": {
+            "empresas": args.empresas, "secciones": args.secciones, "campos": args.campos,
+            "idiomas": args.idiomas, "catalogo_grande": args.catalogo_grande, "codigos_postales": args.codigos_postales,
+            "snapshot": bool(args.snapshot), "latencia_db_ms": args.latencia_db_ms,
+        },
+        "entorno": {"python": platform.python_version(), "plataforma": platform.platform()},
+        # ru_maxrss está en KB en Linux y en bytes en macOS
+        "pico_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == "darwin" else 1),
+        "memoria_definiciones": memoria_definiciones,
+        "resultados": resultados,
+    }
+
+
+def imprimir_tabla(reporte: Dict[str, Any]):
+    columnas = ["min_ms", "p50_ms", "p95_ms", "bloques_retenidos", "memoria_retenida_kb", "pico_kb"]
+    print(f"{'escenario':<34}" + "".join(f"{c:>20}" for c in columnas))
+    for nombre, r in reporte["resultados"].items():
+        print(f"{nombre:<34}" + "".join(f"{r[c]:>20}" for c in columnas))
+    print(f"\nForma: {reporte['forma']}")
+    print(f"Pico RSS del proceso: {reporte['pico_rss_kb'] / 1024:.1f} MB")
+    memoria = reporte["memoria_definiciones"]
+    print(f"Caché de definiciones: {memoria['preguntas']} preguntas, {memoria['bytes'] / 1024:.1f} KB "
+          f"({memoria['bytes_sin_compartir'] / 1024:.1f} KB sin compartir, x{memoria['reduccion']})")
+
+
+def comparar(reporte: Dict[str, Any], base: Dict[str, Any], tolerancia: float) -> List[str]:
+    """Escenarios cuyo p50 o pico de memoria empeoró más que 'tolerancia' respecto a 'base'."""
+    regresiones = []
+    for nombre, actual in reporte["resultados"].items():
+        anterior = base.get("resultados", {}).get(nombre)
+        if not anterior:
+            continue
+        for metrica in ("p50_ms", "pico_kb"):
+            if anterior[metrica] > 0 and actual[metrica] > anterior[metrica] * (1 + tolerancia):
+                regresiones.append(f"{nombre}.{metrica}: {anterior[metrica]} -> {actual[metrica]}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del pipeline del formulario.")
+    parser.add_argument("--empresas", type=int, default=3)
+    parser.add_argument("--secciones", type=int, default=15)
+    parser.add_argument("--campos", type=int, default=30)
+    parser.add_argument("--idiomas", type=int, default=2)
+    parser.add_argument("--catalogos", type=int, default=10)
+    parser.add_argument("--items-catalogo", type=int, default=20)
+    parser.add_argument("--catalogo-grande", type=int, default=20000)
+    parser.add_argument("--codigos-postales", type=int, default=30000, help="CPs de la base SQLite sintética (0 = omitir)")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--inv-datos", help="Directorio donde generar el árbol (por defecto uno temporal)")
+    parser.add_argument("--snapshot", action="store_true", help="Compilar y usar el snapshot de inv_datos")
+    parser.add_argument("--latencia-db-ms", type=float, default=1.0, help="Latencia simulada por operación de gestor_estado")
+    parser.add_argument("--repeticiones", type=int, default=50)
+    parser.add_argument("--repeticiones-frio", type=int, default=5)
+    parser.add_argument("--filtro", help="Solo escenarios cuyo nombre contenga este texto")
+    parser.add_argument("--json", help="Guardar el reporte en este archivo")
+    parser.add_argument("--base", help="Reporte JSON previo contra el cual detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=0.25)
+    args = parser.parse_args()
+
+    reporte = ejecutar_benchmarks(args)
+    imprimir_tabla(reporte)
+    if args.json:
+        Path(args.json).write_text(json.dumps(reporte, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    if args.base:
+        base = json.loads(Path(args.base).read_text(encoding="utf-8"))
+        regresiones = comparar(reporte, base, args.tolerancia)
+        if regresiones:
+            print("\nRegresiones detectadas:")
+            for regresion in regresiones:
+                print(f"  {regresion}")
+            sys.exit(1)
+        print("\nSin regresiones respecto a la base.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+# benchmarks/carga_formulario.py
+"""
+Prueba de carga de punta a punta del flujo del candidato en form_router.
+
+Simula N candidatos concurrentes que recorren el guion real de una empresa de
+inv_datos (por defecto inv_datos/empresas/01_EMEX) como lo hace el navegador:
+
+    GET  /form/data                          -> carga inicial
+    POST /form/visited
+    POST /form/save_section                  -> por cada sección de datos planos
+    POST /form/save_group_item/{clave_grupo} -> N registros por cada sección de grupo
+    GET  /form/data?since=<revision>         -> recarga incremental al final
+    (POST /form/visited + GET /form/data?since=<revision>) x --recargas
+
+La aplicación corre en el mismo proceso (httpx.ASGITransport) contra el gestor
+de estado en memoria de entorno.py, con una latencia simulada por operación de
+BD en lugar de Mongo. Los valores de cada campo se generan a partir de las
+preguntas del payload (números en los campos numéricos, una opción del catálogo
+si viene en el payload) para que pasen la validación. Los campos de tipo ARCHIVO
+se omiten: su carga tiene su propio flujo (/form/archivos).
+
+Reporta el throughput, la latencia p50/p95/p99 por endpoint, el retraso del
+event loop (cuánto tarda en despertar un sleep corto mientras corre la carga) y
+las operaciones de BD por petición (contadores db.llamadas.* de metricas).
+
+Uso:
+    python benchmarks/carga_formulario.py --candidatos 200 --concurrencia 50 --latencia-db-ms 2
+    python benchmarks/carga_formulario.py --json antes.json
+    python benchmarks/carga_formulario.py --base antes.json --tolerancia 0.25   # sale con 1 si hay regresiones
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import re
+import resource
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from entorno import instalar_entorno, crear_app_candidatos, CABECERA_CANDIDATO, RAIZ_REPO  # noqa: E402
+
+# Secciones de grupo: "04_G001_HABITANTES_01", "07_G005_BIENES_01"...
+PATRON_GRUPO = re.compile(r"^\d+_G\d{3}_")
+
+
+def guion_empresa(raiz: Path, empresa: str) -> List[Dict[str, Any]]:
+    """Guion con todas las secciones de la empresa, en el orden de sus archivos."""
+    directorio = raiz / "empresas" / empresa / "secciones"
+    archivos = sorted(p.stem for p in directorio.glob("*.json"))
+    if not archivos:
+        raise SystemExit(f"No hay secciones en {directorio}")
+    return [
+        {"tipo": "entrevista", "archivo": archivo,
+         "naturaleza": "grupo" if PATRON_GRUPO.match(archivo) else "dato_plano"}
+        for archivo in archivos
+    ]
+
+
+def percentiles(tiempos: List[float]) -> Dict[str, Any]:
+    if not tiempos:
+        return {"n": 0}
+    tiempos = sorted(tiempos)
+
+    def p(q: float) -> float:
+        return round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * q))], 3)
+
+    return {
+        "n": len(tiempos),
+        "p50_ms": round(statistics.median(tiempos), 3),
+        "p95_ms": p(0.95),
+        "p99_ms": p(0.99),
+        "max_ms": round(tiempos[-1], 3),
+        "promedio_ms": round(statistics.fmean(tiempos), 3),
+    }
+
+
+def valor_para(pregunta: Dict[str, Any], rng: random.Random, n: int) -> Any:
+    """Un valor que pasa la validación de la pregunta."""
+    opciones = pregunta.get("catalogo")
+    if isinstance(opciones, list) and opciones:
+        return rng.choice(opciones)
+    if pregunta.get("validacion_input") == "NUMERICO" or pregunta.get("minimo") or pregunta.get("maximo"):
+        try:
+            minimo = float(pregunta.get("minimo") or 0)
+            maximo = float(pregunta.get("maximo") or minimo + 10000)
+        except (TypeError, ValueError):
+            minimo, maximo = 0, 10000
+        return str(rng.randint(int(minimo), max(int(minimo), int(maximo))))
+    return f"valor {n} {rng.randrange(1000)}"
+
+
+def valores_seccion(seccion: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+    return {
+        p["clave"]: valor_para(p, rng, n) for n, p in enumerate(seccion.get("preguntas") or [])
+        if p.get("clave") and p.get("tipo") != "ARCHIVO"
+    }
+
+
+class Registro:
+    """Latencias y errores por endpoint de toda la corrida."""
+
+    def __init__(self):
+        self.tiempos: Dict[str, List[float]] = {}
+        self.errores: Dict[str, int] = {}
+
+    async def pedir(self, endpoint: str, peticion) -> Any:
+        inicio = time.perf_counter()
+        respuesta = await peticion
+        self.tiempos.setdefault(endpoint, []).append((time.perf_counter() - inicio) * 1000)
+        if respuesta.status_code != 200:
+            self.errores[endpoint] = self.errores.get(endpoint, 0) + 1
+            return None
+        return respuesta
+
+
+async def recorrer_formulario(cliente, registro: Registro, candidato_id: str, rng: random.Random, args):
+    """Recorrido completo de un candidato."""
+    cabeceras = {CABECERA_CANDIDATO: candidato_id}
+
+    async def pausa():
+        # Tiempo que el candidato tarda en llenar cada sección
+        if args.pausa_ms > 0:
+            await asyncio.sleep(rng.expovariate(1000 / args.pausa_ms))
+
+    respuesta = await registro.pedir("GET /form/data", cliente.get("/form/data", headers=cabeceras))
+    if respuesta is None:
+        return
+    datos = respuesta.json()
+    await registro.pedir("POST /form/visited", cliente.post("/form/visited", headers=cabeceras))
+
+    for seccion in datos.get("secciones", []):
+        await pausa()
+        valores = valores_seccion(seccion, rng)
+        if not valores:
+            continue
+        if seccion.get("naturaleza") == "grupo":
+            clave_grupo = seccion["key"].replace(".json", "")
+            for _ in range(args.registros_grupo):
+                item = {**valores_seccion(seccion, rng), "_id_registro": str(uuid.UUID(int=rng.getrandbits(128)))}
+                await registro.pedir(
+                    "POST /form/save_group_item/{clave_grupo}",
+                    cliente.post(f"/form/save_group_item/{clave_grupo}", json=item, headers=cabeceras),
+                )
+        else:
+            await registro.pedir("POST /form/save_section",
+                                 cliente.post("/form/save_section", json=valores, headers=cabeceras))
+
+    # Recarga como la del navegador: solo lo que cambió desde la primera carga
+    await registro.pedir("GET /form/data?since",
+                         cliente.get("/form/data", params={"since": datos.get("revision", "")}, headers=cabeceras))
+    # Cada recarga posterior de la página vuelve a marcar la visita
+    for _ in range(args.recargas):
+        await registro.pedir("POST /form/visited", cliente.post("/form/visited", headers=cabeceras))
+        await registro.pedir("GET /form/data?since",
+                             cliente.get("/form/data", params={"since": datos.get("revision", "")}, headers=cabeceras))
+
+
+async def monitorear_event_loop(retrasos: List[float], intervalo: float, detener: asyncio.Event):
+    """Anota cuánto más de 'intervalo' tarda el event loop en despertar un sleep."""
+    loop = asyncio.get_running_loop()
+    while not detener.is_set():
+        inicio = loop.time()
+        await asyncio.sleep(intervalo)
+        retrasos.append(max(0.0, (loop.time() - inicio - intervalo) * 1000))
+
+
+async def ejecutar_carga(args) -> Dict[str, Any]:
+    import httpx
+
+    raiz = Path(args.inv_datos)
+    guion = guion_empresa(raiz, args.empresa)
+    gestor = instalar_entorno(raiz, latencia_db_seg=args.latencia_db_ms / 1000)
+
+    # Los módulos de la aplicación se importan después de instalar el entorno
+    from app.core.metricas import metricas
+
+    total = args.candidatos + (0 if args.sin_calentar else 1)
+    candidatos = {
+        f"carga-{n:05d}": {"_id": f"carga-{n:05d}", "empresa_gestion": args.empresa, "guion_secciones": guion}
+        for n in range(total)
+    }
+    ids = list(candidatos)
+    rng_base = random.Random(args.semilla)
+    semillas = {candidato_id: rng_base.getrandbits(32) for candidato_id in ids}
+
+    cliente = httpx.AsyncClient(transport=httpx.ASGITransport(app=crear_app_candidatos(candidatos)),
+                                base_url="http://carga", timeout=None)
+    try:
+        if not args.sin_calentar:
+            # Un candidato fuera de la medición: cachés de definiciones, payloads y validadores calientes
+            candidato_id = ids.pop()
+            await recorrer_formulario(cliente, Registro(), candidato_id, random.Random(semillas[candidato_id]), args)
+        metricas.reiniciar()
+        operaciones_antes = gestor.operaciones
+
+        registro = Registro()
+        retrasos: List[float] = []
+        detener = asyncio.Event()
+        monitor = asyncio.create_task(monitorear_event_loop(retrasos, args.intervalo_lag_ms / 1000, detener))
+        limite = asyncio.Semaphore(args.concurrencia)
+
+        async def candidato(candidato_id: str):
+            async with limite:
+                await recorrer_formulario(cliente, registro, candidato_id, random.Random(semillas[candidato_id]), args)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(candidato(candidato_id) for candidato_id in ids))
+        duracion = time.perf_counter() - inicio
+        detener.set()
+        await monitor
+    finally:
+        await cliente.aclose()
+
+    contadores = metricas.instantanea()["contadores"]
+    db_por_ruta = {}
+    for clave, peticiones in contadores.items():
+        if clave.startswith("db.peticiones.") and peticiones:
+            ruta = clave[len("db.peticiones."):]
+            db_por_ruta[ruta] = round(contadores.get(f"db.llamadas.{ruta}", 0) / peticiones, 2)
+
+    peticiones = sum(len(t) for t in registro.tiempos.values())
+    endpoints = {}
+    for endpoint, tiempos in registro.tiempos.items():
+        endpoints[endpoint] = {
+            **percentiles(tiempos),
+            "errores": registro.errores.get(endpoint, 0),
+            "por_seg": round(len(tiempos) / duracion, 1),
+        }
+    operaciones = gestor.operaciones - operaciones_antes
+    return {
+        "forma": {
+            "empresa": args.empresa, "secciones": len(guion), "candidatos": args.candidatos,
+            "concurrencia": args.concurrencia, "registros_grupo": args.registros_grupo, "recargas": args.recargas,
+            "latencia_db_ms": args.latencia_db_ms, "pausa_ms": args.pausa_ms, "calentado": not args.sin_calentar,
+        },
+        "entorno": {"python": platform.python_version(), "plataforma": platform.platform()},
+        "duracion_seg": round(duracion, 3),
+        "peticiones": peticiones,
+        "errores": sum(registro.errores.values()),
+        "peticiones_por_seg": round(peticiones / duracion, 1),
+        "candidatos_por_seg": round(len(ids) / duracion, 2),
+        "event_loop_lag": percentiles(retrasos),
+        "db": {
+            "operaciones": operaciones,
+            "por_peticion": round(operaciones / peticiones, 2) if peticiones else 0,
+            "llamadas_por_ruta": db_por_ruta,
+        },
+        # ru_maxrss está en KB en Linux y en bytes en macOS
+        "pico_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == "darwin" else 1),
+        "endpoints": endpoints,
+    }
+
+
+def imprimir_reporte(reporte: Dict[str, Any]):
+    columnas = ["n", "errores", "por_seg", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+    print(f"{'endpoint':<44}" + "".join(f"{c:>12}" for c in columnas))
+    for nombre, r in reporte["endpoints"].items():
+        print(f"{nombre:<44}" + "".join(f"{r[c]:>12}" for c in columnas))
+    lag = reporte["event_loop_lag"]
+    db = reporte["db"]
+    print(f"\nForma: {reporte['forma']}")
+    print(f"{reporte['peticiones']} peticiones en {reporte['duracion_seg']} s: {reporte['peticiones_por_seg']} pet/s, "
+          f"{reporte['candidatos_por_seg']} candidatos/s, {reporte['errores']} errores")
+    if lag.get("n"):
+        print(f"Retraso del event loop: p50 {lag['p50_ms']} ms, p99 {lag['p99_ms']} ms, máx {lag['max_ms']} ms")
+    print(f"Operaciones de BD: {db['operaciones']} ({db['por_peticion']} por petición)")
+    for ruta, llamadas in sorted(db["llamadas_por_ruta"].items()):
+        print(f"  {ruta:<42} {llamadas:>8} llamadas/petición")
+    print(f"Pico RSS del proceso: {reporte['pico_rss_kb'] / 1024:.1f} MB")
+
+
+def comparar(reporte: Dict[str, Any], base: Dict[str, Any], tolerancia: float) -> List[str]:
+    """Endpoints cuyo p95 o llamadas a BD empeoraron, o throughput que bajó, más que 'tolerancia'."""
+    regresiones = []
+    for nombre, actual in reporte["endpoints"].items():
+        anterior = base.get("endpoints", {}).get(nombre)
+        if anterior and anterior.get("p95_ms", 0) > 0 and actual["p95_ms"] > anterior["p95_ms"] * (1 + tolerancia):
+            regresiones.append(f"{nombre}.p95_ms: {anterior['p95_ms']} -> {actual['p95_ms']}")
+    for ruta, llamadas in reporte["db"]["llamadas_por_ruta"].items():
+        anterior = base.get("db", {}).get("llamadas_por_ruta", {}).get(ruta)
+        if anterior is not None and llamadas > anterior * (1 + tolerancia):
+            regresiones.append(f"db.{ruta}: {anterior} -> {llamadas} llamadas/petición")
+    anterior = base.get("peticiones_por_seg")
+    if anterior and reporte["peticiones_por_seg"] < anterior / (1 + tolerancia):
+        regresiones.append(f"peticiones_por_seg: {anterior} -> {reporte['peticiones_por_seg']}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del flujo del candidato en /form.")
+    parser.add_argument("--candidatos", type=int, default=100)
+    parser.add_argument("--concurrencia", type=int, default=25, help="Candidatos recorriendo el formulario a la vez")
+    parser.add_argument("--inv-datos", default=str(RAIZ_REPO / "inv_datos"))
+    parser.add_argument("--empresa", default="01_EMEX")
+    parser.add_argument("--registros-grupo", type=int, default=2, help="Registros que se agregan en cada sección de grupo")
+    parser.add_argument("--recargas", type=int, default=0, help="Recargas de la página al final de cada recorrido")
+    parser.add_argument("--latencia-db-ms", type=float, default=1.0, help="Latencia simulada por operación de gestor_estado")
+    parser.add_argument("--pausa-ms", type=float, default=0.0, help="Pausa media (exponencial) entre secciones")
+    parser.add_argument("--intervalo-lag-ms", type=float, default=10.0)
+    parser.add_argument("--sin-calentar", action="store_true", help="Medir también la primera carga con cachés vacías")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="Mostrar los logs de la aplicación")
+    parser.add_argument("--json", help="Guardar el reporte en este archivo")
+    parser.add_argument("--base", help="Reporte JSON previo contra el cual detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=0.25)
+    args = parser.parse_args()
+
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        raise SystemExit("La prueba de carga necesita httpx (pip install httpx)")
+
+    # Los catálogos referenciados que no existen en inv_datos generan un warning por petición
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+    reporte = asyncio.run(ejecutar_carga(args))
+    imprimir_reporte(reporte)
+    if args.json:
+        Path(args.json).write_text(json.dumps(reporte, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    if args.base:
+        base = json.loads(Path(args.base).read_text(encoding="utf-8"))
+        regresiones = comparar(reporte, base, args.tolerancia)
+        if regresiones:
+            print("\nRegresiones detectadas:")
+            for regresion in regresiones:
+                print(f"  {regresion}")
+            sys.exit(1)
+        print("\nSin regresiones respecto a la base.")
+
+
+if __name__ == "__main__":
+    main()
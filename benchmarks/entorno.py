@@ -0,0 +1,278 @@
+# benchmarks/entorno.py
+"""
+Entorno aislado para los benchmarks: apunta la aplicación a un árbol inv_datos
+sintético y reemplaza las dependencias externas (MongoDB vía gestor_estado,
+la colección de evaluaciones y la dependencia del candidato) por versiones en memoria.
+
+Debe llamarse a instalar_entorno() ANTES de importar cualquier módulo de 'app',
+porque los módulos leen la configuración (rutas, variables de entorno) al importarse.
+"""
+
+import asyncio
+import copy
+import json
+import os
+import sys
+import types
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+RAIZ_REPO = Path(__file__).resolve().parent.parent
+
+
+class GestorEstadoEnMemoria:
+    """
+    Sustituto de app.core.gestor_estado con la misma API async. Cada operación
+    espera 'latencia_seg' para simular el viaje de ida y vuelta a MongoDB.
+    """
+
+    def __init__(self, latencia_seg: float = 0.001):
+        self.latencia_seg = latencia_seg
+        self.estados: Dict[str, Dict[str, Any]] = {}
+        self.entrevista: Dict[str, Dict[str, Any]] = {}
+        self.grupos: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        # Documentos de la colección de evaluaciones (por str(_id)) que la
+        # aplicación escribe directamente, como el registro de revisiones
+        self.documentos: Dict[str, Dict[str, Any]] = {}
+        self.operaciones = 0
+
+    async def _operacion(self):
+        self.operaciones += 1
+        if self.latencia_seg:
+            await asyncio.sleep(self.latencia_seg)
+
+    async def obtener_estado_async(self, evaluacion_uuid: str) -> Dict[str, Any]:
+        await self._operacion()
+        return dict(self.estados.get(evaluacion_uuid, {"idioma": "ESP"}))
+
+    async def guardar_estado_async(self, evaluacion_uuid: str, estado: Dict[str, Any]):
+        await self._operacion()
+        self.estados[evaluacion_uuid] = dict(estado)
+
+    async def cargar_datos_entrevista_async(self, evaluacion_uuid: str) -> Dict[str, Any]:
+        await self._operacion()
+        return dict(self.entrevista.get(evaluacion_uuid, {}))
+
+    async def guardar_datos_entrevista_async(self, evaluacion_uuid: str, clave: str, valor: Any):
+        await self._operacion()
+        self.entrevista.setdefault(evaluacion_uuid, {})[clave] = valor
+
+    async def cargar_datos_grupo_async(self, evaluacion_uuid: str) -> Dict[str, List[Dict[str, Any]]]:
+        await self._operacion()
+        return {clave: [dict(r) for r in registros] for clave, registros in self.grupos.get(evaluacion_uuid, {}).items()}
+
+    async def guardar_datos_grupo_async(self, evaluacion_uuid: str, clave_grupo: str, item: Dict[str, Any]):
+        await self._operacion()
+        registros = self.grupos.setdefault(evaluacion_uuid, {}).setdefault(clave_grupo, [])
+        for i, registro in enumerate(registros):
+            if registro.get("_id_registro") == item.get("_id_registro"):
+                registros[i] = dict(item)
+                return
+        registros.append(dict(item))
+
+    async def eliminar_datos_grupo_async(self, evaluacion_uuid: str, clave_grupo: str, registro_id: str):
+        await self._operacion()
+        grupos = self.grupos.get(evaluacion_uuid, {})
+        grupos[clave_grupo] = [r for r in grupos.get(clave_grupo, []) if r.get("_id_registro") != registro_id]
+
+
+class _ResultadoActualizacion:
+    def __init__(self, coincidencias: int):
+        self.matched_count = coincidencias
+        self.modified_count = coincidencias
+
+
+def _leer_ruta(documento: Dict[str, Any], ruta: str) -> Any:
+    valor = documento
+    for parte in ruta.split("."):
+        if not isinstance(valor, dict) or parte not in valor:
+            return None
+        valor = valor[parte]
+    return valor
+
+
+def _contenedor_ruta(documento: Dict[str, Any], ruta: str):
+    *padres, ultimo = ruta.split(".")
+    for parte in padres:
+        documento = documento.setdefault(parte, {})
+    return documento, ultimo
+
+
+class ColeccionEnMemoria:
+    """
+    Sustituto mínimo de la colección de evaluaciones (API de Motor) sobre los
+    documentos del GestorEstadoEnMemoria: filtros por igualdad o $in sobre rutas
+    con puntos, proyecciones de inclusión y actualizaciones con $set/$inc/$unset.
+    Cada operación es atómica (no cede el event loop entre leer y escribir).
+    """
+
+    def __init__(self, gestor: GestorEstadoEnMemoria):
+        self._gestor = gestor
+
+    def _coincide(self, clave_documento: str, documento: Dict[str, Any], filtro: Dict[str, Any]) -> bool:
+        for ruta, condicion in filtro.items():
+            valor = clave_documento if ruta == "_id" else _leer_ruta(documento, ruta)
+            if ruta == "_id":
+                condicion = str(condicion)
+            if isinstance(condicion, dict) and "$in" in condicion:
+                if valor not in condicion["$in"]:
+                    return False
+            elif valor != condicion:
+                return False
+        return True
+
+    def _buscar(self, filtro: Dict[str, Any]):
+        clave = str(filtro["_id"])
+        documento = self._gestor.documentos.get(clave)
+        if documento is None or not self._coincide(clave, documento, filtro):
+            return None
+        return documento
+
+    @staticmethod
+    def _proyectar(documento: Dict[str, Any], proyeccion: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if not proyeccion:
+            return copy.deepcopy(documento)
+        resultado: Dict[str, Any] = {}
+        for ruta in proyeccion:
+            valor = _leer_ruta(documento, ruta)
+            if valor is not None:
+                contenedor, ultimo = _contenedor_ruta(resultado, ruta)
+                contenedor[ultimo] = copy.deepcopy(valor)
+        return resultado
+
+    @staticmethod
+    def _aplicar(documento: Dict[str, Any], cambios: Dict[str, Any]):
+        for ruta, valor in (cambios.get("$set") or {}).items():
+            contenedor, ultimo = _contenedor_ruta(documento, ruta)
+            contenedor[ultimo] = copy.deepcopy(valor)
+        for ruta, incremento in (cambios.get("$inc") or {}).items():
+            contenedor, ultimo = _contenedor_ruta(documento, ruta)
+            contenedor[ultimo] = (contenedor.get(ultimo) or 0) + incremento
+        for ruta in cambios.get("$unset") or {}:
+            contenedor, ultimo = _contenedor_ruta(documento, ruta)
+            contenedor.pop(ultimo, None)
+
+    async def find_one(self, filtro: Dict[str, Any], proyeccion: Optional[Dict[str, Any]] = None):
+        await self._gestor._operacion()
+        documento = self._buscar(filtro)
+        return None if documento is None else {"_id": filtro["_id"], **self._proyectar(documento, proyeccion)}
+
+    async def update_one(self, filtro: Dict[str, Any], cambios: Dict[str, Any]):
+        await self._gestor._operacion()
+        # Como en la colección real, el documento del candidato existe siempre
+        self._gestor.documentos.setdefault(str(filtro["_id"]), {})
+        documento = self._buscar(filtro)
+        if documento is None:
+            return _ResultadoActualizacion(0)
+        self._aplicar(documento, cambios)
+        return _ResultadoActualizacion(1)
+
+    async def find_one_and_update(self, filtro: Dict[str, Any], cambios: Dict[str, Any],
+                                  projection: Optional[Dict[str, Any]] = None, return_document: bool = False):
+        await self._gestor._operacion()
+        self._gestor.documentos.setdefault(str(filtro["_id"]), {})
+        documento = self._buscar(filtro)
+        if documento is None:
+            return None
+        anterior = self._proyectar(documento, projection)
+        self._aplicar(documento, cambios)
+        return {"_id": filtro["_id"], **(self._proyectar(documento, projection) if return_document else anterior)}
+
+
+def _modulo(nombre: str, **atributos) -> types.ModuleType:
+    modulo = types.ModuleType(nombre)
+    modulo.__dict__.update(atributos)
+    sys.modules[nombre] = modulo
+    return modulo
+
+
+def instalar_entorno(raiz_inv_datos: Path, latencia_db_seg: float = 0.001,
+                     snapshot: Optional[Path] = None) -> GestorEstadoEnMemoria:
+    """
+    Registra en sys.modules la configuración apuntando a 'raiz_inv_datos' y los
+    sustitutos en memoria. Devuelve el gestor de estado para poder sembrar datos.
+    """
+    if "app.core.maestro_preguntas" in sys.modules:
+        raise RuntimeError("instalar_entorno() debe llamarse antes de importar la aplicación")
+    if str(RAIZ_REPO) not in sys.path:
+        sys.path.insert(0, str(RAIZ_REPO))
+
+    raiz = Path(raiz_inv_datos)
+    # Sin snapshot explícito se apunta a una ruta inexistente para no usar el de producción
+    os.environ["INV_DATOS_SNAPSHOT"] = str(snapshot or raiz / "sin_snapshot.snapshot")
+
+    _modulo(
+        "app.config",
+        RESOURCES_PATH=raiz / "resources",
+        INV_DATOS_DATOS_DIR=raiz / "datos",
+        INV_DATOS_GRUPOS_DIR=raiz / "grupos",
+        INV_DATOS_GRUPOS_DATOS_DIR=raiz / "grupos" / "datos",
+        INV_DATOS_SECCIONES_DIR=raiz / "secciones",
+        INV_DATOS_CATALOGOS_DIR=raiz / "catalogos",
+        get_empresa_secciones_dir=lambda empresa: raiz / "empresas" / empresa / "secciones",
+    )
+
+    def cargar_json(nombre: str):
+        ruta = raiz / "resources" / nombre
+        return json.loads(ruta.read_text(encoding="utf-8")) if ruta.is_file() else None
+
+    def cargar_dato_pregunta(clave: str):
+        ruta = raiz / "datos" / f"{clave}.json"
+        return json.loads(ruta.read_text(encoding="utf-8")) if ruta.is_file() else None
+
+    _modulo(
+        "app.core.cargador_recursos",
+        cargar_json=cargar_json,
+        cargar_dato_pregunta=cargar_dato_pregunta,
+        cargar_seccion_entrevista=lambda nombre_archivo, empresa=None: None,
+    )
+
+    gestor = GestorEstadoEnMemoria(latencia_db_seg)
+    _modulo("app.core.gestor_estado", **{
+        nombre: getattr(gestor, nombre) for nombre in dir(gestor)
+        if nombre.endswith("_async")
+    })
+    coleccion = ColeccionEnMemoria(gestor)
+    _modulo("app.database", get_evaluacion_collection=lambda: coleccion)
+
+    async def get_current_candidate():
+        raise RuntimeError("La dependencia del candidato debe sobrescribirse en el benchmark")
+
+    _modulo("app.routes.consent", get_current_candidate=get_current_candidate)
+    return gestor
+
+
+# Cabecera con la que las pruebas de carga indican el candidato de cada petición
+CABECERA_CANDIDATO = "X-Bench-Candidato"
+
+
+def _app_formulario(dependencia_candidato):
+    from fastapi import FastAPI
+    from app.routes.form import form_router
+    from app.routes.consent import get_current_candidate
+
+    app = FastAPI()
+    app.include_router(form_router, prefix="/form")
+    app.dependency_overrides[get_current_candidate] = dependencia_candidato
+    return app
+
+
+def crear_app(candidato: Dict[str, Any]):
+    """App FastAPI mínima con form_router montado en /form para el candidato dado."""
+    async def candidato_fijo():
+        return candidato
+
+    return _app_formulario(candidato_fijo)
+
+
+def crear_app_candidatos(candidatos: Dict[str, Dict[str, Any]]):
+    """Como crear_app, pero cada petición elige su candidato (por _id) con la cabecera CABECERA_CANDIDATO."""
+    from fastapi import HTTPException, Request
+
+    async def candidato_de_cabecera(request: Request):
+        candidato = candidatos.get(request.headers.get(CABECERA_CANDIDATO, ""))
+        if candidato is None:
+            raise HTTPException(status_code=401, detail="Candidato desconocido")
+        return candidato
+
+    return _app_formulario(candidato_de_cabecera)
@@ -0,0 +1,174 @@
+# benchmarks/generar_inv_datos.py
+"""
+Generador de árboles inv_datos sintéticos para los benchmarks.
+
+Crea la misma estructura que usa la aplicación:
+    inv_datos/
+        empresas/{empresa}/secciones/{NN}_SECCION_{i}.json   (grupo_datos con claves)
+        secciones/  grupos/  grupos/datos/                   (vacíos, rutas de fallback)
+        datos/{clave}.json                                   (definición individual multiidioma)
+        catalogos/{clave}.json                               (items con valor multiidioma)
+        cp_oficiales/codigos_postales.db                     (SQLite con columnas de SEPOMEX)
+
+Uso:
+    python benchmarks/generar_inv_datos.py /tmp/inv_datos --empresas 5 --secciones 15 --campos 30 --catalogo-grande 20000
+"""
+
+import argparse
+import json
+import random
+import shutil
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List
+
+IDIOMAS = ["ESP", "ENG", "FRA", "POR"]
+
+
+def _texto_multiidioma(base: str, idiomas: List[str]) -> Dict[str, str]:
+    return {idioma: f"{base} [{idioma}]" for idioma in idiomas}
+
+
+def _escribir(ruta: Path, contenido: Any):
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    ruta.write_text(json.dumps(contenido, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+_PALABRAS_COLONIA = ["Centro", "Lomas", "Jardines", "Valle", "Real", "Bosques", "Santa", "San", "Vista",
+                     "Hermosa", "Del", "Norte", "Sur", "Industrial", "Americana", "Reforma", "Insurgentes"]
+_TIPOS_ASENTAMIENTO = ["Colonia", "Fraccionamiento", "Barrio", "Pueblo", "Unidad habitacional"]
+
+
+def generar_codigos_postales(ruta_db: Path, codigos: int = 30000, colonias_por_cp: int = 5, semilla: int = 42) -> int:
+    """
+    Crea una base SQLite con la tabla de SEPOMEX (mismas columnas que CPdescarga.txt).
+    Devuelve el número de asentamientos escritos.
+    """
+    rnd = random.Random(semilla)
+    ruta_db = Path(ruta_db)
+    ruta_db.parent.mkdir(parents=True, exist_ok=True)
+    if ruta_db.exists():
+        ruta_db.unlink()
+    estados = [f"Estado {n:02d}" for n in range(32)]
+    conexion = sqlite3.connect(ruta_db)
+    conexion.execute("CREATE TABLE codigos_postales (d_codigo TEXT, d_asenta TEXT, d_tipo_asenta TEXT, "
+                     "D_mnpio TEXT, d_estado TEXT, d_ciudad TEXT)")
+    filas = []
+    for n in range(codigos):
+        cp = f"{1000 + n * 3:05d}"
+        estado = estados[n * len(estados) // codigos]
+        municipio = f"Municipio {n // 40:04d}"
+        for _ in range(rnd.randint(1, colonias_por_cp * 2 - 1)):
+            nombre = " ".join(rnd.sample(_PALABRAS_COLONIA, rnd.randint(1, 3)))
+            filas.append((cp, nombre, rnd.choice(_TIPOS_ASENTAMIENTO), municipio, estado, f"Ciudad {n // 200:03d}"))
+    conexion.executemany("INSERT INTO codigos_postales VALUES (?, ?, ?, ?, ?, ?)", filas)
+    conexion.commit()
+    conexion.close()
+    return len(filas)
+
+
+def generar_inv_datos(
+    raiz: Path,
+    empresas: int = 3,
+    secciones: int = 15,
+    campos: int = 30,
+    idiomas: int = 2,
+    catalogos: int = 10,
+    items_catalogo: int = 20,
+    catalogo_grande: int = 20000,
+    proporcion_catalogo: float = 0.15,
+    proporcion_overrides: float = 0.3,
+    cada_grupo: int = 4,
+    codigos_postales: int = 0,
+    semilla: int = 42,
+) -> Dict[str, Any]:
+    """
+    Genera un árbol inv_datos en 'raiz' (se borra si existe) y devuelve su forma:
+    las empresas y el guion de secciones que se puede usar como guion_secciones.
+    """
+    rnd = random.Random(semilla)
+    raiz = Path(raiz)
+    if raiz.exists():
+        shutil.rmtree(raiz)
+    idiomas_usados = IDIOMAS[:max(1, min(idiomas, len(IDIOMAS)))]
+    for sub in ("secciones", "grupos", "grupos/datos", "datos", "catalogos"):
+        (raiz / sub).mkdir(parents=True, exist_ok=True)
+
+    # Catálogos: varios pequeños y uno grande (ej: colonias)
+    claves_catalogo = [f"C{n:03d}_BENCH" for n in range(catalogos)]
+    for n, clave_catalogo in enumerate(claves_catalogo):
+        total = catalogo_grande if n == 0 and catalogo_grande else items_catalogo
+        _escribir(raiz / "catalogos" / f"{clave_catalogo}.json", {
+            "clave": clave_catalogo,
+            "items": [{"id": i, "valor": _texto_multiidioma(f"Opción {i:06d}", idiomas_usados)} for i in range(total)],
+        })
+
+    # Definiciones individuales de los datos, compartidas por todas las empresas
+    total_claves = secciones * campos
+    for n in range(total_claves):
+        clave = f"B{n:05d}"
+        es_catalogo = rnd.random() < proporcion_catalogo
+        _escribir(raiz / "datos" / f"{clave}.json", {
+            "clave": clave,
+            "nombre": _texto_multiidioma(f"Campo {n}", idiomas_usados),
+            "tipo": "CATÁLOGO" if es_catalogo else "TEXTO",
+            "catalogo": rnd.choice(claves_catalogo) if es_catalogo else None,
+        })
+
+    guion_secciones = []
+    nombres_empresas = [f"{n + 1:02d}_BENCH" for n in range(empresas)]
+    for s in range(secciones):
+        nombre_archivo = f"{s:02d}_SECCION_{s}"
+        naturaleza = "grupo" if cada_grupo and s % cada_grupo == cada_grupo - 1 else "dato_plano"
+        guion_secciones.append({"tipo": "entrevista", "archivo": nombre_archivo, "naturaleza": naturaleza})
+
+    for empresa in nombres_empresas:
+        for s in range(secciones):
+            grupo_datos = []
+            for c in range(campos):
+                n = s * campos + c
+                item = {"id": c + 1, "clave": f"B{n:05d}", "nombre": f"Campo {n}"}
+                # Campos del grupo_datos que se fusionan sobre la definición individual
+                if rnd.random() < proporcion_overrides:
+                    item["validacion_input"] = "NUMERICO"
+                if rnd.random() < proporcion_overrides / 3:
+                    item["catalogo"] = claves_catalogo[0]
+                    item["acepta_valores_fuera_del_catalogo"] = "No"
+                grupo_datos.append(item)
+            _escribir(raiz / "empresas" / empresa / "secciones" / f"{s:02d}_SECCION_{s}.json", {
+                f"Seccion_{s}": {
+                    "idiomas_disponibles": idiomas_usados,
+                    "nombre_corto": _texto_multiidioma(f"SECCIÓN {s}", idiomas_usados),
+                    "frase_introduccion": _texto_multiidioma(f"Introducción de la sección {s}", idiomas_usados),
+                    "grupo_datos": grupo_datos,
+                }
+            })
+
+    asentamientos = 0
+    if codigos_postales:
+        asentamientos = generar_codigos_postales(raiz / "cp_oficiales" / "codigos_postales.db", codigos_postales, semilla=semilla)
+
+    return {"raiz": str(raiz), "empresas": nombres_empresas, "guion_secciones": guion_secciones,
+            "idiomas": idiomas_usados, "claves": total_claves, "asentamientos": asentamientos}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera un árbol inv_datos sintético.")
+    parser.add_argument("destino")
+    parser.add_argument("--empresas", type=int, default=3)
+    parser.add_argument("--secciones", type=int, default=15)
+    parser.add_argument("--campos", type=int, default=30)
+    parser.add_argument("--idiomas", type=int, default=2)
+    parser.add_argument("--catalogos", type=int, default=10)
+    parser.add_argument("--items-catalogo", type=int, default=20)
+    parser.add_argument("--catalogo-grande", type=int, default=20000)
+    parser.add_argument("--codigos-postales", type=int, default=0, help="CPs en la base SQLite de SEPOMEX (0 = no generarla)")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+    forma = generar_inv_datos(
+        Path(args.destino), empresas=args.empresas, secciones=args.secciones, campos=args.campos,
+        idiomas=args.idiomas, catalogos=args.catalogos, items_catalogo=args.items_catalogo,
+        catalogo_grande=args.catalogo_grande, codigos_postales=args.codigos_postales, semilla=args.semilla,
+    )
+    print(f"inv_datos generado en {forma['raiz']}: {len(forma['empresas'])} empresas, "
+          f"{len(forma['guion_secciones'])} secciones, {forma['claves']} claves")
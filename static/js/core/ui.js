@@ -829,6 +829,55 @@ export function setStageUI(stage, botonTexto = null, botonOmitirTexto = null) {
     // --- 3. Lógica final para mostrar el contenedor principal ---
 }
 
+// Tiempo máximo que se espera a que el servidor genere el PDF antes de avisar al usuario
+const MAX_ESPERA_PDF_MS = 120000;
+
+/**
+ * Lanza un error marcado como espera agotada si se pasó el plazo para obtener el PDF.
+ * @param {number} limite - Marca de tiempo (Date.now()) a partir de la cual se deja de esperar.
+ */
+function comprobarEsperaPdf(limite) {
+    if (Date.now() > limite) {
+        const error = new Error('El PDF no estuvo listo a tiempo');
+        error.esperaAgotada = true;
+        throw error;
+    }
+}
+
+/**
+ * Lee la respuesta de un trabajo de generación de PDF ({trabajo_id, estado, url}).
+ * Lanza error si el servidor lo rechazó o la generación falló.
+ */
+async function leerTrabajoPdf(response) {
+    if (response.status === 503) {
+        // Cola llena: se reintenta como si siguiera en cola
+        return { estado: 'en_cola', trabajo_id: null, reintentar: true };
+    }
+    const data = await response.json().catch(() => ({}));
+    if (!response.ok || data.estado === 'error') {
+        throw new Error(`Error al generar PDF: ${data.message || data.error || response.statusText}`);
+    }
+    return data;
+}
+
+/**
+ * Pide al servidor el reporte PDF de la evaluación (lo encola o reutiliza el ya generado).
+ * @param {string} uuid - El UUID de la evaluación.
+ * @param {number} limite - Marca de tiempo a partir de la cual se deja de reintentar.
+ */
+async function solicitarPdf(uuid, limite) {
+    let trabajo;
+    do {
+        comprobarEsperaPdf(limite);
+        const response = await fetch(apiUrl(`api/evaluaciones/${uuid}/pdf`), { method: 'POST' });
+        trabajo = await leerTrabajoPdf(response);
+        if (trabajo.reintentar) {
+            await new Promise(resolve => setTimeout(resolve, 5000));
+        }
+    } while (trabajo.reintentar);
+    return trabajo;
+}
+
 /**
  * Muestra el botón de descarga de PDF cuando la evaluación está completada.
  */
@@ -854,10 +903,21 @@ export function mostrarBotonDescarga() {
                 this.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Generando...';
                 
                 try {
-                    const response = await fetch(apiUrl(`api/evaluaciones/${uuid}/pdf`));
+                    // El servidor genera el PDF en segundo plano; se consulta hasta que esté listo
+                    const limite = Date.now() + MAX_ESPERA_PDF_MS;
+                    let trabajo = await solicitarPdf(uuid, limite);
+                    while (trabajo.estado !== 'listo') {
+                        comprobarEsperaPdf(limite);
+                        await new Promise(resolve => setTimeout(resolve, 1000));
+                        const response = await fetch(apiUrl(`api/evaluaciones/${uuid}/pdf/trabajos/${trabajo.trabajo_id}`));
+                        // 404: el trabajo se perdió (ej: reinicio del servidor), se vuelve a solicitar
+                        trabajo = response.status === 404 ? await solicitarPdf(uuid, limite) : await leerTrabajoPdf(response);
+                    }
+
+                    const response = await fetch(apiUrl(trabajo.url));
                     if (!response.ok) {
                         const errorText = await response.text();
-                        throw new Error(`Error al generar PDF: ${response.statusText} - ${errorText}`);
+                        throw new Error(`Error al descargar PDF: ${response.statusText} - ${errorText}`);
                     }
                     
                     // Descargar el PDF
@@ -876,7 +936,9 @@ export function mostrarBotonDescarga() {
                     this.innerHTML = textoOriginal;
                 } catch (error) {
                     console.error('Error al descargar PDF:', error);
-                    alert('Error al generar el PDF. Por favor, intenta de nuevo.');
+                    alert(error.esperaAgotada
+                        ? 'El PDF está tardando demasiado en generarse. Por favor, intenta de nuevo en unos minutos.'
+                        : 'Error al generar el PDF. Por favor, intenta de nuevo.');
                     
                     // Restaurar el botón
                     this.disabled = false;
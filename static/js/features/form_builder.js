@@ -7,8 +7,209 @@ function generarUUID() {
     });
 }
 
+// Idioma del candidato, usado al pedir catálogos grandes bajo demanda
+let idiomaFormulario = 'ESP';
+
+// --- Función de Ayuda para Pedir Opciones de un Catálogo Remoto ---
+async function fetchCatalogo(catalogoRef, prefijo = '') {
+    const params = new URLSearchParams({ idioma: idiomaFormulario });
+    if (prefijo) {
+        params.set('q', prefijo);
+    }
+    try {
+        const response = await fetch(apiUrl(`form/catalogo/${encodeURIComponent(catalogoRef)}?${params}`));
+        const result = await response.json();
+        return result.success ? result.opciones : [];
+    } catch (error) {
+        console.error(`[ERROR] No se pudo obtener el catálogo ${catalogoRef}:`, error);
+        return [];
+    }
+}
+
+// --- Funciones de Ayuda para el Autocompletado de Códigos Postales ---
+async function fetchCodigoPostal(cp) {
+    try {
+        const response = await fetch(apiUrl(`form/codigo_postal/${encodeURIComponent(cp)}`));
+        if (!response.ok) return null;
+        const result = await response.json();
+        return result.success ? result : null;
+    } catch (error) {
+        console.error(`[ERROR] No se pudo consultar el código postal ${cp}:`, error);
+        return null;
+    }
+}
+
+async function fetchBusquedaCodigosPostales(consulta) {
+    try {
+        const params = new URLSearchParams({ q: consulta, limite: 10 });
+        const response = await fetch(apiUrl(`form/codigos_postales?${params}`));
+        const result = await response.json();
+        return result.success ? result.resultados : [];
+    } catch (error) {
+        console.error('[ERROR] No se pudo buscar códigos postales:', error);
+        return [];
+    }
+}
+
+// --- Carga Reanudable de Archivos (sección de documentos) ---
+// Reintentos de un fragmento tras un corte de red antes de darse por vencido
+const MAX_REINTENTOS_CARGA = 8;
+// Por encima de este tamaño el navegador no calcula el hash (crypto.subtle necesita el archivo entero en memoria)
+const MAX_BYTES_HASH_NAVEGADOR = 64 * 1024 * 1024;
+
+class ErrorCarga extends Error {}
+
+async function calcularSha256(archivo) {
+    // crypto.subtle solo existe en contextos seguros (https)
+    if (!window.crypto || !crypto.subtle || archivo.size > MAX_BYTES_HASH_NAVEGADOR) return null;
+    const digest = await crypto.subtle.digest('SHA-256', await archivo.arrayBuffer());
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+async function subirArchivo(seccionKey, clave, archivo, alProgreso) {
+    const declaracion = {
+        seccion: seccionKey,
+        clave: clave,
+        nombre: archivo.name,
+        tamano: archivo.size,
+        sha256: await calcularSha256(archivo),
+        tipo: archivo.type,
+    };
+    const response = await fetch(apiUrl('form/archivos'), {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(declaracion),
+    });
+    const carga = await response.json();
+    if (!carga.success) throw new ErrorCarga(carga.message || 'No se pudo iniciar la carga.');
+    if (carga.completa) return carga;
+
+    // Si el archivo ya se había empezado a subir, se sigue desde lo que tiene el servidor
+    let recibido = carga.recibido;
+    let intentos = 0;
+    while (true) {
+        alProgreso(recibido / archivo.size);
+        try {
+            const fragmento = archivo.slice(recibido, recibido + carga.tamano_fragmento);
+            const respuesta = await fetch(apiUrl(`form/archivos/cargas/${carga.carga_id}?desde=${recibido}`), {
+                method: 'PUT',
+                headers: { 'Content-Type': 'application/octet-stream' },
+                body: fragmento,
+            });
+            const result = await respuesta.json();
+            if (result.completa) return result;
+            // 409: el servidor tiene otro desplazamiento (o recibe otro fragmento); se sigue desde el suyo
+            if (!respuesta.ok && respuesta.status !== 409) throw new ErrorCarga(result.message || 'No se pudo subir el archivo.');
+            if (respuesta.status === 409) await new Promise(r => setTimeout(r, 500));
+            recibido = result.recibido;
+            intentos = 0;
+        } catch (error) {
+            if (error instanceof ErrorCarga || ++intentos > MAX_REINTENTOS_CARGA) throw error;
+            // Corte de red: se espera y se pregunta cuánto llegó antes de reintentar
+            await new Promise(r => setTimeout(r, 1000 * intentos));
+            try {
+                const estado = await (await fetch(apiUrl(`form/archivos/cargas/${carga.carga_id}`))).json();
+                if (estado.success) recibido = estado.recibido;
+            } catch (_) { /* sin conexión todavía */ }
+        }
+    }
+}
+
+// Llena estado/municipio/ciudad/colonia de la misma sección o registro a partir del CP
+function completarDomicilio(inputCp, datos) {
+    const contenedor = inputCp.closest('.group-record') || inputCp.closest('.section') || document;
+    contenedor.querySelectorAll('[data-autocompletar-cp]').forEach(destino => {
+        const campo = destino.dataset.autocompletarCp;
+        if (campo === 'colonia') {
+            const datalist = destino.list;
+            if (datalist) {
+                datalist.innerHTML = '';
+                datos.colonias.forEach(colonia => {
+                    const option = document.createElement('option');
+                    option.value = colonia.nombre;
+                    option.label = colonia.tipo;
+                    datalist.appendChild(option);
+                });
+            }
+            if (datos.colonias.length === 1) {
+                destino.value = datos.colonias[0].nombre;
+            }
+        } else if (datos[campo]) {
+            destino.value = datos[campo];
+        }
+        destino.dispatchEvent(new Event('input', { bubbles: true }));
+    });
+}
+
+// --- Función de Ayuda para Leer un Registro de Grupo del DOM ---
+function leerRegistroGrupo(recordDiv) {
+    const registro = {};
+    recordDiv.querySelectorAll('input, select, textarea').forEach(input => {
+        // Quita el sufijo _{index} del nombre del campo (incluido _id_registro)
+        registro[input.name.substring(0, input.name.lastIndexOf('_'))] = input.value;
+    });
+    return registro;
+}
+
+// --- Función de Ayuda para Guardar Varios Registros de un Grupo en una Petición ---
+async function saveGroupBatch(grupoKey, recordDivs) {
+    const operaciones = recordDivs.map(recordDiv => {
+        const operacion = { accion: 'guardar', registro: leerRegistroGrupo(recordDiv) };
+        if (recordDiv.dataset.version !== '') {
+            operacion.version = Number(recordDiv.dataset.version);
+        }
+        return operacion;
+    });
+    try {
+        const response = await fetch(apiUrl(`form/save_group_batch/${grupoKey}`), {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ operaciones })
+        });
+        const result = await response.json();
+        (result.resultados || []).forEach(resultado => {
+            if (resultado.estado === 'guardado') {
+                recordDivs[resultado.indice].dataset.version = resultado.version;
+            }
+        });
+        if (result.success) {
+            alert('¡Registros guardados con éxito!');
+        } else if (response.status === 422) {
+            const mensajes = (result.resultados || [])
+                .filter(r => r.errores)
+                .map(r => mostrarErroresCampos(r.errores, `_${recordDivs[r.indice].dataset.recordIndex}`, recordDivs[r.indice]));
+            alert(`Algunos campos tienen valores inválidos:\n${mensajes.join('\n')}`);
+        } else if (response.status === 409) {
+            const conflictos = (result.resultados || []).filter(r => r.estado === 'conflicto').length;
+            alert(conflictos
+                ? `${conflictos} registro(s) fueron modificados en otra ventana. Recarga el formulario antes de guardar.`
+                : `Error al guardar: ${result.message || 'Error desconocido.'}`);
+        } else {
+            alert(`Error al guardar: ${result.message || 'Error desconocido.'}`);
+        }
+        return result.success;
+    } catch (error) {
+        console.error('Error de red al guardar el grupo:', error);
+        alert('Error de conexión al intentar guardar los datos.');
+        return false;
+    }
+}
+
+// --- Función de Ayuda para Mostrar los Errores de Validación del Servidor ---
+function mostrarErroresCampos(errores, sufijo = '', contenedor = document) {
+    contenedor.querySelectorAll('.is-invalid').forEach(input => input.classList.remove('is-invalid'));
+    const mensajes = [];
+    Object.entries(errores || {}).forEach(([clave, mensaje]) => {
+        const input = contenedor.querySelector(`[id="${clave}${sufijo}"]`);
+        if (input) input.classList.add('is-invalid');
+        const etiqueta = input ? contenedor.querySelector(`label[for="${input.id}"]`) : null;
+        mensajes.push(`- ${etiqueta ? etiqueta.textContent : clave}: ${mensaje}`);
+    });
+    return mensajes.join('\n');
+}
+
 // --- Función de Ayuda para Enviar Datos ---
-async function saveData(url, payload) {
+async function saveData(url, payload, sufijo = '', contenedor = document) {
     try {
         const response = await fetch(url, {
             method: 'POST',
@@ -17,13 +218,18 @@ async function saveData(url, payload) {
         });
         const result = await response.json();
         if (result.success) {
+            mostrarErroresCampos({}, sufijo, contenedor);
             alert('¡Datos guardados con éxito!');
+        } else if (response.status === 422 && result.errores) {
+            alert(`${result.message}\n${mostrarErroresCampos(result.errores, sufijo, contenedor)}`);
         } else {
             alert(`Error al guardar: ${result.message || 'Error desconocido.'}`);
         }
+        return result.success;
     } catch (error) {
         console.error('Error de red al guardar:', error);
         alert('Error de conexión al intentar guardar los datos.');
+        return false;
     }
 }
 
@@ -69,6 +275,54 @@ function renderFormField(campo, valor, suffix = '') {
         console.warn(`[FORM] Campo debería ser numérico pero no tiene validacion_input: ${campo.clave} - ${campo.nombre}`, campo);
     }
     
+    // Archivo (sección de documentos): se sube al elegirlo, aparte del guardado de la sección
+    if (campo.tipo === 'ARCHIVO') {
+        const cargado = typeof valor === 'string' && valor.startsWith('fs://') ? valor.split('/').slice(3).join('/') : '';
+        let fieldHtml = `<div class="mb-3" data-archivo-campo="${campo.clave}">`;
+        fieldHtml += `<label for="${fieldId}" class="form-label">${campo.nombre}</label>`;
+        fieldHtml += `<input type="file" class="form-control" id="${fieldId}" data-archivo-clave="${campo.clave}" accept="image/*,application/pdf,video/*">`;
+        fieldHtml += `<div class="progress mt-2 d-none"><div class="progress-bar" role="progressbar" style="width: 0%"></div></div>`;
+        fieldHtml += `<small class="form-text text-muted archivo-estado">${cargado ? `Cargado: ${cargado}` : ''}</small>`;
+        fieldHtml += `</div>`;
+        return fieldHtml;
+    }
+
+    // Código postal: autocompleta con el índice del servidor y llena el resto del domicilio
+    if (campo.validacion_input === 'CODIGO_POSTAL') {
+        const listId = `${fieldId}-opciones`;
+        let fieldHtml = `<div class="form-floating mb-3">`;
+        fieldHtml += `<input type="text" class="form-control" id="${fieldId}" name="${fieldId}" value="${valor || ''}" placeholder="${placeholder}" list="${listId}" autocomplete="off" inputmode="numeric" maxlength="5" data-codigo-postal="true">`;
+        fieldHtml += `<datalist id="${listId}"></datalist>`;
+        fieldHtml += `<label for="${fieldId}">${campo.nombre}</label>`;
+        fieldHtml += `</div>`;
+        return fieldHtml;
+    }
+
+    // Campos que se llenan a partir del código postal (estado, municipio, ciudad, colonia)
+    if (campo.autocompletar_cp) {
+        const listId = `${fieldId}-opciones`;
+        const listAttr = campo.autocompletar_cp === 'colonia' ? `list="${listId}" autocomplete="off"` : '';
+        let fieldHtml = `<div class="form-floating mb-3">`;
+        fieldHtml += `<input type="text" class="form-control" id="${fieldId}" name="${fieldId}" value="${valor || ''}" placeholder="${placeholder}" ${listAttr} data-autocompletar-cp="${campo.autocompletar_cp}">`;
+        if (listAttr) {
+            fieldHtml += `<datalist id="${listId}"></datalist>`;
+        }
+        fieldHtml += `<label for="${fieldId}">${campo.nombre}</label>`;
+        fieldHtml += `</div>`;
+        return fieldHtml;
+    }
+
+    // Catálogo grande: no viene en el payload, se busca en el servidor mientras se escribe
+    if (campo.tipo === 'CATÁLOGO' && campo.catalogo_remoto) {
+        const listId = `${fieldId}-opciones`;
+        let fieldHtml = `<div class="form-floating mb-3">`;
+        fieldHtml += `<input type="text" class="form-control" id="${fieldId}" name="${fieldId}" value="${valor || ''}" placeholder="${placeholder}" list="${listId}" autocomplete="off" data-catalogo-ref="${campo.catalogo_ref}">`;
+        fieldHtml += `<datalist id="${listId}"></datalist>`;
+        fieldHtml += `<label for="${fieldId}">${campo.nombre}</label>`;
+        fieldHtml += `</div>`;
+        return fieldHtml;
+    }
+
     // Si el campo es de tipo CATÁLOGO, creamos un select con floating label
     if (campo.tipo === 'CATÁLOGO' && campo.catalogo) {
         // Crear opciones del select desde el catálogo
@@ -121,7 +375,7 @@ function renderGroupRecord(preguntas, datos, index, grupoKey) {
     const idRegistro = datos._id_registro || generarUUID();
 
     let recordHtml = `
-        <div class="group-record" data-grupo-key="${grupoKey}" data-record-index="${index}">
+        <div class="group-record" data-grupo-key="${grupoKey}" data-record-index="${index}" data-version="${datos._version ?? ''}">
             <div class="group-record-header">
                 <h4>Registro ${index + 1}</h4>
             </div>
@@ -148,108 +402,137 @@ function renderGroupRecord(preguntas, datos, index, grupoKey) {
 
 // --- Funciones Principales del Módulo ---
 
-function renderUI(secciones, datos_guardados, sidebar, mainContent) {
+function getChatUrl() {
     // Obtener la URL base para el botón "Volver al Chat"
     const baseUrl = window.location.origin;
     const basePath = window.APP_BASE_PATH || '';
-    const chatUrl = baseUrl + (basePath ? `${basePath}/chat?from_form=true` : '/chat?from_form=true');
+    return baseUrl + (basePath ? `${basePath}/chat?from_form=true` : '/chat?from_form=true');
+}
 
-    secciones.forEach(seccion => {
-        // Crear link en el sidebar
-        const link = document.createElement('a');
-        link.href = `#${seccion.key}`;
-        link.textContent = seccion.nombre;
-        link.className = 'list-group-item list-group-item-action';
-        link.dataset.target = seccion.key;
-        sidebar.appendChild(link);
-
-        // Crear estructura de sección con header y contenido con scroll independiente
-        const sectionDiv = document.createElement('div');
-        sectionDiv.id = seccion.key;
-        sectionDiv.className = 'section';
-
-        // Header de la sección con título, botón para abrir menú y botón "Volver al Chat"
-        const sectionHeader = document.createElement('div');
-        sectionHeader.className = 'section-header';
-        
-        // Botón para abrir el offcanvas
-        const menuButton = document.createElement('button');
-        menuButton.type = 'button';
-        menuButton.className = 'btn btn-outline-secondary btn-sm';
-        menuButton.setAttribute('data-bs-toggle', 'offcanvas');
-        menuButton.setAttribute('data-bs-target', '#offcanvasSecciones');
-        menuButton.setAttribute('aria-controls', 'offcanvasSecciones');
-        menuButton.innerHTML = '<i class="bi bi-list"></i> Menú';
-        menuButton.title = 'Abrir menú de secciones';
-        
-        const headerTitle = document.createElement('h3');
-        headerTitle.textContent = seccion.nombre;
-        headerTitle.style.flex = '1';
-        headerTitle.style.margin = '0';
-        
-        const backButton = document.createElement('a');
-        backButton.href = chatUrl;
-        backButton.className = 'btn btn-outline-info btn-sm';
-        backButton.innerHTML = '<i class="bi bi-arrow-left"></i> Volver al Chat';
-        
-        sectionHeader.appendChild(menuButton);
-        sectionHeader.appendChild(headerTitle);
-        sectionHeader.appendChild(backButton);
-
-        // Contenedor con scroll independiente
-        const sectionContent = document.createElement('div');
-        sectionContent.className = 'section-content';
-
-        let sectionHtml = '';
-
-        if (seccion.naturaleza === 'grupo') {
-            const grupoKey = seccion.key.replace('.json', '');
-            const registros_guardados = datos_guardados.grupos[grupoKey] || [];
-            sectionHtml += `<div id="grupo-container-${grupoKey}">`;
-            // Debug: verificar preguntas de grupo
-            console.log(`[FORM] Renderizando grupo ${grupoKey} con ${seccion.preguntas.length} preguntas`);
-            if (seccion.preguntas.length > 0 && seccion.preguntas[0]) {
-                console.log(`[FORM] Primera pregunta del grupo:`, {
-                    clave: seccion.preguntas[0].clave,
-                    nombre: seccion.preguntas[0].nombre,
-                    validacion_input: seccion.preguntas[0].validacion_input,
-                    todas_propiedades: Object.keys(seccion.preguntas[0])
-                });
-            }
-            if (registros_guardados.length > 0) {
-                registros_guardados.forEach((registro, index) => {
-                    sectionHtml += renderGroupRecord(seccion.preguntas, registro, index, grupoKey);
-                });
-            } else {
-                sectionHtml += renderGroupRecord(seccion.preguntas, {}, 0, grupoKey);
-            }
-            sectionHtml += `</div>`;
-            sectionHtml += `<button type="button" class="btn btn-success btn-add-group-record" data-grupo-key="${grupoKey}">Añadir otro registro</button>`;
-        } else {
-            // Debug: verificar las preguntas antes de renderizar
-            console.log(`[FORM] Renderizando sección ${seccion.key} con ${seccion.preguntas.length} preguntas`);
-            seccion.preguntas.forEach((campo, idx) => {
-                // Debug: mostrar primeros campos para verificar estructura
-                if (idx < 3) {
-                    console.log(`[FORM] Pregunta ${idx}:`, {
-                        clave: campo.clave,
-                        nombre: campo.nombre,
-                        validacion_input: campo.validacion_input,
-                        todas_propiedades: Object.keys(campo)
-                    });
-                }
-                const valor = datos_guardados.entrevista[campo.clave] || '';
-                sectionHtml += renderFormField(campo, valor);
+/**
+ * Crea el link del sidebar y el contenedor de una sección (header + contenido vacío).
+ * Solo necesita key, nombre y naturaleza, así que sirve con el índice de /form/outline.
+ */
+function renderSectionShell(seccion, sidebar, mainContent, chatUrl) {
+    // Crear link en el sidebar
+    const link = document.createElement('a');
+    link.href = `#${seccion.key}`;
+    link.textContent = seccion.nombre;
+    link.className = 'list-group-item list-group-item-action';
+    link.dataset.target = seccion.key;
+    sidebar.appendChild(link);
+
+    // Crear estructura de sección con header y contenido con scroll independiente
+    const sectionDiv = document.createElement('div');
+    sectionDiv.id = seccion.key;
+    sectionDiv.className = 'section';
+
+    // Header de la sección con título, botón para abrir menú y botón "Volver al Chat"
+    const sectionHeader = document.createElement('div');
+    sectionHeader.className = 'section-header';
+    
+    // Botón para abrir el offcanvas
+    const menuButton = document.createElement('button');
+    menuButton.type = 'button';
+    menuButton.className = 'btn btn-outline-secondary btn-sm';
+    menuButton.setAttribute('data-bs-toggle', 'offcanvas');
+    menuButton.setAttribute('data-bs-target', '#offcanvasSecciones');
+    menuButton.setAttribute('aria-controls', 'offcanvasSecciones');
+    menuButton.innerHTML = '<i class="bi bi-list"></i> Menú';
+    menuButton.title = 'Abrir menú de secciones';
+    
+    const headerTitle = document.createElement('h3');
+    headerTitle.textContent = seccion.nombre;
+    headerTitle.style.flex = '1';
+    headerTitle.style.margin = '0';
+    
+    const backButton = document.createElement('a');
+    backButton.href = chatUrl;
+    backButton.className = 'btn btn-outline-info btn-sm';
+    backButton.innerHTML = '<i class="bi bi-arrow-left"></i> Volver al Chat';
+    
+    sectionHeader.appendChild(menuButton);
+    sectionHeader.appendChild(headerTitle);
+    sectionHeader.appendChild(backButton);
+
+    // Contenedor con scroll independiente
+    const sectionContent = document.createElement('div');
+    sectionContent.className = 'section-content';
+
+    // Ensamblar la sección
+    sectionDiv.appendChild(sectionHeader);
+    sectionDiv.appendChild(sectionContent);
+    mainContent.appendChild(sectionDiv);
+    return sectionContent;
+}
+
+/**
+ * Rellena el contenido de una sección con sus preguntas y valores guardados.
+ */
+function renderSectionContent(seccion, datos_guardados, sectionContent) {
+    let sectionHtml = '';
+    const valoresGuardados = {};
+
+    if (seccion.naturaleza === 'grupo') {
+        const grupoKey = seccion.key.replace('.json', '');
+        const registros_guardados = datos_guardados.grupos[grupoKey] || [];
+        sectionHtml += `<div id="grupo-container-${grupoKey}">`;
+        // Debug: verificar preguntas de grupo
+        console.log(`[FORM] Renderizando grupo ${grupoKey} con ${seccion.preguntas.length} preguntas`);
+        if (seccion.preguntas.length > 0 && seccion.preguntas[0]) {
+            console.log(`[FORM] Primera pregunta del grupo:`, {
+                clave: seccion.preguntas[0].clave,
+                nombre: seccion.preguntas[0].nombre,
+                validacion_input: seccion.preguntas[0].validacion_input,
+                todas_propiedades: Object.keys(seccion.preguntas[0])
             });
-            sectionHtml += '<button type="button" class="btn btn-primary btn-save-section">Guardar Sección</button>';
         }
+        if (registros_guardados.length > 0) {
+            registros_guardados.forEach((registro, index) => {
+                sectionHtml += renderGroupRecord(seccion.preguntas, registro, index, grupoKey);
+            });
+        } else {
+            sectionHtml += renderGroupRecord(seccion.preguntas, {}, 0, grupoKey);
+        }
+        sectionHtml += `</div>`;
+        sectionHtml += `<div class="d-flex gap-2">`;
+        sectionHtml += `<button type="button" class="btn btn-success btn-add-group-record" data-grupo-key="${grupoKey}">Añadir otro registro</button>`;
+        sectionHtml += `<button type="button" class="btn btn-primary btn-save-group-batch" data-grupo-key="${grupoKey}">Guardar todos los registros</button>`;
+        sectionHtml += `</div>`;
+    } else {
+        // Debug: verificar las preguntas antes de renderizar
+        console.log(`[FORM] Renderizando sección ${seccion.key} con ${seccion.preguntas.length} preguntas`);
+        seccion.preguntas.forEach((campo, idx) => {
+            // Debug: mostrar primeros campos para verificar estructura
+            if (idx < 3) {
+                console.log(`[FORM] Pregunta ${idx}:`, {
+                    clave: campo.clave,
+                    nombre: campo.nombre,
+                    validacion_input: campo.validacion_input,
+                    todas_propiedades: Object.keys(campo)
+                });
+            }
+            const valor = datos_guardados.entrevista[campo.clave] || '';
+            sectionHtml += renderFormField(campo, valor);
+            valoresGuardados[campo.clave] = String(valor);
+        });
+        sectionHtml += '<button type="button" class="btn btn-primary btn-save-section">Guardar Sección</button>';
+    }
 
-        sectionContent.innerHTML = sectionHtml;
+    sectionContent.innerHTML = sectionHtml;
+
+    // Valor guardado de cada campo, para enviar solo los modificados al guardar
+    Object.entries(valoresGuardados).forEach(([clave, valor]) => {
+        const input = sectionContent.querySelector(`[name="${clave}"]`);
+        if (input) input.dataset.valorGuardado = valor;
+    });
+}
 
-        // Ensamblar la sección
-        sectionDiv.appendChild(sectionHeader);
-        sectionDiv.appendChild(sectionContent);
-        mainContent.appendChild(sectionDiv);
+function renderUI(secciones, datos_guardados, sidebar, mainContent) {
+    const chatUrl = getChatUrl();
+    secciones.forEach(seccion => {
+        const sectionContent = renderSectionShell(seccion, sidebar, mainContent, chatUrl);
+        renderSectionContent(seccion, datos_guardados, sectionContent);
     });
 }
 
@@ -312,13 +595,20 @@ function setupEventListeners(mainContent, secciones) {
             e.preventDefault();
             const sectionDiv = targetButton.closest('.section');
             const inputs = sectionDiv.querySelectorAll('input, select, textarea');
+            // Solo se envían los campos que cambiaron desde la carga o el último guardado
             const payload = {};
+            const modificados = [];
             inputs.forEach(input => { 
-                if (input.type !== 'hidden') {
+                if (input.type !== 'hidden' && input.type !== 'file' && input.value !== (input.dataset.valorGuardado ?? '')) {
                     payload[input.name] = input.value; 
+                    modificados.push(input);
                 }
             });
-            await saveData(apiUrl('form/save_section'), payload);
+            if (modificados.length === 0) {
+                alert('No hay cambios por guardar en esta sección.');
+            } else if (await saveData(apiUrl('form/save_section'), payload)) {
+                modificados.forEach(input => { input.dataset.valorGuardado = input.value; });
+            }
             
             // Abrir el offcanvas después de guardar
             const bs = getBootstrap();
@@ -343,7 +633,18 @@ function setupEventListeners(mainContent, secciones) {
                     payload[originalName] = input.value;
                 }
             });
-            await saveData(apiUrl(`form/save_group_item/${grupoKey}`), payload);
+            await saveData(apiUrl(`form/save_group_item/${grupoKey}`), payload, `_${recordDiv.dataset.recordIndex}`, recordDiv);
+        }
+
+        // Guardar todos los registros de un grupo en una sola petición
+        if (targetButton.matches('.btn-save-group-batch')) {
+            e.preventDefault();
+            const grupoKey = targetButton.dataset.grupoKey;
+            const container = document.getElementById(`grupo-container-${grupoKey}`);
+            const recordDivs = container ? Array.from(container.querySelectorAll('.group-record')) : [];
+            if (recordDivs.length > 0) {
+                await saveGroupBatch(grupoKey, recordDivs);
+            }
         }
 
         // Abrir el modal del catálogo (Bootstrap 5)
@@ -357,6 +658,9 @@ function setupEventListeners(mainContent, secciones) {
                 const catalogoData = targetButton.dataset.catalogo;
                 if (catalogoData) {
                     opciones = JSON.parse(catalogoData);
+                } else if (targetButton.dataset.catalogoRef) {
+                    // Catálogo no incluido en el payload: se pide al servidor
+                    opciones = await fetchCatalogo(targetButton.dataset.catalogoRef);
                 }
             } catch (error) {
                 console.error('[ERROR] Error al parsear catálogo:', error);
@@ -445,6 +749,79 @@ function setupEventListeners(mainContent, secciones) {
         });
     }
     
+    // Autocompletado de catálogos remotos: búsqueda por prefijo con un pequeño retardo
+    let temporizadorCatalogo = null;
+    mainContent.addEventListener('input', (e) => {
+        const input = e.target;
+        if (!input.dataset || !input.dataset.catalogoRef) return;
+        clearTimeout(temporizadorCatalogo);
+        temporizadorCatalogo = setTimeout(async () => {
+            const prefijo = input.value.trim();
+            if (!prefijo) return;
+            const opciones = await fetchCatalogo(input.dataset.catalogoRef, prefijo);
+            const datalist = input.list;
+            if (!datalist) return;
+            datalist.innerHTML = '';
+            opciones.forEach(opcion => {
+                const option = document.createElement('option');
+                option.value = opcion;
+                datalist.appendChild(option);
+            });
+        }, 200);
+    });
+
+    // Archivos: se suben en cuanto se eligen, por fragmentos y reanudando tras un corte
+    mainContent.addEventListener('change', async (e) => {
+        const input = e.target;
+        if (!input.dataset || !input.dataset.archivoClave || !input.files.length) return;
+        const contenedor = input.closest('[data-archivo-campo]');
+        const barra = contenedor.querySelector('.progress');
+        const estado = contenedor.querySelector('.archivo-estado');
+        const archivo = input.files[0];
+        barra.classList.remove('d-none');
+        estado.textContent = 'Subiendo...';
+        input.disabled = true;
+        try {
+            await subirArchivo(input.closest('.section').id, input.dataset.archivoClave, archivo, avance => {
+                barra.firstElementChild.style.width = `${Math.round(avance * 100)}%`;
+            });
+            estado.textContent = `Cargado: ${archivo.name}`;
+        } catch (error) {
+            console.error(`[ERROR] No se pudo subir ${archivo.name}:`, error);
+            estado.textContent = `Error: ${error.message}`;
+        } finally {
+            barra.classList.add('d-none');
+            input.disabled = false;
+        }
+    });
+
+    // Autocompletado de códigos postales: sugerencias por prefijo y, con los 5 dígitos, el domicilio
+    let temporizadorCodigoPostal = null;
+    mainContent.addEventListener('input', (e) => {
+        const input = e.target;
+        if (!input.dataset || !input.dataset.codigoPostal) return;
+        clearTimeout(temporizadorCodigoPostal);
+        temporizadorCodigoPostal = setTimeout(async () => {
+            const cp = input.value.trim();
+            if (!/^\d+$/.test(cp)) return;
+            if (cp.length === 5) {
+                const datos = await fetchCodigoPostal(cp);
+                if (datos) completarDomicilio(input, datos);
+                return;
+            }
+            const resultados = await fetchBusquedaCodigosPostales(cp);
+            const datalist = input.list;
+            if (!datalist) return;
+            datalist.innerHTML = '';
+            resultados.forEach(resultado => {
+                const option = document.createElement('option');
+                option.value = resultado.cp;
+                option.label = `${resultado.municipio}, ${resultado.estado}`;
+                datalist.appendChild(option);
+            });
+        }, 150);
+    });
+
     // Función auxiliar para validar si un input es numérico
     function esCampoNumerico(input) {
         return input && (
@@ -556,8 +933,37 @@ function setupEventListeners(mainContent, secciones) {
  * Función principal y pública de este módulo.
  * Orquesta la creación y activación del formulario.
  */
-export function initializeForm(secciones, datos_guardados, sidebar, mainContent) {
+export function initializeForm(secciones, datos_guardados, sidebar, mainContent, idioma = 'ESP') {
+    idiomaFormulario = idioma;
     renderUI(secciones, datos_guardados, sidebar, mainContent);
     setupNavigation(sidebar, mainContent);
     setupEventListeners(mainContent, secciones);
 }
+
+/**
+ * Variante incremental: arma la navegación con el índice (key, nombre, naturaleza)
+ * y devuelve una función para pintar cada sección cuando llega del servidor.
+ */
+export function initializeFormIncremental(indice, sidebar, mainContent, idioma = 'ESP') {
+    idiomaFormulario = idioma;
+    const chatUrl = getChatUrl();
+    const secciones = [];
+    const contenedores = {};
+    indice.forEach(entrada => {
+        const sectionContent = renderSectionShell(entrada, sidebar, mainContent, chatUrl);
+        sectionContent.innerHTML = '<div class="text-muted p-3">Cargando sección...</div>';
+        contenedores[entrada.key] = sectionContent;
+    });
+    setupNavigation(sidebar, mainContent);
+    setupEventListeners(mainContent, secciones);
+
+    return function agregarSeccion(seccion, datos_guardados) {
+        const sectionContent = contenedores[seccion.key];
+        if (!sectionContent) return;
+        secciones.push(seccion);
+        renderSectionContent(seccion, {
+            entrevista: datos_guardados.entrevista || {},
+            grupos: datos_guardados.grupos || {}
+        }, sectionContent);
+    };
+}
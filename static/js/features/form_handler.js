@@ -1,7 +1,7 @@
 // static/js/features/form_handler.js
 
 // Importamos la función principal de nuestro nuevo módulo constructor
-import { initializeForm } from './form_builder.js';
+import { initializeForm, initializeFormIncremental } from './form_builder.js';
 
 // --- PUNTO DE ENTRADA PRINCIPAL ---
 document.addEventListener('DOMContentLoaded', async () => {
@@ -16,7 +16,20 @@ document.addEventListener('DOMContentLoaded', async () => {
     // Notificamos al backend que el formulario ha sido visitado
     fetch(apiUrl('form/visited'), { method: 'POST' });
 
-    // Pedimos al backend la estructura y los datos guardados
+    // Pedimos al backend la estructura y los datos guardados, sección por sección
+    // (NDJSON) para mostrar las primeras sin esperar a que estén todas
+    try {
+        if (await cargarPorSecciones(sidebar, mainContent)) return;
+    } catch (error) {
+        // Si ya se armó la navegación los listeners están registrados: no se reintenta
+        if (sidebar.children.length > 0) {
+            console.error("Fallo al recibir las secciones del formulario:", error);
+            mainContent.insertAdjacentHTML('afterbegin', '<div class="alert alert-danger">Algunas secciones no se pudieron cargar. Recargue la página.</div>');
+            return;
+        }
+        console.warn("[FORM] Carga por secciones no disponible, se usa la carga completa:", error);
+    }
+
     try {
         const response = await fetch(apiUrl('form/data'));
         const data = await response.json();
@@ -26,13 +39,129 @@ document.addEventListener('DOMContentLoaded', async () => {
             return;
         }
 
-        const { secciones, datos_guardados } = data;
+        const { secciones, datos_guardados, idioma } = data;
+        if (data.revision) guardarDatosLocales(data.revision, datos_guardados);
 
         // Le pasamos el control y los datos al módulo constructor
-        initializeForm(secciones, datos_guardados, sidebar, mainContent);
+        initializeForm(secciones, datos_guardados, sidebar, mainContent, idioma);
 
     } catch (error) {
         console.error("Fallo al obtener los datos del formulario:", error);
         mainContent.innerHTML = '<h1>No se pudo conectar con el servidor.</h1>';
     }
-});
\ No newline at end of file
+});
+
+// --- COPIA LOCAL DE LOS DATOS GUARDADOS ---
+// Se conserva en sessionStorage con su revisión: al recargar o reconectar solo
+// se piden al servidor los cambios (/form/data?since=) en lugar de todo.
+const CLAVE_DATOS_LOCALES = 'form_datos_guardados';
+
+function leerDatosLocales() {
+    try {
+        const local = JSON.parse(sessionStorage.getItem(CLAVE_DATOS_LOCALES));
+        return local && local.revision && local.datos_guardados ? local : null;
+    } catch (error) {
+        return null;
+    }
+}
+
+function guardarDatosLocales(revision, datos_guardados) {
+    try {
+        sessionStorage.setItem(CLAVE_DATOS_LOCALES, JSON.stringify({ revision, datos_guardados }));
+    } catch (error) {
+        // Sin espacio o sin sessionStorage: la siguiente carga será completa
+        console.warn('[FORM] No se pudo guardar la copia local de los datos:', error);
+    }
+}
+
+/**
+ * Aplica a la copia local los cambios de /form/data?since=.
+ * En cada grupo, 'ids' es la lista completa y ordenada de registros: los que no
+ * vienen en 'registros' se conservan de la copia local y los que faltan se eliminan.
+ */
+function aplicarDelta(local, delta) {
+    const entrevista = { ...(local.entrevista || {}), ...(delta.entrevista || {}) };
+    const grupos = { ...(local.grupos || {}) };
+    Object.entries(delta.grupos || {}).forEach(([grupoKey, cambios]) => {
+        if (cambios.completo) {
+            grupos[grupoKey] = cambios.registros;
+            return;
+        }
+        const porId = {};
+        (grupos[grupoKey] || []).forEach(registro => { porId[registro._id_registro] = registro; });
+        cambios.registros.forEach(registro => { porId[registro._id_registro] = registro; });
+        grupos[grupoKey] = cambios.ids.map(id => porId[id]).filter(Boolean);
+    });
+    return { entrevista, grupos };
+}
+
+/**
+ * Actualiza la copia local con los cambios desde su revisión y devuelve los datos completos.
+ */
+async function sincronizarDatos(local) {
+    const response = await fetch(apiUrl(`form/data?since=${encodeURIComponent(local.revision)}`));
+    const data = await response.json();
+    if (!response.ok || !data.success) {
+        sessionStorage.removeItem(CLAVE_DATOS_LOCALES);
+        throw new Error(data.message || response.statusText);
+    }
+    const datos = data.delta ? aplicarDelta(local.datos_guardados, data.datos_guardados) : data.datos_guardados;
+    guardarDatosLocales(data.revision, datos);
+    return datos;
+}
+
+/**
+ * Lee /form/data?stream=1 línea por línea: primero el índice de secciones y después
+ * cada sección en cuanto el servidor la tiene lista. Devuelve false si el navegador
+ * no soporta lectura por streaming (se usa entonces la carga completa).
+ * Si hay copia local de los datos, las secciones se piden sin datos y estos se
+ * sincronizan a la vez con ?since=.
+ */
+async function cargarPorSecciones(sidebar, mainContent) {
+    const local = leerDatosLocales();
+    const datosPromesa = local ? sincronizarDatos(local) : null;
+    // Evita el aviso de promesa rechazada sin manejar si no se llega a esperar
+    if (datosPromesa) datosPromesa.catch(() => {});
+
+    const response = await fetch(apiUrl(local ? 'form/data?stream=1&datos=0' : 'form/data?stream=1'));
+    if (!response.ok || !response.body || !response.body.getReader) return false;
+    // Un fallo aquí (antes de armar la navegación) hace que se use la carga completa
+    const datosSincronizados = datosPromesa ? await datosPromesa : null;
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let pendiente = '';
+    let agregarSeccion = null;
+    const recibidos = { entrevista: {}, grupos: {} };
+
+    const procesarLinea = (linea) => {
+        if (!linea.trim()) return;
+        const mensaje = JSON.parse(linea);
+        if (mensaje.tipo === 'indice') {
+            agregarSeccion = initializeFormIncremental(mensaje.secciones, sidebar, mainContent, mensaje.idioma);
+        } else if (mensaje.tipo === 'seccion' && agregarSeccion) {
+            if (datosSincronizados) {
+                agregarSeccion(mensaje.seccion, datosSincronizados);
+            } else {
+                Object.assign(recibidos.entrevista, mensaje.datos_guardados.entrevista);
+                Object.assign(recibidos.grupos, mensaje.datos_guardados.grupos);
+                agregarSeccion(mensaje.seccion, mensaje.datos_guardados);
+            }
+        } else if (mensaje.tipo === 'fin' && mensaje.revision) {
+            guardarDatosLocales(mensaje.revision, recibidos);
+        } else if (mensaje.tipo === 'error') {
+            throw new Error(mensaje.message);
+        }
+    };
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        pendiente += decoder.decode(value, { stream: true });
+        const lineas = pendiente.split('\n');
+        pendiente = lineas.pop();
+        lineas.forEach(procesarLinea);
+    }
+    procesarLinea(pendiente + decoder.decode());
+    return agregarSeccion !== null;
+}
@@ -0,0 +1,48 @@
+# tests/conftest.py
+"""
+Los tests usan el mismo entorno aislado que los benchmarks: un árbol inv_datos
+sintético y sustitutos en memoria de gestor_estado y de la colección de
+evaluaciones. instalar_entorno() debe correr antes de importar cualquier
+módulo de 'app', y una sola vez por proceso, así que se hace aquí al cargar.
+"""
+
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.entorno import instalar_entorno  # noqa: E402
+from benchmarks.generar_inv_datos import generar_inv_datos  # noqa: E402
+
+_RAIZ = Path(tempfile.mkdtemp(prefix="tests_inv_datos_"))
+# Secciones pequeñas y sin catálogo grande: el árbol se genera en milisegundos
+_FORMA = generar_inv_datos(_RAIZ, empresas=2, secciones=4, campos=3, catalogos=2, items_catalogo=3,
+                           catalogo_grande=0, cada_grupo=0)
+_GESTOR = instalar_entorno(_RAIZ, latencia_db_seg=0)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_RAIZ, ignore_errors=True)
+
+
+@pytest.fixture
+def inv_datos():
+    """Forma del árbol sintético (raiz, empresas, guion_secciones...), con las cachés vacías."""
+    from app.core.maestro_preguntas import maestro_preguntas
+    from app.core.cache_formulario import cache_formulario
+    from app.core.validacion import motor_validacion
+
+    maestro_preguntas.invalidar_cache()
+    cache_formulario.invalidar()
+    motor_validacion.invalidar()
+    return _FORMA
+
+
+@pytest.fixture
+def gestor():
+    """Gestor de estado en memoria (estados, datos de entrevista, grupos y documentos)."""
+    return _GESTOR
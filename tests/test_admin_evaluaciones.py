@@ -0,0 +1,85 @@
+# tests/test_admin_evaluaciones.py
+
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.routes.admin_evaluaciones import _codificar_cursor, _filtro_despues_de
+
+# Orden de tipos de MongoDB en el listado descendente (mayor primero)
+_RANGO_FECHA = {datetime: 3, str: 2, int: 1, float: 1, type(None): 0}
+_RANGO_ID = {ObjectId: 1, str: 0}
+_TIPO_BSON = {"date": datetime, "string": str, "number": (int, float), "objectId": ObjectId}
+
+
+def _mismo_tipo(a, b) -> bool:
+    numeros = (int, float)
+    return type(a) is type(b) or (isinstance(a, numeros) and isinstance(b, numeros))
+
+
+def _cumple(documento, filtro) -> bool:
+    """Evaluación mínima de los operadores que usa el filtro keyset ($or, $lt, $type, igualdad)."""
+    for campo, condicion in filtro.items():
+        if campo == "$or":
+            if not any(_cumple(documento, f) for f in condicion):
+                return False
+            continue
+        valor = documento.get(campo)
+        if isinstance(condicion, dict) and "$lt" in condicion:
+            if valor is None or not _mismo_tipo(valor, condicion["$lt"]) or not valor < condicion["$lt"]:
+                return False
+        elif isinstance(condicion, dict) and "$type" in condicion:
+            if not isinstance(valor, _TIPO_BSON[condicion["$type"]]):
+                return False
+        elif condicion is None:
+            if valor is not None:
+                return False
+        elif not (_mismo_tipo(valor, condicion) and valor == condicion):
+            return False
+    return True
+
+
+def _clave_orden(documento):
+    fecha = documento.get("fecha_creacion")
+    return (_RANGO_FECHA[type(fecha)], fecha if fecha is not None else 0,
+            _RANGO_ID[type(documento["_id"])], documento["_id"])
+
+
+def _paginar(documentos, limite):
+    ordenados = sorted(documentos, key=_clave_orden, reverse=True)
+    vistos = []
+    cursor = None
+    while True:
+        restantes = [d for d in ordenados if cursor is None or _cumple(d, _filtro_despues_de(cursor))]
+        pagina = restantes[:limite]
+        vistos.extend(pagina)
+        if len(restantes) <= limite:
+            return ordenados, vistos
+        cursor = _codificar_cursor(pagina[-1])
+
+
+def test_cursor_recorre_todos_los_tipos_de_fecha_e_id():
+    base = datetime(2026, 1, 1)
+    fechas = [base, base + timedelta(days=1), "2025-12-31", "2026-02-01", 20260101, 3.5, None]
+    documentos = []
+    for n, fecha in enumerate(fechas):
+        # Dos documentos por fecha (un ObjectId y un _id de texto) para desempatar por _id
+        for _id in (ObjectId(), f"id-{n:02d}"):
+            documento = {"_id": _id}
+            # Con fecha nula, uno la tiene a None y otro no tiene el campo (ambos se ordenan como nulos)
+            if fecha is not None or isinstance(_id, ObjectId):
+                documento["fecha_creacion"] = fecha
+            documentos.append(documento)
+    documentos.append({"_id": "sin-fecha"})
+
+    for limite in (1, 2, 3, 5):
+        ordenados, vistos = _paginar(documentos, limite)
+        assert [d["_id"] for d in vistos] == [d["_id"] for d in ordenados]
+
+
+def test_cursor_es_estable_con_la_misma_fecha():
+    fecha = datetime(2026, 3, 1, 12, 0)
+    documentos = [{"_id": ObjectId(), "fecha_creacion": fecha} for _ in range(7)]
+
+    ordenados, vistos = _paginar(documentos, 3)
+    assert [d["_id"] for d in vistos] == [d["_id"] for d in ordenados]
@@ -0,0 +1,42 @@
+# tests/test_cache_estado.py
+
+import asyncio
+
+from app.core import cache_estado as modulo
+from app.core.cache_estado import CacheEstado
+
+
+def test_actualizar_no_escribe_si_no_cambia(gestor):
+    cache = CacheEstado()
+    gestor.estados["eval-actualizar"] = {"idioma": "ENG", "ha_visitado_formulario": False}
+
+    async def probar():
+        assert await cache.actualizar_async("eval-actualizar", {"ha_visitado_formulario": True})
+        antes = gestor.operaciones
+        assert not await cache.actualizar_async("eval-actualizar", {"ha_visitado_formulario": True})
+        # Solo la lectura: no se volvió a escribir
+        assert gestor.operaciones == antes + 1
+
+    asyncio.run(probar())
+    assert gestor.estados["eval-actualizar"] == {"idioma": "ENG", "ha_visitado_formulario": True}
+
+
+def test_idioma_en_memoria_solo_durante_el_ttl(gestor, monkeypatch):
+    cache = CacheEstado()
+    gestor.estados["eval-idioma"] = {"idioma": "eng"}
+
+    async def probar():
+        assert await cache.obtener_idioma_async("eval-idioma") == "ENG"
+        # Cambio hecho por otro proceso: dentro del TTL se sigue respondiendo de memoria
+        gestor.estados["eval-idioma"] = {"idioma": "FRA"}
+        antes = gestor.operaciones
+        assert await cache.obtener_idioma_async("eval-idioma") == "ENG"
+        assert gestor.operaciones == antes
+        # El estado completo siempre se lee de BD
+        assert (await cache.obtener_async("eval-idioma"))["idioma"] == "FRA"
+
+        gestor.estados["eval-idioma"] = {"idioma": "ITA"}
+        monkeypatch.setattr(modulo, "ESTADO_IDIOMA_TTL_SEG", 0)
+        assert await cache.obtener_idioma_async("eval-idioma") == "ITA"
+
+    asyncio.run(probar())
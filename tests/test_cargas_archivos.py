@@ -0,0 +1,69 @@
+# tests/test_cargas_archivos.py
+
+import asyncio
+import hashlib
+
+import pytest
+
+from app.core import cargas_archivos
+from app.core.cargas_archivos import CargaInvalida, DesfaseCarga, GestorCargas
+
+
+@pytest.fixture
+def gestor_cargas(tmp_path, monkeypatch):
+    monkeypatch.setattr(cargas_archivos, "CARGAS_ARCHIVOS_DIR", tmp_path)
+    return GestorCargas()
+
+
+async def _flujo(*trozos):
+    for trozo in trozos:
+        yield trozo
+
+
+def _enviar(gestor_cargas, carga, desplazamiento, *trozos) -> int:
+    async def enviar():
+        async with gestor_cargas.bloqueo(carga):
+            return await gestor_cargas.recibir(carga, desplazamiento, _flujo(*trozos))
+    return asyncio.run(enviar())
+
+
+def test_reanudar_desde_lo_recibido(gestor_cargas):
+    contenido = bytes(range(256)) * 40
+    sha256 = hashlib.sha256(contenido).hexdigest()
+    carga = gestor_cargas.declarar("eval-1", "S1", "B00001", "foto.png", len(contenido), sha256, "image/png")
+
+    assert _enviar(gestor_cargas, carga, 0, contenido[:1000], contenido[1000:3000]) == 3000
+    # Otro worker (u otra petición) retoma la misma carga al volver a declararla
+    reanudada = gestor_cargas.declarar("eval-1", "S1", "B00001", "foto.png", len(contenido), sha256, "image/png")
+    assert reanudada.id == carga.id and reanudada.recibido == 3000
+    assert gestor_cargas.obtener("eval-2", carga.id) is None
+
+    # Un fragmento que no empieza donde termina lo recibido se rechaza sin escribir
+    with pytest.raises(DesfaseCarga) as desfase:
+        _enviar(gestor_cargas, reanudada, 2000, contenido[2000:])
+    assert desfase.value.recibido == 3000
+    assert reanudada.recibido == 3000
+
+    assert _enviar(gestor_cargas, reanudada, 3000, contenido[3000:]) == len(contenido)
+    assert asyncio.run(gestor_cargas.verificar(reanudada)) == sha256
+
+
+def test_fragmento_mayor_que_lo_declarado(gestor_cargas):
+    carga = gestor_cargas.declarar("eval-1", "S1", "B00001", "a.bin", 10, None)
+    with pytest.raises(CargaInvalida):
+        _enviar(gestor_cargas, carga, 0, b"x" * 8, b"x" * 8)
+    # Lo que llegó antes de pasarse queda escrito y se puede continuar desde ahí
+    assert carga.recibido == 8
+
+
+def test_hash_distinto_descarta_lo_recibido(gestor_cargas):
+    contenido = b"contenido original"
+    carga = gestor_cargas.declarar("eval-1", "S1", "B00001", "a.txt", len(contenido),
+                                   hashlib.sha256(contenido).hexdigest())
+    _enviar(gestor_cargas, carga, 0, b"contenido origina!")
+
+    with pytest.raises(CargaInvalida):
+        asyncio.run(gestor_cargas.verificar(carga))
+    assert carga.recibido == 0
+    assert _enviar(gestor_cargas, carga, 0, contenido) == len(contenido)
+    assert asyncio.run(gestor_cargas.verificar(carga)) == hashlib.sha256(contenido).hexdigest()
@@ -0,0 +1,95 @@
+# tests/test_form.py
+
+import gzip
+import json
+import uuid
+
+from fastapi.testclient import TestClient
+
+from benchmarks.entorno import crear_app
+from app.core.cache_formulario import _CuerpoPreserializado
+
+
+def _candidato(inv_datos):
+    return {"_id": f"test-{uuid.uuid4().hex[:12]}", "empresa_gestion": inv_datos["empresas"][0],
+            "guion_secciones": inv_datos["guion_secciones"]}
+
+
+def test_lote_de_grupo_con_version_vieja_no_escribe_nada(inv_datos, gestor):
+    candidato = _candidato(inv_datos)
+    cliente = TestClient(crear_app(candidato))
+    url = "/form/save_group_batch/03_GRUPO"
+
+    respuesta = cliente.post(url, json={"operaciones": [
+        {"accion": "guardar", "registro": {"_id_registro": "r1", "B00000": "5"}},
+        {"accion": "guardar", "registro": {"_id_registro": "r2", "B00000": "7"}},
+    ]})
+    assert respuesta.status_code == 200
+    assert [r["version"] for r in respuesta.json()["resultados"]] == [1, 1]
+
+    # r1 con la versión leída (1) y r2 con una anterior (0): conflicto, el lote entero se descarta
+    respuesta = cliente.post(url, json={"operaciones": [
+        {"accion": "guardar", "registro": {"_id_registro": "r1", "B00000": "6"}, "version": 1},
+        {"accion": "eliminar", "registro_id": "r2", "version": 0},
+    ]})
+    assert respuesta.status_code == 409
+    assert [(r["estado"], r.get("version")) for r in respuesta.json()["resultados"]] == [
+        ("no_aplicado", None), ("conflicto", 1),
+    ]
+    registros = gestor.grupos[candidato["_id"]]["03_GRUPO"]
+    assert [(r["_id_registro"], r["B00000"], r["_version"]) for r in registros] == [("r1", "5", 1), ("r2", "7", 1)]
+
+
+def test_since_envia_solo_lo_cambiado(inv_datos, gestor):
+    candidato = _candidato(inv_datos)
+    cliente = TestClient(crear_app(candidato))
+    assert cliente.post("/form/save_section", json={"B00000": "5", "B00003": "7"}).status_code == 200
+
+    inicial = cliente.get("/form/data").json()
+    assert inicial["datos_guardados"]["entrevista"] == {"B00000": "5", "B00003": "7"}
+    assert cliente.get("/form/data", params={"since": inicial["revision"]}).json()["datos_guardados"] == {
+        "entrevista": {}, "grupos": {},
+    }
+
+    assert cliente.post("/form/save_section", json={"B00003": "8"}).status_code == 200
+    delta = cliente.get("/form/data", params={"since": inicial["revision"]}).json()
+    assert delta["delta"] is True
+    assert delta["datos_guardados"]["entrevista"] == {"B00003": "8"}
+    assert delta["revision"] != inicial["revision"]
+
+    # Un valor escrito por otra vía (sin anotar) no coincide con su crc y se envía igual
+    gestor.entrevista[candidato["_id"]]["B00000"] = "9"
+    delta = cliente.get("/form/data", params={"since": delta["revision"]}).json()
+    assert delta["datos_guardados"]["entrevista"] == {"B00000": "9"}
+
+
+def test_since_de_otra_evaluacion_envia_todo(inv_datos):
+    candidato = _candidato(inv_datos)
+    cliente = TestClient(crear_app(candidato))
+    assert cliente.post("/form/save_section", json={"B00000": "5"}).status_code == 200
+    ajeno = TestClient(crear_app(_candidato(inv_datos))).get("/form/data").json()["revision"]
+
+    respuesta = cliente.get("/form/data", params={"since": ajeno}).json()
+    assert respuesta["delta"] is False
+    assert respuesta["datos_guardados"]["entrevista"] == {"B00000": "5"}
+
+
+def test_cuerpo_gzip_equivale_al_cuerpo_sin_comprimir():
+    prefijo = b'{"success":true,"idioma":"ESP","secciones":' + json.dumps(
+        [{"key": f"S{n}", "preguntas": ["texto " * 20] * 5} for n in range(40)]
+    ).encode("utf-8") + b',"datos_guardados":'
+    cuerpo = _CuerpoPreserializado(prefijo)
+    for datos in ({}, {"entrevista": {"B00001": "ñandú"}, "grupos": {}}):
+        plano = cuerpo.cuerpo(datos, revision="abc.3")
+        comprimido = cuerpo.cuerpo_gzip(datos, revision="abc.3")
+        assert gzip.decompress(comprimido) == plano
+        assert json.loads(plano)["datos_guardados"] == datos
+
+
+def test_form_data_gzip(inv_datos):
+    cliente = TestClient(crear_app(_candidato(inv_datos)))
+    plano = cliente.get("/form/data", headers={"Accept-Encoding": "identity"})
+    comprimido = cliente.get("/form/data", headers={"Accept-Encoding": "gzip"})
+    assert comprimido.headers.get("content-encoding") == "gzip"
+    # httpx descomprime la respuesta
+    assert comprimido.json() == plano.json()
@@ -0,0 +1,75 @@
+# tests/test_invalidacion_inv_datos.py
+
+import asyncio
+import json
+from pathlib import Path
+
+from app.core.cache_formulario import cache_formulario
+from app.core.invalidacion_inv_datos import inv_datos_modificado_async, vigilante_inv_datos
+from app.core.maestro_preguntas import maestro_preguntas
+
+
+def _editar_dato(raiz: Path, clave: str, **campos) -> Path:
+    ruta = raiz / "datos" / f"{clave}.json"
+    dato = json.loads(ruta.read_text(encoding="utf-8"))
+    dato.update(campos)
+    ruta.write_text(json.dumps(dato, ensure_ascii=False), encoding="utf-8")
+    return ruta
+
+
+def test_editar_dato_descarta_solo_sus_dependientes(inv_datos):
+    raiz = Path(inv_datos["raiz"])
+    empresas = inv_datos["empresas"]
+    guion = inv_datos["guion_secciones"]
+    archivos = [f"{s['archivo']}.json" for s in guion]
+    # Con 3 campos por sección, B00004 solo aparece en la sección 1 (B00003..B00005)
+    editada = archivos[1]
+
+    for empresa in empresas:
+        for seccion in guion:
+            assert maestro_preguntas.obtener_preguntas(seccion["archivo"], empresa)
+    guion_sin_editada = [s for s in guion if f"{s['archivo']}.json" != editada]
+    completo = cache_formulario.obtener_payload(empresas[0], guion, "ESP")
+    sin_editada = cache_formulario.obtener_payload(empresas[0], guion_sin_editada, "ESP")
+
+    ruta = _editar_dato(raiz, "B00004", descripcion="Texto editado")
+    resultado = asyncio.run(inv_datos_modificado_async([ruta], recompilar=False))
+
+    # La sección editada se descarta en cada empresa; las demás siguen en caché
+    assert resultado["definiciones"] == len(empresas)
+    cargadas = set(maestro_preguntas._preguntas_cargadas)
+    for empresa in empresas:
+        assert (empresa, editada) not in cargadas
+        assert all((empresa, archivo) in cargadas for archivo in archivos if archivo != editada)
+
+    # Solo el payload que incluye la sección editada se vuelve a renderizar
+    assert resultado["payloads"] == 1
+    assert cache_formulario.obtener_payload(empresas[0], guion_sin_editada, "ESP") is sin_editada
+    assert cache_formulario.obtener_payload(empresas[0], guion, "ESP") is not completo
+
+    preguntas = maestro_preguntas.obtener_preguntas(guion[1]["archivo"], empresas[0])
+    assert {p["clave"]: p.get("descripcion") for p in preguntas}["B00004"] == "Texto editado"
+
+
+def test_vigilante_detecta_ediciones_hechas_fuera_del_proceso(inv_datos):
+    raiz = Path(inv_datos["raiz"])
+    empresa = inv_datos["empresas"][0]
+    archivo = inv_datos["guion_secciones"][1]["archivo"]
+
+    async def probar():
+        # La primera revisión solo toma la referencia (el árbol de los tests es su raíz)
+        assert vigilante_inv_datos.raiz == raiz
+        await vigilante_inv_datos.revisar_async()
+        assert await vigilante_inv_datos.revisar_async() == []
+        maestro_preguntas.obtener_preguntas(archivo, empresa)
+        ruta = _editar_dato(raiz, "B00004", descripcion="Editado en otro worker", relleno="x" * 10)
+        assert await vigilante_inv_datos.revisar_async() == [ruta]
+        assert await vigilante_inv_datos.revisar_async() == []
+        # Lo que ya invalidó quien lo escribió no se vuelve a invalidar
+        otra = _editar_dato(raiz, "B00004", descripcion="Editado aquí", relleno="x" * 20)
+        await inv_datos_modificado_async([otra], recompilar=False)
+        assert await vigilante_inv_datos.revisar_async() == []
+
+    asyncio.run(probar())
+    preguntas = maestro_preguntas.obtener_preguntas(archivo, empresa)
+    assert {p["clave"]: p.get("descripcion") for p in preguntas}["B00004"] == "Editado aquí"
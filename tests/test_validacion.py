@@ -0,0 +1,53 @@
+# tests/test_validacion.py
+
+import asyncio
+import gc
+import weakref
+from pathlib import Path
+
+from app.core.invalidacion_inv_datos import inv_datos_modificado_async
+from app.core.maestro_preguntas import maestro_preguntas
+from app.core.validacion import MotorValidacion, motor_validacion
+
+
+def test_validador_no_retiene_definiciones_descartadas(inv_datos):
+    empresa = inv_datos["empresas"][0]
+    archivo = inv_datos["guion_secciones"][0]["archivo"]
+    motor = MotorValidacion()
+
+    validador = asyncio.run(motor.validador_seccion_async(archivo, empresa))
+    definiciones = weakref.ref(maestro_preguntas.obtener_definiciones(archivo, empresa))
+    assert validador.compilado_de(definiciones())
+
+    maestro_preguntas.invalidar_cache()
+    gc.collect()
+    assert definiciones() is None
+    # Definiciones nuevas: el validador se vuelve a compilar
+    assert asyncio.run(motor.validador_seccion_async(archivo, empresa)) is not validador
+
+
+def test_validadores_acotados(inv_datos):
+    empresa = inv_datos["empresas"][0]
+    archivos = [s["archivo"] for s in inv_datos["guion_secciones"]]
+    motor = MotorValidacion(max_validadores=2)
+
+    for archivo in archivos:
+        asyncio.run(motor.validador_seccion_async(archivo, empresa))
+    assert list(motor._por_seccion) == [(empresa, f"{a}.json") for a in archivos[-2:]]
+
+
+def test_editar_dato_descarta_sus_validadores(inv_datos):
+    raiz = Path(inv_datos["raiz"])
+    empresa = inv_datos["empresas"][0]
+    archivos = [s["archivo"] for s in inv_datos["guion_secciones"]]
+
+    guion = asyncio.run(motor_validacion.validador_secciones_async(archivos, empresa))
+    otra = asyncio.run(motor_validacion.validador_seccion_async(archivos[0], empresa))
+    # Con 3 campos por sección, B00004 solo aparece en la sección 1
+    resultado = asyncio.run(inv_datos_modificado_async([raiz / "datos" / "B00004.json"], recompilar=False))
+
+    assert resultado["validadores"] >= 2
+    assert (empresa, f"{archivos[1]}.json") not in motor_validacion._por_seccion
+    assert (empresa, tuple(f"{a}.json" for a in archivos)) not in motor_validacion._por_guion
+    assert asyncio.run(motor_validacion.validador_seccion_async(archivos[0], empresa)) is otra
+    assert asyncio.run(motor_validacion.validador_secciones_async(archivos, empresa)) is not guion